@@ -0,0 +1,164 @@
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import json
+import os
+
+from langchain_core.messages import SystemMessage
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from .call_control import DEFAULT_STEP_DEADLINE
+from .element_ranking import DEFAULT_RANKING_CONFIG, RankingConfig
+from .form_autofill import build_autofill_tool_calls
+from .model_router import STRONG_TIER
+from .models import AgentHistory, AgentRequest
+from .prompts import (
+    JOB_APPLICATION_ENRICH_CONTEXT,
+    MULTI_ACTION_PROMPT,
+    SOCIAL_MEDIA_ENRICH_CONTEXT,
+    SOCIAL_MEDIA_PROMPT,
+    SYSTEM_PROMPT,
+    format_job_application_prompt,
+)
+from .text_budget import DEFAULT_TEXT_BUDGET, TextBudget, count_tokens
+from .tools import SERVER_TOOLS, TOOLS_BY_NAME
+
+
+DEFAULT_MODE = "default"
+# Steps sent to the model in full, screenshot included; older ones are folded into
+# one line each. Empty sends every step in full.
+AGENT_HISTORY_STEPS = os.getenv("AGENT_HISTORY_STEPS", "8")
+DEFAULT_HISTORY_LIMIT = int(AGENT_HISTORY_STEPS) if AGENT_HISTORY_STEPS else None
+# upload_file attaches the resume from the job profile, so only job applications get it
+BROWSING_TOOLS = (
+    "click_element",
+    "input_text",
+    "press_key",
+    "scroll_page",
+    "navigate",
+    "finish_task",
+)
+
+FastPath = Callable[[AgentRequest, AgentHistory], List[Dict[str, Any]]]
+
+
+@dataclass(frozen=True)
+class AgentMode:
+    """Everything an agent mode changes about a step; run_agent_step only reads these."""
+
+    name: str
+    prompt: str = ""
+    # For prompts built from per-user data; called with the request's jobApplicationData
+    prompt_template: Optional[Callable[[dict], str]] = None
+    enrich_context: str = ""
+    tool_names: Tuple[str, ...] = BROWSING_TOOLS
+    text_budget: TextBudget = DEFAULT_TEXT_BUDGET
+    ranking: RankingConfig = DEFAULT_RANKING_CONFIG
+    history_limit: Optional[int] = DEFAULT_HISTORY_LIMIT
+    step_deadline: float = DEFAULT_STEP_DEADLINE
+    # Pins every step after the first to one tier instead of routing per step
+    tier: Optional[str] = None
+    # Deterministic tool calls tried before the model; empty means ask the model
+    fast_path: Optional[FastPath] = None
+
+    @cached_property
+    def tools(self) -> list:
+        return [TOOLS_BY_NAME[name] for name in self.tool_names]
+
+    @cached_property
+    def tools_with_server(self) -> list:
+        return self.tools + SERVER_TOOLS
+
+    @cached_property
+    def static_system_messages(self) -> Dict[bool, SystemMessage]:
+        return {
+            multi_action: SystemMessage(content=compose_system_prompt(self.prompt, multi_action))
+            for multi_action in (False, True)
+        }
+
+    def system_message(self, job_application_data: Optional[dict], multi_action: bool) -> SystemMessage:
+        if self.prompt_template is not None and job_application_data:
+            mode_prompt = self.prompt_template(job_application_data)
+            return SystemMessage(content=compose_system_prompt(mode_prompt, multi_action))
+        return self.static_system_messages[multi_action]
+
+    def tool_sets(self) -> List[Tuple[str, ...]]:
+        return [
+            tuple(tool.name for tool in self.tools),
+            tuple(tool.name for tool in self.tools_with_server),
+        ]
+
+
+def compose_system_prompt(mode_prompt: str, multi_action: bool) -> str:
+    system_prompt = SYSTEM_PROMPT
+    if mode_prompt:
+        system_prompt = system_prompt + "\n" + mode_prompt
+    if multi_action:
+        system_prompt = system_prompt + "\n" + MULTI_ACTION_PROMPT
+    return system_prompt
+
+
+def autofill_fast_path(agent_request: AgentRequest, history: AgentHistory) -> List[Dict[str, Any]]:
+    # Profile fields that can be matched deterministically skip the LLM entirely
+    if not agent_request.jobApplicationData:
+        return []
+    return build_autofill_tool_calls(
+        agent_request.dom, agent_request.jobApplicationData, history.steps
+    )
+
+
+AGENT_MODES: Dict[str, AgentMode] = {}
+
+
+def register_mode(mode: AgentMode) -> AgentMode:
+    AGENT_MODES[mode.name] = mode
+    return mode
+
+
+def get_agent_mode(name: Optional[str]) -> AgentMode:
+    # Unknown modes (older or newer extensions) run as the default agent
+    return AGENT_MODES.get(name or DEFAULT_MODE) or AGENT_MODES[DEFAULT_MODE]
+
+
+def agent_tool_sets() -> List[Tuple[str, ...]]:
+    return list(dict.fromkeys(tool_set for mode in AGENT_MODES.values() for tool_set in mode.tool_sets()))
+
+
+def tool_schema_tokens(tools: list) -> int:
+    return sum(count_tokens(json.dumps(convert_to_openai_tool(agent_tool))) for agent_tool in tools)
+
+
+def compile_agent_modes() -> None:
+    """Builds every mode's static prompts and tool lists before the first request."""
+    summaries = []
+    for mode in AGENT_MODES.values():
+        prompt_tokens = count_tokens(mode.static_system_messages[False].content)
+        summaries.append(
+            f"{mode.name} (prompt {prompt_tokens} tokens, {len(mode.tools)} tools "
+            f"{tool_schema_tokens(mode.tools)} tokens)"
+        )
+    print(f"[Startup] Agent modes: {', '.join(summaries)}")
+
+
+register_mode(AgentMode(name=DEFAULT_MODE))
+
+register_mode(
+    AgentMode(
+        name="social_media",
+        prompt=SOCIAL_MEDIA_PROMPT,
+        enrich_context=SOCIAL_MEDIA_ENRICH_CONTEXT,
+    )
+)
+
+register_mode(
+    AgentMode(
+        name="job_application",
+        prompt_template=format_job_application_prompt,
+        enrich_context=JOB_APPLICATION_ENRICH_CONTEXT,
+        tool_names=BROWSING_TOOLS + ("upload_file",),
+        # Job application prompts carry the full profile
+        step_deadline=120.0,
+        tier=STRONG_TIER,
+        fast_path=autofill_fast_path,
+    )
+)
@@ -0,0 +1,99 @@
+from typing import Any, Awaitable, Callable, Optional, Tuple
+import asyncio
+import os
+
+from fastapi import Request
+
+from . import metrics
+
+
+# Seconds a whole agent step may take, including repairs and DOM expansions.
+# Modes can allow longer (see agent_modes).
+DEFAULT_STEP_DEADLINE = float(os.getenv("AGENT_STEP_DEADLINE_SECONDS", "60"))
+
+DISCONNECT_POLL_INTERVAL = 0.5
+
+# Hedging sends a second, identical model call when the first is slower than the
+# recent p95, and keeps whichever answers first. It trades cost for tail latency,
+# so it is off unless enabled.
+HEDGE_REQUESTS = os.getenv("AGENT_HEDGE_REQUESTS") == "1"
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY = 1.0
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+def hedge_delay(latency_name: str) -> Optional[float]:
+    if not HEDGE_REQUESTS:
+        return None
+    stats = metrics.get_latency(latency_name)
+    # Too few samples make the p95 meaningless and would hedge almost every call
+    if stats.count < HEDGE_MIN_SAMPLES:
+        return None
+    return max(stats.percentile(95), HEDGE_MIN_DELAY)
+
+
+async def hedged(
+    make_call: Callable[[], Awaitable[Any]], delay: Optional[float]
+) -> Tuple[Any, int]:
+    """The first successful result, and how many calls were sent (and billed) for it."""
+    first = asyncio.ensure_future(make_call())
+    tasks = [first]
+    try:
+        if delay is None:
+            return await first, 1
+
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            metrics.increment("llm.hedge.fired")
+            tasks.append(asyncio.ensure_future(make_call()))
+
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not first:
+                        metrics.increment("llm.hedge.wins")
+                    return task.result(), len(tasks)
+        # Both attempts failed; surface the original call's error
+        return first.result(), len(tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def wait_for_disconnect(request: Request) -> None:
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+
+
+async def run_while_connected(request: Request, awaitable: Awaitable[Any], timeout: float) -> Any:
+    """Awaits the call, cancelling it if the deadline passes or the client goes away."""
+    return await run_until_cancelled(awaitable, wait_for_disconnect(request), timeout)
+
+
+async def run_until_cancelled(
+    awaitable: Awaitable[Any], cancelled: Awaitable[Any], timeout: float
+) -> Any:
+    """Awaits the call unless the deadline passes or `cancelled` finishes first."""
+    call = asyncio.ensure_future(awaitable)
+    watcher = asyncio.ensure_future(cancelled)
+    try:
+        done, _ = await asyncio.wait(
+            {call, watcher}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+        )
+        if call in done:
+            return call.result()
+        if watcher in done:
+            # Retrieve a closed-socket error so it is not reported as unhandled
+            watcher.exception()
+            metrics.increment("agent.client_disconnects")
+            raise ClientDisconnected()
+        metrics.increment("agent.deadline_exceeded")
+        raise asyncio.TimeoutError()
+    finally:
+        call.cancel()
+        watcher.cancel()
@@ -0,0 +1,124 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, shared_memory
+from typing import Any, Dict, Optional, Union
+import asyncio
+import os
+import time
+
+from pydantic import BaseModel
+import pydantic_core
+
+from . import metrics
+from .interactive_dom import RenderedDom, build_interactive_dom
+from .models import PageDom
+
+
+# Pages with at least this many nodes are rendered in a worker process so they do
+# not stall every other request on the event loop. 0 workers renders everything inline.
+DOM_OFFLOAD_WORKERS = int(os.getenv("DOM_OFFLOAD_WORKERS", "2"))
+DOM_OFFLOAD_MIN_NODES = int(os.getenv("DOM_OFFLOAD_MIN_NODES", "5000"))
+
+offload_pool: Optional[ProcessPoolExecutor] = None
+
+
+class DomSource(BaseModel):
+    """A request body with the page under "dom"; workers ignore everything else in it."""
+
+    dom: PageDom
+
+
+def offloads(node_count: int) -> bool:
+    return DOM_OFFLOAD_WORKERS > 0 and node_count >= DOM_OFFLOAD_MIN_NODES
+
+
+def get_offload_pool() -> ProcessPoolExecutor:
+    global offload_pool
+    if offload_pool is None:
+        # spawn rather than fork: the server runs Mongo monitor and executor
+        # threads that a fork would copy in whatever state they were in
+        offload_pool = ProcessPoolExecutor(
+            max_workers=DOM_OFFLOAD_WORKERS, mp_context=get_context("spawn")
+        )
+    return offload_pool
+
+
+def worker_ready() -> int:
+    return os.getpid()
+
+
+async def start_offload_pool() -> None:
+    if DOM_OFFLOAD_WORKERS <= 0:
+        return
+    loop = asyncio.get_running_loop()
+    pool = get_offload_pool()
+    # Spawned workers import the renderer on first use; do it before real traffic
+    try:
+        await asyncio.gather(
+            *(loop.run_in_executor(pool, worker_ready) for _ in range(DOM_OFFLOAD_WORKERS))
+        )
+    except BrokenProcessPool as e:
+        print(f"[DOM] Offload workers failed to start, rendering inline until retried: {e}")
+        shutdown_offload_pool()
+
+
+def shutdown_offload_pool() -> None:
+    global offload_pool
+    if offload_pool is not None:
+        offload_pool.shutdown(wait=False, cancel_futures=True)
+        offload_pool = None
+
+
+def render_shared_dom(name: str, size: int, options: Dict[str, Any]) -> RenderedDom:
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        dom = DomSource.model_validate_json(bytes(block.buf[:size])).dom
+    finally:
+        block.close()
+    return build_interactive_dom(dom, **options)
+
+
+async def render_dom(
+    dom: PageDom, source: Optional[Union[bytes, bytearray]] = None, **options: Any
+) -> RenderedDom:
+    """Renders the page, in a worker process when it is large.
+
+    source is the raw body the page was parsed from. Workers parse the page from
+    it themselves, so the loop copies bytes instead of serialising the page again.
+    """
+    started = time.perf_counter()
+    if not offloads(len(dom.map)):
+        rendered = build_interactive_dom(dom, **options)
+        metrics.observe_latency("dom.render.inline", time.perf_counter() - started)
+        record_cache_lookups(rendered)
+        return rendered
+
+    # The page goes over as one JSON buffer in shared memory; only the much smaller
+    # rendered result is pickled back
+    payload = source if source is not None else b'{"dom":' + pydantic_core.to_json(dom) + b"}"
+    block = shared_memory.SharedMemory(create=True, size=len(payload))
+    try:
+        block.buf[: len(payload)] = payload
+        rendered = await asyncio.get_running_loop().run_in_executor(
+            get_offload_pool(), render_shared_dom, block.name, len(payload), options
+        )
+    except BrokenProcessPool:
+        # A crashed worker breaks the whole pool; answer this step inline and
+        # let the next large page start a fresh one
+        shutdown_offload_pool()
+        metrics.increment("dom.offload_failures")
+        rendered = build_interactive_dom(dom, **options)
+    finally:
+        block.close()
+        block.unlink()
+
+    metrics.increment("dom.offloaded")
+    metrics.observe_latency("dom.render.offloaded", time.perf_counter() - started)
+    record_cache_lookups(rendered)
+    return rendered
+
+
+def record_cache_lookups(rendered: RenderedDom) -> None:
+    # Workers keep their own subtree caches, so lookups are counted from the result
+    metrics.increment("dom.render_cache.hits", rendered.cache_hits)
+    metrics.increment("dom.render_cache.misses", rendered.cache_misses)
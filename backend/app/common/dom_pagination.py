@@ -0,0 +1,67 @@
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+from .interactive_dom import RenderedDom
+
+
+EXPAND_DOM_TOOL = "expand_dom"
+MAX_DOM_EXPANSIONS = 3
+
+
+def format_region(rendered_dom: RenderedDom, region: int) -> str:
+    total = len(rendered_dom.regions)
+    text = rendered_dom.regions[region - 1]
+    if total == 1:
+        return text
+    return (
+        f"[DOM region {region} of {total}]\n{text}\n"
+        f"[Call expand_dom with a region from 1 to {total} to read more of this page "
+        f"without scrolling.]"
+    )
+
+
+def is_expansion_request(response: AIMessage) -> bool:
+    return bool(response.tool_calls) and response.tool_calls[0]["name"] == EXPAND_DOM_TOOL
+
+
+def expansion_finish_tool_call() -> Dict[str, Any]:
+    # expand_dom is answered inside the request; the extension has no handler for it
+    return {
+        "name": "finish_task",
+        "args": {
+            "response": "Agent error: Kept reading the page without choosing an action. Task incomplete",
+            "description": "System forced finish after expand_dom requests could not be resolved",
+        },
+        "id": "expansion_finish",
+    }
+
+
+def validate_expansion(
+    region: Any, rendered_dom: RenderedDom, expansions_used: int
+) -> Optional[str]:
+    total = len(rendered_dom.regions)
+    if expansions_used >= MAX_DOM_EXPANSIONS:
+        return (
+            f"expand_dom was already used {expansions_used} times this step. "
+            f"Act on an element you have seen, or scroll_page."
+        )
+    if not isinstance(region, int) or not 1 <= region <= total:
+        return f"expand_dom region must be an integer from 1 to {total}."
+    return None
+
+
+def build_expand_messages(
+    response: AIMessage, rendered_dom: RenderedDom, region: int
+) -> List[Any]:
+    return [response] + [
+        ToolMessage(
+            content=(
+                format_region(rendered_dom, region)
+                if position == 0
+                else "Skipped: expand_dom must be the only call in its reply."
+            ),
+            tool_call_id=tool_call["id"],
+        )
+        for position, tool_call in enumerate(response.tool_calls)
+    ]
@@ -0,0 +1,198 @@
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+import json
+import math
+import os
+import re
+
+
+HIGHLIGHT_LINE = re.compile(r"^\s*\[(\d+)\]<")
+RENDER_FLAGS = re.compile(r"data-(?:interactive|in-viewport|top-element)='(?:true|false)'")
+TOKEN = re.compile(r"[a-z0-9]+")
+IN_VIEWPORT_FLAG = "data-in-viewport='true'"
+
+# Optional local embedding model (sentence-transformers) blended into BM25 scores
+RANKING_EMBEDDING_MODEL = os.getenv("DOM_RANKING_EMBEDDING_MODEL")
+# When set, every model-chosen element is appended here for offline recall checks
+RANKING_RECORD_PATH = os.getenv("DOM_RANKING_RECORD_PATH")
+
+
+# Set to 0 to render every page unranked; modes and requests can also opt out
+RANKING_ENABLED = os.getenv("DOM_RANKING", "1") != "0"
+LESS_RELEVANT_HEADER = "[Elements ranked less relevant to the goal, in page order]"
+
+
+@dataclass(frozen=True)
+class RankingConfig:
+    enabled: bool = RANKING_ENABLED
+    max_elements: int = 150
+    history_steps: int = 3
+    context_lines: int = 1
+    k1: float = 1.2
+    b: float = 0.75
+    embedding_weight: float = 0.5
+
+
+DEFAULT_RANKING_CONFIG = RankingConfig()
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN.findall(RENDER_FLAGS.sub(" ", text).lower())
+
+
+def build_goal(prompt: str, history_summaries: Sequence[str], history_steps: int) -> str:
+    recent = list(history_summaries)[-history_steps:] if history_steps else []
+    return " ".join([prompt, *recent])
+
+
+def bm25_scores(
+    documents: List[List[str]], query: List[str], k1: float, b: float
+) -> List[float]:
+    if not documents:
+        return []
+    avg_length = sum(len(doc) for doc in documents) / len(documents) or 1.0
+    document_frequency = Counter(term for doc in documents for term in set(doc))
+    total = len(documents)
+    idf = {
+        term: math.log(1 + (total - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+        for term in set(query)
+        if term in document_frequency
+    }
+
+    scores = []
+    for doc in documents:
+        frequencies = Counter(doc)
+        norm = k1 * (1 - b + b * len(doc) / avg_length)
+        scores.append(
+            sum(
+                weight * frequencies[term] * (k1 + 1) / (frequencies[term] + norm)
+                for term, weight in idf.items()
+                if term in frequencies
+            )
+        )
+    return scores
+
+
+@lru_cache(maxsize=1)
+def get_embedding_model():
+    if not RANKING_EMBEDDING_MODEL:
+        return None
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        print("[DOM] sentence-transformers not installed; ranking with BM25 only")
+        return None
+    return SentenceTransformer(RANKING_EMBEDDING_MODEL)
+
+
+def embedding_scores(texts: List[str], goal: str) -> Optional[List[float]]:
+    model = get_embedding_model()
+    if model is None:
+        return None
+    vectors = model.encode([goal, *texts], normalize_embeddings=True)
+    return [float(vectors[0] @ vector) for vector in vectors[1:]]
+
+
+def score_elements(texts: List[str], goal: str, config: RankingConfig) -> List[float]:
+    scores = bm25_scores([tokenize(text) for text in texts], tokenize(goal), config.k1, config.b)
+    semantic = embedding_scores(texts, goal)
+    if semantic is None:
+        return scores
+
+    top = max(scores, default=0.0) or 1.0
+    return [
+        score / top + config.embedding_weight * similarity
+        for score, similarity in zip(scores, semantic)
+    ]
+
+
+def surrounding_text_lines(
+    position: int, lines: List[str], element_lines: Dict[int, str], radius: int
+) -> List[int]:
+    surrounding = []
+    for step in (-1, 1):
+        neighbour = position + step
+        while 0 <= neighbour < len(lines) and abs(neighbour - position) <= radius:
+            if neighbour in element_lines:
+                break
+            surrounding.append(neighbour)
+            neighbour += step
+    return surrounding
+
+
+def rank_lines(
+    lines: List[str], goal: str, config: RankingConfig = DEFAULT_RANKING_CONFIG
+) -> tuple[List[str], List[str], int]:
+    """Splits lines into the most relevant elements and the rest, both in page order.
+
+    Nothing is dropped: the rest is rendered into later regions that expand_dom can read.
+    """
+    element_lines: Dict[int, str] = {
+        position: line for position, line in enumerate(lines) if HIGHLIGHT_LINE.match(line)
+    }
+    if len(element_lines) <= config.max_elements or not goal.strip():
+        return lines, [], 0
+
+    positions = list(element_lines)
+    context_of = {
+        position: surrounding_text_lines(position, lines, element_lines, config.context_lines)
+        for position in positions
+    }
+    # Score each element together with the plain text around it, e.g. the post
+    # body next to a feed card's buttons
+    scores = score_elements(
+        [" ".join([element_lines[p], *(lines[c] for c in context_of[p])]) for p in positions],
+        goal,
+        config,
+    )
+    ranked = sorted(zip(scores, positions), key=lambda item: item[0], reverse=True)
+
+    # What is on screen stays regardless of score so the DOM matches the screenshot
+    keep = {p for p in positions if IN_VIEWPORT_FLAG in element_lines[p]}
+    for _, position in ranked:
+        if len(keep) >= config.max_elements:
+            break
+        keep.add(position)
+
+    context = {line for position in keep for line in context_of[position]}
+
+    kept_lines: List[str] = []
+    less_relevant: List[str] = []
+    omitted = 0
+    dropped_elements = 0
+    for position, line in enumerate(lines):
+        if position in keep or position in context:
+            if omitted:
+                kept_lines.append(f"... {omitted} less relevant lines moved to later regions")
+                omitted = 0
+            kept_lines.append(line)
+        elif position in element_lines or line.strip():
+            less_relevant.append(line)
+            omitted += 1
+            dropped_elements += position in element_lines
+    if omitted:
+        kept_lines.append(f"... {omitted} less relevant lines moved to later regions")
+
+    return kept_lines, less_relevant, dropped_elements
+
+
+def record_ranking_sample(
+    path: str,
+    lines: List[str],
+    prompt: str,
+    history_summaries: Sequence[str],
+    chosen_index: Optional[int],
+) -> None:
+    # The rendered lines are all ranking reads, at a fraction of the DOM's size
+    if chosen_index is None:
+        return
+    sample = {
+        "lines": lines,
+        "prompt": prompt,
+        "history": list(history_summaries),
+        "chosen_index": chosen_index,
+    }
+    with open(path, "a", encoding="utf-8") as sink:
+        sink.write(json.dumps(sample) + "\n")
@@ -0,0 +1,86 @@
+from typing import Any, Dict
+
+from fastapi import FastAPI
+
+from . import metrics
+
+
+FREE_RUN_LIMITS = 3
+# Every worker hears every change on the topic to drop its cached status; open
+# side panels subscribe to their own user's channel only
+ENTITLEMENTS_CHANNEL = "entitlements"
+
+
+def entitlements_channel(email: str) -> str:
+    return f"{ENTITLEMENTS_CHANNEL}:{email}"
+
+
+def load_agent_status(users_col, email: str) -> Dict[str, Any]:
+    user_doc = users_col.find_one({"email": email})
+    if not user_doc:
+        return {"agent_runs": 0, "is_premium": False, "runs_remaining": FREE_RUN_LIMITS}
+
+    agent_runs = user_doc.get("agent_runs", 0)
+    is_premium = user_doc.get("premium", 0) == 1
+
+    runs_remaining = "unlimited" if is_premium else max(0, FREE_RUN_LIMITS - agent_runs)
+
+    return {
+        "agent_runs": agent_runs,
+        "is_premium": is_premium,
+        "runs_remaining": runs_remaining
+    }
+
+
+def load_stripe_status(premium_col, email: str) -> Dict[str, Any]:
+    premium_doc = premium_col.find_one({"email": email}, {"_id": 0})
+
+    if not premium_doc:
+        return {"active": False, "status": None}
+
+    current_period_end = premium_doc.get("subscription_current_period_end")
+
+    if current_period_end and hasattr(current_period_end, 'timestamp'):
+        current_period_end_ts = str(int(current_period_end.timestamp()))
+    else:
+        current_period_end_ts = None
+
+    return {
+        "active": premium_doc.get("subscription_status"),
+        "status": premium_doc.get("subscription_status"),
+        "current_period_end": current_period_end_ts,
+    }
+
+
+def entitlements_snapshot(app: FastAPI, email: str) -> Dict[str, Any]:
+    status_cache = app.state.status_cache
+    return {
+        "agent": status_cache.get_or_load(
+            "agent", email, lambda: load_agent_status(app.state.users_col, email)
+        ).body,
+        "stripe": status_cache.get_or_load(
+            "stripe", email, lambda: load_stripe_status(app.state.premium_col, email)
+        ).body,
+    }
+
+
+async def notify_entitlements_changed(app: FastAPI, email: str) -> None:
+    # Call after the write has committed so subscribers reload the new state
+    app.state.status_cache.invalidate(email)
+    try:
+        await app.state.pubsub.publish(entitlements_channel(email), {"email": email})
+    except Exception as e:
+        # The write already happened; other workers catch up when their cache expires
+        metrics.increment("pubsub.publish_failures")
+        print(f"[PubSub] Failed to publish entitlement change for {email}: {e}")
+
+
+async def relay_entitlement_changes(app: FastAPI) -> None:
+    pubsub = app.state.pubsub
+    queue = pubsub.subscribe(ENTITLEMENTS_CHANNEL)
+    try:
+        while True:
+            message = await queue.get()
+            app.state.status_cache.invalidate(message["email"])
+    finally:
+        pubsub.unsubscribe(ENTITLEMENTS_CHANNEL, queue)
@@ -0,0 +1,198 @@
+from typing import Any, Dict, List, Optional
+import re
+
+from .interactive_dom import NodeMap, ParentMap, build_parent_lookup, DEFAULT_ATTRS
+from .models import ElementNode, HistoryStep, PageDom, TextNode
+
+
+AUTOFILL_SUMMARY_PREFIX = "Autofill: "
+
+TEXT_INPUT_TYPES = {"", "text", "email", "tel", "url", "search"}
+FILLABLE_TAGS = {"input", "textarea"}
+
+# Ordered so that more specific keys win over generic ones that share words,
+# e.g. "preferred first name" must not be read as "first name".
+FIELD_PATTERNS: List[tuple[str, List[str]]] = [
+    ("preferredName", [r"\bpreferred (first )?name\b", r"\bnick ?name\b"]),
+    ("firstName", [r"\bfirst name\b", r"\bgiven name\b", r"\bfname\b", r"\bforename\b"]),
+    ("lastName", [r"\blast name\b", r"\bfamily name\b", r"\bsurname\b", r"\blname\b"]),
+    ("fullName", [r"^(your )?(full )?name$", r"\bfull name\b", r"\blegal name\b"]),
+    ("email", [r"\be ?mail\b"]),
+    ("phoneNumber", [r"\bphone\b", r"\bmobile\b", r"\btelephone\b", r"\bcell\b"]),
+    ("linkedinUrl", [r"\blinked ?in\b"]),
+    ("githubUrl", [r"\bgit ?hub\b"]),
+    ("websiteUrl", [r"\bwebsite\b", r"\bportfolio\b", r"\bpersonal (site|url)\b"]),
+    ("currentCompany", [r"\bcurrent (company|employer)\b", r"\bemployer\b"]),
+    ("currentLocation", [r"\bcurrent location\b", r"^location$"]),
+    ("school", [r"\bschool\b", r"\buniversity\b", r"\bcollege\b"]),
+    ("streetAddress2", [r"\baddress (line )?2\b", r"\bapartment\b", r"\bsuite\b"]),
+    ("streetAddress", [r"\bstreet\b", r"\baddress( line 1)?$"]),
+    ("city", [r"\bcity\b", r"\btown\b"]),
+    ("state", [r"^state\b", r"\bprovince\b", r"\bstate / province\b"]),
+    ("zipCode", [r"\bzip\b", r"\bpostal\b", r"\bpost ?code\b"]),
+]
+COMPILED_FIELD_PATTERNS = [
+    (key, [re.compile(pattern) for pattern in patterns])
+    for key, patterns in FIELD_PATTERNS
+]
+
+TYPE_HINTS = {"email": "email", "tel": "phoneNumber"}
+
+# How much each source of evidence counts towards a match.
+SIGNAL_WEIGHTS = {
+    "label": 3,
+    "aria-label": 3,
+    "placeholder": 2,
+    "name": 2,
+}
+TYPE_HINT_WEIGHT = 1
+AUTOFILL_MIN_SCORE = 3
+AUTOFILL_MIN_MARGIN = 2
+MAX_LABEL_CHARS = 80
+
+
+def normalize_signal(raw: str) -> str:
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", raw)
+    text = re.sub(r"[^a-zA-Z0-9]+", " ", text)
+    return " ".join(text.lower().split())
+
+
+def profile_values(job_application_data: Dict[str, Any]) -> Dict[str, str]:
+    values = {
+        key: str(job_application_data.get(key) or "").strip()
+        for key, _ in FIELD_PATTERNS
+        if key != "fullName"
+    }
+    values["fullName"] = " ".join(
+        part for part in (values["firstName"], values["lastName"]) if part
+    )
+    return {key: value for key, value in values.items() if value}
+
+
+def autofilled_keys(history_steps: List[HistoryStep]) -> set[str]:
+    return {
+        step.summary[len(AUTOFILL_SUMMARY_PREFIX):]
+        for step in history_steps
+        if step.action == "input" and step.summary.startswith(AUTOFILL_SUMMARY_PREFIX)
+    }
+
+
+def node_text(node_id: str, node_map: NodeMap) -> str:
+    node = node_map[node_id]
+    if isinstance(node, TextNode):
+        return node.text.strip()
+    return " ".join(
+        text for child_id in node.children if (text := node_text(child_id, node_map))
+    )
+
+
+def find_label_text(node_id: str, node_map: NodeMap, parent_of: ParentMap) -> str:
+    # Walk up a few levels looking for a wrapping <label> or the closest
+    # preceding sibling with text, which is how most ATS forms lay out labels.
+    child_id = node_id
+    parent_id = parent_of.get(node_id)
+    for _ in range(3):
+        if not parent_id:
+            break
+        parent = node_map[parent_id]
+        if isinstance(parent, ElementNode) and parent.tagName.lower() == "label":
+            return node_text(parent_id, node_map)[:MAX_LABEL_CHARS]
+
+        siblings = parent.children
+        for sibling_id in reversed(siblings[: siblings.index(child_id)]):
+            sibling = node_map[sibling_id]
+            if isinstance(sibling, ElementNode) and sibling.highlightIndex is not None:
+                return ""
+            if text := node_text(sibling_id, node_map):
+                return text[:MAX_LABEL_CHARS]
+
+        child_id = parent_id
+        parent_id = parent_of.get(parent_id)
+    return ""
+
+
+def score_field(signals: Dict[str, str], input_type: str) -> Dict[str, int]:
+    scores: Dict[str, int] = {}
+    for source, raw in signals.items():
+        text = normalize_signal(raw)
+        if not text:
+            continue
+        for key, patterns in COMPILED_FIELD_PATTERNS:
+            if any(pattern.search(text) for pattern in patterns):
+                scores[key] = scores.get(key, 0) + SIGNAL_WEIGHTS[source]
+                break
+
+    if hint := TYPE_HINTS.get(input_type):
+        scores[hint] = scores.get(hint, 0) + TYPE_HINT_WEIGHT
+    return scores
+
+
+def match_field(
+    node_id: str, node: ElementNode, node_map: NodeMap, parent_of: ParentMap
+) -> Optional[str]:
+    if node.tagName.lower() not in FILLABLE_TAGS:
+        return None
+
+    attributes = {
+        key: value for key, value in node.attributes.items() if key in DEFAULT_ATTRS
+    }
+    input_type = attributes.get("type", "").lower()
+    if input_type not in TEXT_INPUT_TYPES or attributes.get("value", "").strip():
+        return None
+
+    signals = {
+        "name": attributes.get("name", ""),
+        "placeholder": attributes.get("placeholder", ""),
+        "aria-label": attributes.get("aria-label", ""),
+        "label": find_label_text(node_id, node_map, parent_of),
+    }
+    scores = score_field(signals, input_type)
+    if not scores:
+        return None
+
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    best_key, best_score = ranked[0]
+    runner_up = ranked[1][1] if len(ranked) > 1 else 0
+    if best_score < AUTOFILL_MIN_SCORE or best_score - runner_up < AUTOFILL_MIN_MARGIN:
+        return None
+    return best_key
+
+
+def build_autofill_tool_calls(
+    dom: PageDom,
+    job_application_data: Dict[str, Any],
+    history_steps: List[HistoryStep],
+) -> List[Dict[str, Any]]:
+    values = profile_values(job_application_data)
+    already_filled = autofilled_keys(history_steps)
+
+    node_map: NodeMap = dom.map
+    parent_of = build_parent_lookup(node_map)
+
+    matches: Dict[str, tuple[int, str]] = {}
+    duplicates: set[str] = set()
+    for node_id, node in node_map.items():
+        if not isinstance(node, ElementNode) or node.highlightIndex is None:
+            continue
+        key = match_field(node_id, node, node_map, parent_of)
+        if not key or key not in values or key in already_filled:
+            continue
+        if key in matches:
+            duplicates.add(key)
+        matches[key] = (node.highlightIndex, values[key])
+
+    # Two fields claiming the same profile value is ambiguous; leave both to the LLM
+    tool_calls = [
+        {
+            "name": "input_text",
+            "args": {
+                "highlight_index": highlight_index,
+                "text": value,
+                "description": f"{AUTOFILL_SUMMARY_PREFIX}{key}",
+            },
+            "id": f"autofill_{key}",
+        }
+        for key, (highlight_index, value) in matches.items()
+        if key not in duplicates
+    ]
+    return sorted(tool_calls, key=lambda call: call["args"]["highlight_index"])
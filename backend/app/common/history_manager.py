@@ -1,179 +1,316 @@
 from typing import List, Optional, Any, Dict
 from langchain_core.messages import AIMessage, ToolMessage
 
-from .models import HistoryStep
-import json
+from .interactive_dom import IndexedElement
+from .models import AgentHistory, HistoryStep
 
 
-def build_history_messages(history_steps: List[HistoryStep]) -> List[Any]:
+def build_step_messages(history: AgentHistory, step: HistoryStep) -> List[Any]:
     messages = []
-    for step in history_steps:
-        action_to_tool_mapping = {
-            "click": "click_element",
-            "input": "input_text",
-            "key_press": "press_key",
-            "scroll": "scroll_page",
-            "navigate": "navigate",
-            "finish": "finish_task",
-            "upload": "upload_file",
-        }
-
-        tool_name = action_to_tool_mapping.get(step.action, "unknown")
-        tool_arguments = {
-            "description": step.summary,
-        }
-
-        if step.action == "input":
-            tool_arguments["text"] = step.value if step.value is not None else ""
-        elif step.action == "key_press":
-            tool_arguments["key"] = step.value if step.value is not None else ""
-        elif step.action == "scroll":
-            tool_arguments["direction"] = (
-                step.value if step.value is not None else "down"
-            )
-        elif step.action == "navigate":
-            tool_arguments["url"] = step.value if step.value is not None else ""
-        elif step.action == "finish":
-            tool_arguments["response"] = step.value if step.value is not None else ""
-        elif step.action == "upload":
-            pass
-            
-        ai_message = AIMessage(
-            content=f"Step {step.step_number}: {step.summary}",
-            tool_calls=[
-                {
-                    "name": tool_name,
-                    "args": tool_arguments,
-                    "id": f"call_{step.step_number}",
-                }
+    action_to_tool_mapping = {
+        "click": "click_element",
+        "input": "input_text",
+        "key_press": "press_key",
+        "scroll": "scroll_page",
+        "navigate": "navigate",
+        "finish": "finish_task",
+        "upload": "upload_file",
+    }
+
+    tool_name = action_to_tool_mapping.get(step.action, "unknown")
+    tool_arguments = {
+        "description": step.summary,
+    }
+    if step.highlight_index is not None:
+        tool_arguments["highlight_index"] = step.highlight_index
+
+    if step.action == "input":
+        tool_arguments["text"] = step.value if step.value is not None else ""
+    elif step.action == "key_press":
+        tool_arguments["key"] = step.value if step.value is not None else ""
+    elif step.action == "scroll":
+        tool_arguments["direction"] = (
+            step.value if step.value is not None else "down"
+        )
+    elif step.action == "navigate":
+        tool_arguments["url"] = step.value if step.value is not None else ""
+    elif step.action == "finish":
+        tool_arguments["response"] = step.value if step.value is not None else ""
+    elif step.action == "upload":
+        pass
+        
+    ai_message = AIMessage(
+        content=f"Step {step.step_number}: {step.summary}",
+        tool_calls=[
+            {
+                "name": tool_name,
+                "args": tool_arguments,
+                "id": f"call_{step.step_number}",
+            }
+        ],
+    )
+    messages.append(ai_message)
+
+    tool_content = f"Executed {step.action} action: {step.summary}"
+    screenshot = history.screenshot_for(step)
+    if screenshot:
+        tool_message = ToolMessage(
+            content=[
+                {"type": "text", "text": tool_content},
+                {"type": "image_url", "image_url": {"url": screenshot}},
             ],
+            tool_call_id=f"call_{step.step_number}",
+        )
+    else:
+        tool_message = ToolMessage(
+            content=tool_content,
+            tool_call_id=f"call_{step.step_number}",
         )
-        messages.append(ai_message)
-
-        tool_content = f"Executed {step.action} action: {step.summary}"
-        if step.screenshot:
-            tool_message = ToolMessage(
-                content=[
-                    {"type": "text", "text": tool_content},
-                    {"type": "image_url", "image_url": {"url": step.screenshot}},
-                ],
-                tool_call_id=f"call_{step.step_number}",
-            )
-        else:
-            tool_message = ToolMessage(
-                content=tool_content,
-                tool_call_id=f"call_{step.step_number}",
-            )
-        messages.append(tool_message)
+    messages.append(tool_message)
+
+    return messages
+
+
+def folded_step_count(step_count: int, limit: Optional[int]) -> int:
+    if limit is None:
+        return 0
+    return max(0, step_count - limit)
+
 
+def build_folded_steps_message(steps: List[HistoryStep]) -> AIMessage:
+    # One line per step and no screenshots
+    lines = []
+    for step in steps:
+        value = f" ({step.value})" if step.value else ""
+        lines.append(f"Step {step.step_number}: {step.action}{value} - {step.summary}")
+    return AIMessage(content="Earlier steps:\n" + "\n".join(lines))
+
+
+def build_history_messages(history: AgentHistory, limit: Optional[int] = None) -> List[Any]:
+    """The last `limit` steps in full, screenshots included; earlier ones folded into one message."""
+    folded = folded_step_count(len(history.steps), limit)
+    messages = [build_folded_steps_message(history.steps[:folded])] if folded else []
+    for step in history.steps[folded:]:
+        messages.extend(build_step_messages(history, step))
     return messages
 
 
-def parse_history_from_request(history_data: Optional[str]) -> List[HistoryStep]:
-    if not history_data:
-        return []
+class HistoryMessages:
+    """History messages kept across the steps of a live session, built once per step."""
+
+    def __init__(self):
+        self.step_messages: List[List[Any]] = []
+
+    def extend(self, history: AgentHistory, limit: Optional[int] = None) -> List[Any]:
+        for step in history.steps[len(self.step_messages):]:
+            self.step_messages.append(build_step_messages(history, step))
+        folded = folded_step_count(len(self.step_messages), limit)
+        # Folded steps are never sent in full again; free their screenshots
+        for position in range(folded):
+            self.step_messages[position] = []
+        messages = [build_folded_steps_message(history.steps[:folded])] if folded else []
+        for step_messages in self.step_messages[folded:]:
+            messages.extend(step_messages)
+        return messages
 
-    try:
-        steps_data = (
-            json.loads(history_data) if isinstance(history_data, str) else history_data
+
+TOOL_TO_ACTION_MAPPING = {
+    "click_element": "click",
+    "input_text": "input",
+    "press_key": "key_press",
+    "scroll_page": "scroll",
+    "navigate": "navigate",
+    "finish_task": "finish",
+    "upload_file": "upload",
+}
+
+INDEXED_ACTIONS = {"click", "input", "key_press", "upload"}
+
+# Actions that leave the page as it is, so several of them can run back to back
+# from a single observation. Anything else ends a batch.
+BATCHABLE_ACTIONS = {"input", "upload"}
+MAX_BATCH_ACTIONS = 10
+
+
+def parse_tool_call(
+    tool_call: Dict[str, Any],
+) -> tuple[Optional[int], str, Optional[str], str]:
+    tool_name = tool_call["name"]
+    tool_arguments = tool_call["args"]
+
+    action = TOOL_TO_ACTION_MAPPING.get(tool_name, "unknown")
+
+    if tool_name == "click_element":
+        highlight_index = tool_arguments.get("highlight_index", -1)
+        value = None
+    elif tool_name == "input_text":
+        highlight_index = tool_arguments.get("highlight_index", -1)
+        value = tool_arguments.get(
+            "input_text_content", tool_arguments.get("text", "")
         )
+    elif tool_name == "press_key":
+        highlight_index = tool_arguments.get("highlight_index", -1)
+        value = tool_arguments.get("keyboard_key", tool_arguments.get("key", ""))
+    elif tool_name == "scroll_page":
+        highlight_index = None
+        value = tool_arguments.get("direction", "down")
+    elif tool_name == "navigate":
+        highlight_index = None
+        value = tool_arguments.get("url", "")
+    elif tool_name == "finish_task":
+        highlight_index = None
+        value = tool_arguments.get(
+            "task_completion_response", tool_arguments.get("response", "")
+        )
+    elif tool_name == "upload_file":
+        highlight_index = tool_arguments.get("highlight_index", -1)
+        value = tool_arguments.get("file_name", "resume.pdf")
+    else:
+        highlight_index = None
+        value = None
+
+    description = tool_arguments.get(
+        "action_description",
+        tool_arguments.get("description", f"Performed {action} action"),
+    )
+    return highlight_index, action, value, description
 
-        if isinstance(steps_data, list):
-            return [HistoryStep(**step) for step in steps_data]
-        else:
-            steps = []
-            for step_num, step_data in steps_data.items():
-                steps.append(
-                    HistoryStep(
-                        step_number=int(step_num),
-                        action=step_data.get("action", "unknown"),
-                        value=step_data.get("value"),
-                        summary=step_data.get("description", ""),
-                        screenshot=step_data.get("screenshot"),
-                    )
-                )
-            return sorted(steps, key=lambda x: x.step_number)
-    except Exception:
-        return []
+
+def forced_finish_step() -> tuple[int, str, str, str]:
+    return (
+        -1,
+        "finish",
+        "Agent error: Failed to select a tool. Task incomplete",
+        "System forced finish due to missing tool call",
+    )
+
+
+def deadline_finish_tool_call(deadline: float) -> Dict[str, Any]:
+    return {
+        "name": "finish_task",
+        "args": {
+            "response": f"Agent error: No response within {deadline:.0f} seconds. Task incomplete",
+            "description": "System forced finish after the step deadline passed",
+        },
+        "id": "deadline_finish",
+    }
+
+
+def invalid_index_finish_step(
+    highlight_index: Optional[int], action: str
+) -> tuple[int, str, str, str]:
+    return (
+        -1,
+        "finish",
+        f"Agent error: highlightIndex {highlight_index} does not exist on the page. Task incomplete",
+        f"System forced finish due to invalid highlight index for {action} action",
+    )
+
+
+def validate_action(
+    parsed: tuple[Optional[int], str, Optional[str], str],
+    index: Optional[Dict[int, IndexedElement]],
+) -> tuple[Optional[int], str, Optional[str], str]:
+    highlight_index, action = parsed[0], parsed[1]
+    if index is not None and action in INDEXED_ACTIONS and highlight_index not in index:
+        return invalid_index_finish_step(highlight_index, action)
+    return parsed
+
+
+def resolve_xpath(
+    highlight_index: Optional[int], index: Dict[int, IndexedElement]
+) -> Optional[str]:
+    element = index.get(highlight_index) if highlight_index is not None else None
+    return element.xpath if element else None
 
 
 def update_history(
     tool_calls: List[Dict[str, Any]],
     screenshot: Optional[str],
-    history_steps: List[HistoryStep],
-) -> tuple[Optional[int], str, Optional[str], str]:
+    history: AgentHistory,
+    index: Optional[Dict[int, IndexedElement]] = None,
+    dom_hash: Optional[str] = None,
+) -> tuple[int, str, Optional[str], AgentHistory]:
 
     if tool_calls:
-        tool_call = tool_calls[0]
-        tool_name = tool_call["name"]
-        tool_arguments = tool_call["args"]
-
-        tool_to_action_mapping = {
-            "click_element": "click",
-            "input_text": "input",
-            "press_key": "key_press",
-            "scroll_page": "scroll",
-            "navigate": "navigate",
-            "finish_task": "finish",
-            "upload_file": "upload",
-        }
-
-        action = tool_to_action_mapping.get(tool_name, "unknown")
-
-        if tool_name == "click_element":
-            highlight_index = tool_arguments.get("highlight_index", -1)
-            value = None
-        elif tool_name == "input_text":
-            highlight_index = tool_arguments.get("highlight_index", -1)
-            value = tool_arguments.get(
-                "input_text_content", tool_arguments.get("text", "")
-            )
-        elif tool_name == "press_key":
-            highlight_index = tool_arguments.get("highlight_index", -1)
-            value = tool_arguments.get("keyboard_key", tool_arguments.get("key", ""))
-        elif tool_name == "scroll_page":
-            highlight_index = None
-            value = tool_arguments.get("direction", "down")
-        elif tool_name == "navigate":
-            highlight_index = None
-            value = tool_arguments.get("url", "")
-        elif tool_name == "finish_task":
-            highlight_index = None
-            value = tool_arguments.get(
-                "task_completion_response", tool_arguments.get("response", "")
-            )
-        elif tool_name == "upload_file":
-            highlight_index = tool_arguments.get("highlight_index", -1)
-            value = tool_arguments.get("file_name", "resume.pdf")
-        else:
-            highlight_index = None
-            value = None
-
-        description = tool_arguments.get(
-            "action_description",
-            tool_arguments.get("description", f"Performed {action} action"),
+        highlight_index, action, value, description = validate_action(
+            parse_tool_call(tool_calls[0]), index
         )
-
     else:
-        action = "finish"
-        highlight_index = -1
-        value = "Agent error: Failed to select a tool. Task incomplete"
-        description = "System forced finish due to missing tool call"
+        highlight_index, action, value, description = forced_finish_step()
 
-    new_step = HistoryStep(
-        step_number=len(history_steps) + 1,
+    history.append(
         action=action,
         value=value,
         summary=description,
+        highlight_index=highlight_index if action in INDEXED_ACTIONS else None,
         screenshot=screenshot,
+        dom_hash=dom_hash,
     )
 
-    updated_history_steps = history_steps + [new_step]
-    history_json = json.dumps([step.dict() for step in updated_history_steps])
-
     return (
         highlight_index if highlight_index is not None else -1,
         action,
         value,
-        history_json,
+        history,
     )
+
+
+def select_action_batch(
+    tool_calls: List[Dict[str, Any]],
+    index: Dict[int, IndexedElement],
+) -> List[tuple[Optional[int], str, Optional[str], str]]:
+    if not tool_calls:
+        return [forced_finish_step()]
+
+    batch = [validate_action(parse_tool_call(tool_calls[0]), index)]
+    used_indexes = {batch[0][0]}
+
+    for tool_call in tool_calls[1:MAX_BATCH_ACTIONS]:
+        if batch[-1][1] not in BATCHABLE_ACTIONS:
+            break
+
+        highlight_index, action, value, description = parse_tool_call(tool_call)
+        if action in ("unknown", "finish"):
+            break
+        if action in INDEXED_ACTIONS and (
+            highlight_index not in index or highlight_index in used_indexes
+        ):
+            break
+
+        batch.append((highlight_index, action, value, description))
+        used_indexes.add(highlight_index)
+
+    return batch
+
+
+def update_history_batch(
+    tool_calls: List[Dict[str, Any]],
+    screenshot: Optional[str],
+    history: AgentHistory,
+    index: Dict[int, IndexedElement],
+    dom_hash: Optional[str] = None,
+) -> tuple[List[Dict[str, Any]], AgentHistory]:
+    batch = select_action_batch(tool_calls, index)
+
+    actions = []
+    for position, (highlight_index, action, value, description) in enumerate(batch):
+        history.append(
+            action=action,
+            value=value,
+            summary=description,
+            highlight_index=highlight_index if action in INDEXED_ACTIONS else None,
+            # All actions in a batch share one observation; keep it on the first
+            screenshot=screenshot if position == 0 else None,
+            dom_hash=dom_hash,
+        )
+        actions.append(
+            {
+                "highlightIndex": highlight_index if highlight_index is not None else -1,
+                "action": action,
+                "value": value,
+                "xpath": resolve_xpath(highlight_index, index),
+            }
+        )
+
+    return actions, history
@@ -1,5 +1,22 @@
-from typing import Dict, List, Optional, Union
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import AbstractSet, Dict, List, Optional, Tuple, Union
+import hashlib
+import marshal
+import sys
 from .models import PageDom, ElementNode, TextNode
+from .text_budget import TextBudget, TextPipeline, DEFAULT_TEXT_BUDGET
+from .element_ranking import LESS_RELEVANT_HEADER, RankingConfig, DEFAULT_RANKING_CONFIG, rank_lines
+from .render_cache import (
+    HIGHLIGHT_LINE,
+    NESTED_FRAGMENT,
+    STATIC_LINE,
+    TEXT_LINE,
+    FragmentBuilder,
+    RenderedFragment,
+    SubtreeCache,
+    render_cache,
+)
 
 
 NodeMap = Dict[str, Union[ElementNode, TextNode]]
@@ -19,6 +36,36 @@ DEFAULT_ATTRS: List[str] = [
     "data-state",
     "aria-checked",
 ]
+DEFAULT_ATTR_SET: frozenset[str] = frozenset(DEFAULT_ATTRS)
+ATTRIBUTE_CACHE_SIZE = 4096
+
+
+@dataclass(frozen=True)
+class IndexedElement:
+    node_id: str
+    xpath: str
+    tag: str
+
+
+@dataclass
+class RenderedDom:
+    regions: List[str]
+    index: Dict[int, IndexedElement]
+    total_nodes: int
+    clickable_count: int
+    contextual_count: int
+    trimmed_tokens: int = 0
+    ranked_out: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    # Rendered lines before ranking, only kept for recording ranking samples
+    unranked_lines: Optional[List[str]] = None
+    # Digest of the rendered text in page order, the same whatever the goal
+    content_hash: str = ""
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.regions)
 
 
 def build_interactive_dom(
@@ -26,18 +73,20 @@ def build_interactive_dom(
     *,
     include_attrs: Optional[List[str]] = None,
     indent_token: str = "\t",
-) -> str:
-    if include_attrs is None:
-        include_attrs = DEFAULT_ATTRS
+    text_budget: Optional[TextBudget] = None,
+    goal: Optional[str] = None,
+    ranking: RankingConfig = DEFAULT_RANKING_CONFIG,
+    cache: Optional[SubtreeCache] = render_cache,
+    keep_unranked: bool = False,
+) -> RenderedDom:
+    allowed_attrs = (
+        DEFAULT_ATTR_SET if include_attrs is None else frozenset(include_attrs)
+    )
 
     node_map: NodeMap = dom.map
-    parent_of: ParentMap = build_parent_lookup(node_map)
+    index = build_highlight_index(node_map)
+    text_pipeline = TextPipeline(budget=text_budget or DEFAULT_TEXT_BUDGET)
 
-    clickable_count = sum(
-        1
-        for node in node_map.values()
-        if isinstance(node, ElementNode) and node.highlightIndex is not None
-    )
     contextual_count = sum(
         1
         for node in node_map.values()
@@ -46,22 +95,81 @@ def build_interactive_dom(
         and should_include_for_context(node)
     )
 
+    state = RenderState(
+        node_map=node_map,
+        include_attrs=allowed_attrs,
+        indent_token=indent_token,
+        text_pipeline=text_pipeline,
+        cache=cache,
+    )
+    if cache is not None:
+        state.hashes = structural_hashes(node_map, dom.rootId, allowed_attrs)
+        state.variant = hash((allowed_attrs, indent_token, text_pipeline.budget))
+    depth_first_render(
+        dom.rootId, depth=0, parent=None, under_highlight=False, state=state, fragment=None
+    )
+    lines = unranked_lines = state.sink
+    ranked_out = 0
+    less_relevant_at = None
+    if goal and ranking.enabled:
+        lines, less_relevant, ranked_out = rank_lines(lines, goal, ranking)
+        if less_relevant:
+            # Ranked-out elements start their own regions, still reachable through expand_dom
+            less_relevant_at = len(lines)
+            lines = lines + [LESS_RELEVANT_HEADER] + less_relevant
+    regions = text_pipeline.paginate(lines, new_region_at=less_relevant_at)
+
     print(
-        f"\n[DOM] Total nodes: {len(node_map)}, Clickable elements: {clickable_count}, "
-        f"Contextual elements: {contextual_count}"
+        f"\n[DOM] Total nodes: {len(node_map)}, Clickable elements: {len(index)}, "
+        f"Contextual elements: {contextual_count}, Regions: {len(regions)}, "
+        f"Ranked out: {ranked_out}, Trimmed tokens: {text_pipeline.trimmed_tokens}, "
+        f"Deduped texts: {text_pipeline.deduped_texts}, "
+        f"Cached subtrees: {state.cache_hits}/{state.cache_hits + state.cache_misses}"
     )
 
-    lines: List[str] = []
-    depth_first_render(
-        node_id=dom.rootId,
-        depth=0,
-        node_map=node_map,
-        parent_of=parent_of,
-        include_attrs=include_attrs,
-        indent_token=indent_token,
-        sink=lines,
+    return RenderedDom(
+        regions=["\n".join(region) for region in regions],
+        index=index,
+        total_nodes=len(node_map),
+        clickable_count=len(index),
+        contextual_count=contextual_count,
+        trimmed_tokens=text_pipeline.trimmed_tokens,
+        ranked_out=ranked_out,
+        cache_hits=state.cache_hits,
+        cache_misses=state.cache_misses,
+        unranked_lines=unranked_lines if keep_unranked else None,
+        content_hash=hashlib.sha1("\n".join(unranked_lines).encode()).hexdigest(),
     )
-    return "\n".join(lines)
+
+
+@dataclass
+class SubtreeHashes:
+    keys: Dict[str, Tuple[bytes, int]]
+    highlight_order: List[int]
+
+
+@dataclass
+class RenderState:
+    node_map: NodeMap
+    include_attrs: AbstractSet[str]
+    indent_token: str
+    text_pipeline: TextPipeline
+    cache: Optional[SubtreeCache] = None
+    hashes: SubtreeHashes = field(default_factory=lambda: SubtreeHashes({}, []))
+    variant: int = 0
+    sink: List[str] = field(default_factory=list)
+    cache_hits: int = 0
+    cache_misses: int = 0
+
+
+def build_highlight_index(node_map: NodeMap) -> Dict[int, IndexedElement]:
+    return {
+        node.highlightIndex: IndexedElement(
+            node_id=node_id, xpath=node.xpath, tag=sys.intern(node.tagName)
+        )
+        for node_id, node in node_map.items()
+        if isinstance(node, ElementNode) and node.highlightIndex is not None
+    }
 
 
 def build_parent_lookup(node_map: NodeMap) -> ParentMap:
@@ -73,18 +181,6 @@ def build_parent_lookup(node_map: NodeMap) -> ParentMap:
     return parents
 
 
-def node_has_highlight_ancestor(
-    node_id: str, node_map: NodeMap, parent_of: ParentMap
-) -> bool:
-    parent_id = parent_of.get(node_id)
-    while parent_id:
-        parent = node_map[parent_id]
-        if isinstance(parent, ElementNode) and parent.highlightIndex is not None:
-            return True
-        parent_id = parent_of.get(parent_id)
-    return False
-
-
 def should_include_for_context(node: ElementNode) -> bool:
     # Commenting out contextual elements to reduce DOM noise
     # if node.tagName.lower() == "form":
@@ -102,90 +198,207 @@ def should_include_for_context(node: ElementNode) -> bool:
     return False
 
 
-def collect_text_until_next_highlight(start_id: str, node_map: NodeMap) -> str:
+def collect_text_until_next_highlight(
+    start_id: str, node_map: NodeMap, text_pipeline: TextPipeline
+) -> str:
     text_buffer: List[str] = []
 
     def walk(node_id: str) -> None:
         node = node_map[node_id]
         if isinstance(node, TextNode):
-            text = node.text.strip()
-            if text:
-                text_buffer.append(text)
+            text_buffer.append(node.text)
         elif isinstance(node, ElementNode):
             for child_id in node.children:
                 walk(child_id)
 
     walk(start_id)
-    return " ".join(text_buffer)
+    return text_pipeline.element_text(text_buffer)
+
+
+def subtree_digest(parts: tuple) -> bytes:
+    # marshal decodes back to the same tuple, so different tuples never encode the
+    # same way; version 2 writes no back-references, so equal tuples always match
+    return hashlib.blake2b(marshal.dumps(parts, 2), digest_size=16, person=b"element").digest()
+
+
+def structural_hashes(
+    node_map: NodeMap, root_id: str, include_attrs: AbstractSet[str]
+) -> SubtreeHashes:
+    """Hashes each subtree over everything its rendering depends on except highlight numbers.
+
+    Only clickable elements and elements with several children get a cache key:
+    a wrapper around a single child renders exactly what that child does. Each
+    key carries the position of the subtree's first highlight in document order.
+    The cache is shared by every user, so keys are digests rather than hash(),
+    whose collisions would replay another page's fragment.
+    """
+    keys: Dict[str, Tuple[bytes, int]] = {}
+    highlight_order: List[int] = []
+
+    def visit(node_id: str) -> bytes:
+        node = node_map[node_id]
+        if isinstance(node, TextNode):
+            return hashlib.blake2b(node.text.encode(), digest_size=16, person=b"text").digest()
+
+        first_highlight = len(highlight_order)
+        clickable = node.highlightIndex is not None
+        if clickable:
+            highlight_order.append(node.highlightIndex)
+        value = subtree_digest(
+            (
+                node.tagName,
+                tuple([(key, value) for key, value in node.attributes.items() if key in include_attrs]),
+                node.isInteractive,
+                node.isInViewport,
+                node.isTopElement,
+                node.isVisible,
+                clickable,
+                should_include_for_context(node),
+                tuple([visit(child_id) for child_id in node.children]),
+            )
+        )
+        if clickable or len(node.children) > 1:
+            keys[node_id] = (value, first_highlight)
+        return value
+
+    visit(root_id)
+    return SubtreeHashes(keys, highlight_order)
+
+
+def replay_fragment(
+    fragment: RenderedFragment, highlight_order: List[int], position: int, state: RenderState
+) -> int:
+    """Appends the fragment's lines, numbering its highlights from highlight_order[position:]."""
+    text_pipeline = state.text_pipeline
+    sink = state.sink
+    for item in fragment.items:
+        kind = item[0]
+        if kind == HIGHLIGHT_LINE:
+            sink.append(f"{item[1]}{highlight_order[position]}{item[2]}")
+            position += 1
+        elif kind == TEXT_LINE:
+            text = text_pipeline.text_node(item[2])
+            if text:
+                sink.append(f"{item[1]}{text}")
+        elif kind == NESTED_FRAGMENT:
+            position = replay_fragment(item[1], highlight_order, position, state)
+        else:
+            sink.append(item[1])
+    text_pipeline.trimmed_tokens += fragment.trimmed_tokens
+    text_pipeline.deduped_texts += fragment.deduped_texts
+    return position
 
 
 def depth_first_render(
     node_id: str,
     *,
     depth: int,
-    node_map: NodeMap,
-    parent_of: ParentMap,
-    include_attrs: List[str],
-    indent_token: str,
-    sink: List[str],
+    parent: Optional[ElementNode],
+    under_highlight: bool,
+    state: RenderState,
+    fragment: Optional[FragmentBuilder],
 ) -> None:
-    node = node_map[node_id]
-    indent = indent_token * depth
+    node = state.node_map[node_id]
+    indent = state.indent_token * depth
+    text_pipeline = state.text_pipeline
 
-    if isinstance(node, ElementNode):
-        clickable = node.highlightIndex is not None
-        contextual = should_include_for_context(node)
-        should_render = clickable or contextual
-        next_depth = depth + 1 if should_render else depth
-
-        if should_render:
-            text = collect_text_until_next_highlight(node_id, node_map)
-            attrs_html = format_attributes(node, include_attrs)
-            display_text = f"> {text}" if text else ""
-
-            if clickable:
-                sink.append(
-                    f"{indent}[{node.highlightIndex}]<{node.tagName}{attrs_html} "
-                    f"{display_text} />"
-                )
-            else:
-                sink.append(f"{indent}<{node.tagName}{attrs_html} {display_text} />")
-
-        for child_id in node.children:
-            depth_first_render(
-                node_id=child_id,
-                depth=next_depth,
-                node_map=node_map,
-                parent_of=parent_of,
-                include_attrs=include_attrs,
-                indent_token=indent_token,
-                sink=sink,
-            )
-    else:
-        if node_has_highlight_ancestor(node_id, node_map, parent_of):
+    if isinstance(node, TextNode):
+        if under_highlight or parent is None:
             return
+        if parent.isVisible and parent.isTopElement:
+            text = text_pipeline.text_node(node.text)
+            if text:
+                state.sink.append(f"{indent}{text}")
+            if fragment is not None:
+                fragment.add_item((TEXT_LINE, indent, node.text))
+        return
+
+    key = None
+    subtree = state.hashes.keys.get(node_id) if state.cache is not None else None
+    if subtree is not None:
+        structure, first_highlight = subtree
+        key = (state.variant, structure, depth, under_highlight)
+        cached = state.cache.get(key)
+        if cached is not None:
+            state.cache_hits += 1
+            # Highlight lines are emitted in document order, so this instance's
+            # own numbers fill the slots in the same order
+            replay_fragment(cached, state.hashes.highlight_order, first_highlight, state)
+            if fragment is not None:
+                fragment.add_fragment(cached)
+            return
+        state.cache_misses += 1
+    builder = FragmentBuilder() if key is not None else fragment
+
+    clickable = node.highlightIndex is not None
+    contextual = should_include_for_context(node)
+    should_render = clickable or contextual
+    next_depth = depth + 1 if should_render else depth
+
+    if should_render:
+        trimmed_before = text_pipeline.trimmed_tokens
+        deduped_before = text_pipeline.deduped_texts
+        text = collect_text_until_next_highlight(node_id, state.node_map, text_pipeline)
+        attrs_html = format_attributes(node, state.include_attrs)
+        display_text = f"> {text}" if text else ""
+
+        if clickable:
+            prefix = f"{indent}["
+            suffix = f"]<{node.tagName}{attrs_html} {display_text} />"
+            state.sink.append(f"{prefix}{node.highlightIndex}{suffix}")
+            item = (HIGHLIGHT_LINE, prefix, suffix)
+        else:
+            line = f"{indent}<{node.tagName}{attrs_html} {display_text} />"
+            state.sink.append(line)
+            item = (STATIC_LINE, line)
+
+        if builder is not None:
+            builder.add_item(item)
+            builder.trimmed_tokens += text_pipeline.trimmed_tokens - trimmed_before
+            builder.deduped_texts += text_pipeline.deduped_texts - deduped_before
+
+    for child_id in node.children:
+        depth_first_render(
+            child_id,
+            depth=next_depth,
+            parent=node,
+            under_highlight=under_highlight or clickable,
+            state=state,
+            fragment=builder,
+        )
+
+    if key is not None:
+        rendered = builder.build()
+        state.cache.put(key, rendered)
+        if fragment is not None:
+            fragment.add_fragment(rendered)
+
+
+def format_attributes(element: ElementNode, include_attrs: AbstractSet[str]) -> str:
+    attribute_items = tuple(
+        (key, value) for key, value in element.attributes.items() if key in include_attrs
+    )
+    flags = (element.isInteractive, element.isInViewport, element.isTopElement)
+    return format_attribute_items(sys.intern(element.tagName), attribute_items, flags)
 
-        parent_id = parent_of.get(node_id)
-        parent = node_map.get(parent_id) if parent_id else None
-
-        if isinstance(parent, ElementNode):
-            if parent.isVisible and parent.isTopElement:
-                sink.append(f"{indent}{node.text}")
-
-
-def format_attributes(element: ElementNode, include_attrs: List[str]) -> str:
-    attrs = {
-        key: value.strip()
-        for key, value in element.attributes.items()
-        if key in include_attrs and value.strip()
-    }
 
-    if element.isInteractive is not None:
-        attrs["data-interactive"] = str(element.isInteractive).lower()
-    if element.isInViewport is not None:
-        attrs["data-in-viewport"] = str(element.isInViewport).lower()
-    if element.isTopElement is not None:
-        attrs["data-top-element"] = str(element.isTopElement).lower()
+# Feeds repeat the same tag/attribute combinations thousands of times, so the
+# formatted string is cached on everything that affects it.
+@lru_cache(maxsize=ATTRIBUTE_CACHE_SIZE)
+def format_attribute_items(
+    tag: str,
+    attribute_items: Tuple[Tuple[str, str], ...],
+    flags: Tuple[Optional[bool], Optional[bool], Optional[bool]],
+) -> str:
+    attrs = {key: value.strip() for key, value in attribute_items if value.strip()}
+
+    is_interactive, is_in_viewport, is_top_element = flags
+    if is_interactive is not None:
+        attrs["data-interactive"] = str(is_interactive).lower()
+    if is_in_viewport is not None:
+        attrs["data-in-viewport"] = str(is_in_viewport).lower()
+    if is_top_element is not None:
+        attrs["data-top-element"] = str(is_top_element).lower()
 
     return (
         " " + " ".join(f"{key}={value!r}" for key, value in attrs.items())
@@ -0,0 +1,66 @@
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict
+import math
+
+
+LATENCY_WINDOW = 512
+
+
+class LatencyStats:
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> float | None:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        rank = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+        return ordered[rank]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 4) if self.count else None,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "max": round(self.max, 4),
+        }
+
+
+COUNTERS: Dict[str, float] = defaultdict(float)
+LATENCIES: Dict[str, LatencyStats] = defaultdict(LatencyStats)
+# Same rolling window, for byte counts rather than seconds
+SIZES: Dict[str, LatencyStats] = defaultdict(LatencyStats)
+
+
+def increment(name: str, amount: float = 1) -> None:
+    COUNTERS[name] += amount
+
+
+def observe_latency(name: str, seconds: float) -> None:
+    LATENCIES[name].observe(seconds)
+
+
+def get_latency(name: str) -> LatencyStats:
+    return LATENCIES[name]
+
+
+def observe_bytes(name: str, size: int) -> None:
+    SIZES[name].observe(size)
+
+
+def snapshot() -> Dict[str, Any]:
+    return {
+        "counters": {name: round(value, 6) for name, value in sorted(COUNTERS.items())},
+        "latencies": {name: stats.snapshot() for name, stats in sorted(LATENCIES.items())},
+        "sizes": {name: stats.snapshot() for name, stats in sorted(SIZES.items())},
+    }
@@ -0,0 +1,74 @@
+from typing import Any, List, Optional
+
+from . import metrics
+from .models import HistoryStep
+
+
+STRONG_TIER = "strong"
+FAST_TIER = "fast"
+
+# Steps that follow these actions are usually mechanical (press Enter after typing,
+# keep scrolling a feed), so the fast model handles them well.
+FAST_FOLLOWUP_ACTIONS = {"input", "scroll"}
+
+FAST_TIER_MAX_ELEMENTS = 150
+FORCED_FINISH_SUMMARY = "System forced finish due to missing tool call"
+
+# USD per 1M tokens (input, output). Unknown models are tracked with zero cost.
+MODEL_PRICING = {
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+
+def select_model_tier(
+    history_steps: List[HistoryStep],
+    element_count: int,
+    mode_tier: Optional[str],
+    screenshot_ref: Optional[str],
+) -> str:
+    if not history_steps:
+        return STRONG_TIER
+    if mode_tier is not None:
+        return mode_tier
+    if element_count > FAST_TIER_MAX_ELEMENTS:
+        return STRONG_TIER
+
+    previous_step = history_steps[-1]
+    if previous_step.summary == FORCED_FINISH_SUMMARY:
+        return STRONG_TIER
+
+    # An unchanged screenshot means the last action had no visible effect, which
+    # calls for recovery reasoning rather than a routine follow-up.
+    screenshot_changed = screenshot_ref is None or screenshot_ref != previous_step.screenshot_ref
+    if not screenshot_changed:
+        return STRONG_TIER
+
+    if previous_step.action in FAST_FOLLOWUP_ACTIONS:
+        return FAST_TIER
+    return STRONG_TIER
+
+
+def estimate_cost(model_name: str, input_tokens: int, output_tokens: int) -> float:
+    for name in sorted(MODEL_PRICING, key=len, reverse=True):
+        if model_name.startswith(name):
+            input_price, output_price = MODEL_PRICING[name]
+            return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+    return 0.0
+
+
+def record_tier_call(tier: str, model_name: str, response: Any, seconds: float) -> None:
+    usage = getattr(response, "usage_metadata", None) or {}
+    input_tokens = usage.get("input_tokens", 0)
+    output_tokens = usage.get("output_tokens", 0)
+
+    metrics.increment(f"llm.{tier}.calls")
+    metrics.increment(f"llm.{tier}.input_tokens", input_tokens)
+    metrics.increment(f"llm.{tier}.output_tokens", output_tokens)
+    metrics.increment(
+        f"llm.{tier}.cost_usd", estimate_cost(model_name, input_tokens, output_tokens)
+    )
+    metrics.observe_latency(f"llm.{tier}", seconds)
@@ -1,14 +1,23 @@
-from pydantic import BaseModel
-from typing import Literal, Union, Optional
-
-
-class TextNode(BaseModel):
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from pydantic.dataclasses import dataclass
+from typing import Annotated, Any, Literal, Union, Optional
+import hashlib
+import json
+import uuid
+
+
+# A large page is tens of thousands of nodes. Slotted dataclasses are validated
+# straight from the request bytes like models are, at about a third of the memory
+# (no per-instance __dict__ or fields-set bookkeeping).
+@dataclass(slots=True)
+class TextNode:
     type: Literal["TEXT_NODE"]
     text: str
     isVisible: bool
 
 
-class ElementNode(BaseModel):
+@dataclass(slots=True)
+class ElementNode:
     type: Literal["ELEMENT_NODE"]
     tagName: str
     attributes: dict[str, str]
@@ -21,34 +30,207 @@ class ElementNode(BaseModel):
     highlightIndex: int | None = None
 
 
+# Tagged by "type" so each node is validated against one model instead of trying both
+DomNode = Annotated[Union[TextNode, ElementNode], Field(discriminator="type")]
+
+
 class PageDom(BaseModel):
     rootId: str
-    map: dict[str, Union[TextNode, ElementNode]]
+    map: dict[str, DomNode]
+
+
+HISTORY_SCHEMA_VERSION = 2
+
+
+def screenshot_ref(screenshot: str) -> str:
+    return hashlib.sha1(screenshot.encode()).hexdigest()[:16]
+
+
+class HistoryStep(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    step_number: int
+    action: str
+    value: Optional[str] = None
+    summary: str
+    highlight_index: Optional[int] = None
+    screenshot_ref: Optional[str] = None
+    # Fingerprint of the page the action was chosen on, for stall detection
+    dom_hash: Optional[str] = None
+
+
+class LegacyHistoryStep(BaseModel):
+    step_number: int
+    action: str
+    value: Optional[str] = None
+    summary: str
+    screenshot: Optional[str] = None
+
+
+class AgentHistory(BaseModel):
+    """Append-only step log; screenshots are stored once, out of band, by ref."""
+
+    model_config = ConfigDict(extra="forbid")
+
+    version: Literal[2] = HISTORY_SCHEMA_VERSION
+    session_id: str
+    steps: list[HistoryStep] = []
+    screenshots: dict[str, str] = {}
+
+    @classmethod
+    def new_session(cls) -> "AgentHistory":
+        return cls(session_id=uuid.uuid4().hex)
+
+    @classmethod
+    def from_legacy(cls, raw: str) -> "AgentHistory":
+        data = json.loads(raw)
+        if isinstance(data, list):
+            legacy_steps = [LegacyHistoryStep.model_validate(step) for step in data]
+        elif isinstance(data, dict):
+            if not all(isinstance(step, dict) for step in data.values()):
+                raise ValueError("legacy history steps must be objects")
+            legacy_steps = [
+                LegacyHistoryStep(
+                    step_number=int(step_number),
+                    action=step.get("action", "unknown"),
+                    value=step.get("value"),
+                    summary=step.get("description", ""),
+                    screenshot=step.get("screenshot"),
+                )
+                for step_number, step in data.items()
+            ]
+        else:
+            raise ValueError("legacy history must be a list or an object keyed by step")
+
+        legacy_steps.sort(key=lambda legacy: legacy.step_number)
+        if legacy_steps:
+            # Legacy clients resend the whole history every step, so the run is
+            # identified by its first step rather than a new id per request
+            first_step = legacy_steps[0].model_dump_json().encode()
+            history = cls(session_id=f"legacy-{hashlib.sha1(first_step).hexdigest()[:24]}")
+        else:
+            history = cls.new_session()
+        for step in legacy_steps:
+            history.append(
+                action=step.action,
+                value=step.value,
+                summary=step.summary,
+                screenshot=step.screenshot,
+            )
+        return history
+
+    def append(
+        self,
+        *,
+        action: str,
+        value: Optional[str],
+        summary: str,
+        highlight_index: Optional[int] = None,
+        screenshot: Optional[str] = None,
+        dom_hash: Optional[str] = None,
+    ) -> HistoryStep:
+        ref = None
+        if screenshot:
+            ref = screenshot_ref(screenshot)
+            self.screenshots.setdefault(ref, screenshot)
+
+        step = HistoryStep(
+            step_number=len(self.steps) + 1,
+            action=action,
+            value=value,
+            summary=summary,
+            highlight_index=highlight_index,
+            screenshot_ref=ref,
+            dom_hash=dom_hash,
+        )
+        self.steps.append(step)
+        return step
+
+    def screenshot_for(self, step: HistoryStep) -> Optional[str]:
+        return self.screenshots.get(step.screenshot_ref) if step.screenshot_ref else None
+
+    def recent_screenshot_refs(self, steps: Optional[int]) -> list[str]:
+        """Screenshots the last `steps` steps refer to (None means every step)."""
+        recent = self.steps if steps is None else self.steps[-steps:] if steps else []
+        return list(dict.fromkeys(step.screenshot_ref for step in recent if step.screenshot_ref))
+
+    def keep_recent_screenshots(self, steps: Optional[int]) -> None:
+        """Drops screenshots that none of the last `steps` steps refer to (None keeps all)."""
+        if steps is None:
+            return
+        needed = set(self.recent_screenshot_refs(steps))
+        self.screenshots = {ref: shot for ref, shot in self.screenshots.items() if ref in needed}
+
+    def without_screenshots(self) -> "AgentHistory":
+        # The client sent every screenshot itself and keeps them; echoing them back
+        # would make each response as large as the whole session
+        return self.model_copy(update={"screenshots": {}})
 
 
 class AgentRequest(BaseModel):
     dom: PageDom
     prompt: str
-    history: str | None = None
+    history: AgentHistory | None = None
     screenshot: str | None = None
     agentMode: str | None = None
     jobApplicationData: dict | None = None
     email: str
+    multiAction: bool = False
+    includeScreenshots: bool = False
+    # False renders every element in page order instead of the most relevant first
+    rankElements: bool = True
 
+    @field_validator("history", mode="before")
+    @classmethod
+    def upgrade_legacy_history(cls, history: Any) -> Any:
+        # Older extensions send the history as a JSON string; malformed input is
+        # rejected with a 422 instead of silently starting a new (billed) session
+        if isinstance(history, str):
+            return AgentHistory.from_legacy(history) if history.strip() else None
+        return history
 
-class AgentResponse(BaseModel):
+
+class AgentSessionStart(BaseModel):
+    """First message on /agent/ws; everything that stays fixed for the whole run."""
+
+    type: Literal["start"]
+    email: str
+    prompt: str
+    agentMode: str | None = None
+    jobApplicationData: dict | None = None
+    multiAction: bool = False
+    rankElements: bool = True
+
+
+class AgentObservation(BaseModel):
+    type: Literal["observation"]
+    dom: PageDom
+    screenshot: str | None = None
+
+
+class AgentSessionStop(BaseModel):
+    type: Literal["stop"]
+
+
+AgentSessionMessage = Annotated[
+    Union[AgentObservation, AgentSessionStop], Field(discriminator="type")
+]
+
+
+class AgentAction(BaseModel):
     highlightIndex: int
     action: str
     value: str | None = None
-    history: str
+    xpath: str | None = None
 
 
-class HistoryStep(BaseModel):
-    step_number: int
+class AgentResponse(BaseModel):
+    highlightIndex: int
     action: str
-    value: Optional[str] = None
-    summary: str
-    screenshot: Optional[str] = None
+    value: str | None = None
+    xpath: str | None = None
+    history: AgentHistory
+    actions: list[AgentAction] = []
 
 
 class EnrichRequest(BaseModel):
@@ -335,6 +335,21 @@ a user-defined stop rule is met). Volume and persistence are paramount.
 """
 
 
+MULTI_ACTION_PROMPT = """
+##############################################################################
+# MULTI-ACTION MODE
+##############################################################################
+This step may contain SEVERAL tool calls instead of one (overrides core rule 1).
+• Only batch actions that do not depend on each other's result, e.g. filling
+  several form fields that are ALL visible in the current DOM and screenshot.
+• input_text and upload_file calls can be batched; order them top to bottom.
+• At most one click_element, press_key, scroll_page or navigate call, and it must
+  be the LAST call of the batch, because it may change the page.
+• Never batch finish_task; never use the same highlightIndex twice.
+• When unsure, return a single tool call.
+"""
+
+
 def format_user_prompt(formatted_dom: str, objective: str) -> str:
     return f"""
 ##############################################################################
@@ -368,51 +383,44 @@ RULE: If screenshot and DOM conflict, trust the screenshot.
 """
 
 
-def get_mode_prompt(agent_mode: str | None, job_application_data: dict | None = None) -> str:
-    if agent_mode == "social_media":
-        return SOCIAL_MEDIA_PROMPT
-    elif agent_mode == "job_application" and job_application_data:
-        preferred_locations = job_application_data.get("preferredLocations", [])
-        locations_str = ", ".join([loc for loc in preferred_locations if loc])
-        
-        return JOB_APPLICATION_PROMPT.format(
-            firstName=job_application_data.get("firstName", ""),
-            lastName=job_application_data.get("lastName", ""),
-            preferredName=job_application_data.get("preferredName", ""),
-            email=job_application_data.get("email", ""),
-            phoneNumber=job_application_data.get("phoneNumber", ""),
-            currentLocation=job_application_data.get("currentLocation", ""),
-            currentCompany=job_application_data.get("currentCompany", ""),
-            aboutMe=job_application_data.get("aboutMe", ""),
-            linkedinUrl=job_application_data.get("linkedinUrl", ""),
-            githubUrl=job_application_data.get("githubUrl", ""),
-            websiteUrl=job_application_data.get("websiteUrl", ""),
-            languages=job_application_data.get("languages", ""),
-            school=job_application_data.get("school", ""),
-            startDate=job_application_data.get("startDate", ""),
-            expectedGraduation=job_application_data.get("expectedGraduation", ""),
-            hasOfferDeadlines="Yes" if job_application_data.get("hasOfferDeadlines", False) else "No",
-            preferredStartDate=job_application_data.get("preferredStartDate", ""),
-            preferredLocations=locations_str,
-            isFinalInternship="Yes" if job_application_data.get("isFinalInternship", False) else "No",
-            requiresSponsorship="Yes" if job_application_data.get("requiresSponsorship", False) else "No",
-            legallyAuthorizedToWork="Yes" if job_application_data.get("legallyAuthorizedToWork", False) else "No",
-            veteranStatus=job_application_data.get("veteranStatus", "prefer-not-to-answer"),
-            streetAddress=job_application_data.get("streetAddress", ""),
-            streetAddress2=job_application_data.get("streetAddress2", ""),
-            city=job_application_data.get("city", ""),
-            state=job_application_data.get("state", ""),
-            zipCode=job_application_data.get("zipCode", ""),
-            hasResume="Yes" if job_application_data.get("resumeFile") else "No",
-            resumeFileName=job_application_data.get("resumeFileName", "")
-        )
-    else:
-        return ""
-
-
-def get_enrich_mode_context(agent_mode: str | None) -> str:
-    if agent_mode == "social_media":
-        return """
+def format_job_application_prompt(job_application_data: dict) -> str:
+    preferred_locations = job_application_data.get("preferredLocations", [])
+    locations_str = ", ".join([loc for loc in preferred_locations if loc])
+    
+    return JOB_APPLICATION_PROMPT.format(
+        firstName=job_application_data.get("firstName", ""),
+        lastName=job_application_data.get("lastName", ""),
+        preferredName=job_application_data.get("preferredName", ""),
+        email=job_application_data.get("email", ""),
+        phoneNumber=job_application_data.get("phoneNumber", ""),
+        currentLocation=job_application_data.get("currentLocation", ""),
+        currentCompany=job_application_data.get("currentCompany", ""),
+        aboutMe=job_application_data.get("aboutMe", ""),
+        linkedinUrl=job_application_data.get("linkedinUrl", ""),
+        githubUrl=job_application_data.get("githubUrl", ""),
+        websiteUrl=job_application_data.get("websiteUrl", ""),
+        languages=job_application_data.get("languages", ""),
+        school=job_application_data.get("school", ""),
+        startDate=job_application_data.get("startDate", ""),
+        expectedGraduation=job_application_data.get("expectedGraduation", ""),
+        hasOfferDeadlines="Yes" if job_application_data.get("hasOfferDeadlines", False) else "No",
+        preferredStartDate=job_application_data.get("preferredStartDate", ""),
+        preferredLocations=locations_str,
+        isFinalInternship="Yes" if job_application_data.get("isFinalInternship", False) else "No",
+        requiresSponsorship="Yes" if job_application_data.get("requiresSponsorship", False) else "No",
+        legallyAuthorizedToWork="Yes" if job_application_data.get("legallyAuthorizedToWork", False) else "No",
+        veteranStatus=job_application_data.get("veteranStatus", "prefer-not-to-answer"),
+        streetAddress=job_application_data.get("streetAddress", ""),
+        streetAddress2=job_application_data.get("streetAddress2", ""),
+        city=job_application_data.get("city", ""),
+        state=job_application_data.get("state", ""),
+        zipCode=job_application_data.get("zipCode", ""),
+        hasResume="Yes" if job_application_data.get("resumeFile") else "No",
+        resumeFileName=job_application_data.get("resumeFileName", "")
+    )
+
+
+SOCIAL_MEDIA_ENRICH_CONTEXT = """
 When enriching for social-media tasks:
 
 1. Break the job repeatable steps:
@@ -440,8 +448,9 @@ comment a funny one-liner in lowercase
 repeat indefinitely
 
 """
-    elif agent_mode == "job_application":
-        return """
+
+
+JOB_APPLICATION_ENRICH_CONTEXT = """
 When enriching for job application tasks:
 
 1. Break down the application process into clear steps:
@@ -473,5 +482,3 @@ proceed to next step if multi-page form
 review application
 do not submit unless explicitly instructed
 """
-    else:
-        return ""
\ No newline at end of file
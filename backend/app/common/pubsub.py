@@ -0,0 +1,123 @@
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Set
+import asyncio
+import os
+
+from . import metrics
+
+
+# "memory" only reaches subscribers in this worker; "mongo" fans out through a
+# change stream so every worker sees every message (needs a replica set, e.g. Atlas)
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "memory")
+PUBSUB_COLLECTION = "events"
+# Messages are only read live; the collection is just the transport
+PUBSUB_EVENT_TTL_SECONDS = 3600
+PUBSUB_RETRY_SECONDS = 5.0
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class PubSub(ABC):
+    """Delivers small JSON messages to the subscribers in this process.
+
+    Channels are named "topic:key". Subscribing to a whole topic hears every key
+    under it; subscribing to "topic:key" hears only that key.
+    """
+
+    def __init__(self):
+        self.subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+
+    def subscribe(self, channel: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.subscribers[channel].add(queue)
+        return queue
+
+    def unsubscribe(self, channel: str, queue: asyncio.Queue) -> None:
+        queues = self.subscribers.get(channel)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self.subscribers[channel]
+
+    def deliver(self, channel: str, message: Dict[str, Any]) -> None:
+        queues = tuple(self.subscribers.get(channel, ()))
+        topic = channel.partition(":")[0]
+        if topic != channel:
+            queues += tuple(self.subscribers.get(topic, ()))
+        for queue in queues:
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # A subscriber that stopped reading must not hold up the others
+                metrics.increment("pubsub.dropped")
+
+    @abstractmethod
+    async def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        ...
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemoryPubSub(PubSub):
+    async def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        metrics.increment("pubsub.published")
+        self.deliver(channel, message)
+
+
+class MongoPubSub(PubSub):
+    def __init__(self, collection):
+        super().__init__()
+        self.collection = collection
+        self.closed = False
+        self.listener: Optional[asyncio.Task] = None
+
+    async def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        metrics.increment("pubsub.published")
+        await asyncio.to_thread(
+            self.collection.insert_one,
+            {"channel": channel, "message": message, "created_at": datetime.now(timezone.utc)},
+        )
+
+    async def start(self) -> None:
+        # Listening starts in the background so an unreachable Mongo cannot block startup
+        self.listener = asyncio.create_task(self.listen())
+
+    async def close(self) -> None:
+        self.closed = True
+        if self.listener is not None:
+            self.listener.cancel()
+
+    def watch(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.collection.create_index("created_at", expireAfterSeconds=PUBSUB_EVENT_TTL_SECONDS)
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        # Short awaits so the thread notices close() within a second
+        with self.collection.watch(pipeline, max_await_time_ms=1000) as stream:
+            while not self.closed:
+                change = stream.try_next()
+                if change is not None:
+                    event = change["fullDocument"]
+                    loop.call_soon_threadsafe(self.deliver, event["channel"], event["message"])
+
+    async def listen(self) -> None:
+        loop = asyncio.get_running_loop()
+        while not self.closed:
+            try:
+                await asyncio.to_thread(self.watch, loop)
+            except Exception as e:
+                metrics.increment("pubsub.watch_failures")
+                print(f"[PubSub] Change stream failed, retrying in {PUBSUB_RETRY_SECONDS:.0f}s: {e}")
+                await asyncio.sleep(PUBSUB_RETRY_SECONDS)
+
+
+def create_pubsub(db) -> PubSub:
+    if PUBSUB_BACKEND == "memory":
+        return InMemoryPubSub()
+    if PUBSUB_BACKEND == "mongo":
+        return MongoPubSub(db[PUBSUB_COLLECTION])
+    raise ValueError(f"Unknown PUBSUB_BACKEND: {PUBSUB_BACKEND}")
@@ -0,0 +1,107 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+import os
+import sys
+
+
+# Rendered subtrees keyed by structural hash, shared by every page this process
+# renders. A fragment's size counts its own lines; nested fragments count in
+# their own entries. 0 turns the cache off.
+DOM_RENDER_CACHE_BYTES = int(os.getenv("DOM_RENDER_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+# Fragment items. Highlight lines leave the index out, since repeated cards share
+# the markup but not the numbering; text lines go back through the page's
+# TextPipeline on every replay because repeated-text dedupe depends on what came
+# earlier on the page. Nested subtrees are kept by reference.
+HIGHLIGHT_LINE = 0
+TEXT_LINE = 1
+STATIC_LINE = 2
+NESTED_FRAGMENT = 3
+
+ITEM_OVERHEAD = sys.getsizeof((0, "", "")) + 8
+FRAGMENT_OVERHEAD = 200
+
+
+@dataclass(frozen=True)
+class RenderedFragment:
+    items: Tuple[Tuple[Any, ...], ...]
+    trimmed_tokens: int
+    deduped_texts: int
+    size: int
+
+
+class FragmentBuilder:
+    def __init__(self) -> None:
+        self.items: List[Tuple[Any, ...]] = []
+        self.trimmed_tokens = 0
+        self.deduped_texts = 0
+        self.size = FRAGMENT_OVERHEAD
+
+    def add_item(self, item: Tuple[Any, ...]) -> None:
+        self.items.append(item)
+        self.size += ITEM_OVERHEAD + sum(sys.getsizeof(part) for part in item[1:])
+
+    def add_fragment(self, fragment: RenderedFragment) -> None:
+        # Empty subtrees (hidden wrappers, skipped text) need no replay
+        if fragment.items:
+            self.items.append((NESTED_FRAGMENT, fragment))
+            self.size += ITEM_OVERHEAD
+
+    def build(self) -> RenderedFragment:
+        return RenderedFragment(
+            tuple(self.items), self.trimmed_tokens, self.deduped_texts, self.size
+        )
+
+
+class SubtreeCache:
+    def __init__(self, max_bytes: int = DOM_RENDER_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[Hashable, RenderedFragment]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[RenderedFragment]:
+        fragment = self.entries.get(key)
+        if fragment is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return fragment
+
+    def put(self, key: Hashable, fragment: RenderedFragment) -> None:
+        if fragment.size > self.max_bytes:
+            return
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.bytes -= previous.size
+        self.entries[key] = fragment
+        self.bytes += fragment.size
+        while self.bytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.bytes -= evicted.size
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+        }
+
+
+render_cache: Optional[SubtreeCache] = (
+    SubtreeCache(DOM_RENDER_CACHE_BYTES) if DOM_RENDER_CACHE_BYTES > 0 else None
+)
@@ -0,0 +1,83 @@
+from typing import Iterable, Optional, Type, TypeVar, Union
+import os
+
+from fastapi import HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+
+from .models import PageDom
+
+
+# A page DOM plus a JPEG screenshot is a few MB; anything far beyond that is not a real page
+MAX_AGENT_BODY_BYTES = int(os.getenv("AGENT_MAX_BODY_BYTES", str(32 * 1024 * 1024)))
+# Heavy feeds reach ~30k nodes. Pages far past that are runaway infinite scrolls,
+# and a body cap alone would still let one through at several hundred MB parsed.
+MAX_DOM_NODES = int(os.getenv("AGENT_MAX_DOM_NODES", "60000"))
+MAX_SCREENSHOT_BYTES = int(os.getenv("AGENT_MAX_SCREENSHOT_BYTES", str(8 * 1024 * 1024)))
+
+# JSON.stringify writes no spaces, and quotes inside string values are escaped,
+# so these only match node objects
+NODE_MARKERS = (b'"type":"ELEMENT_NODE"', b'"type":"TEXT_NODE"')
+TEXT_NODE_MARKERS = tuple(marker.decode() for marker in NODE_MARKERS)
+
+Model = TypeVar("Model", bound=BaseModel)
+
+
+async def read_body(request: Request, limit: int) -> bytearray:
+    declared = request.headers.get("content-length")
+    if declared is not None:
+        if not declared.isdigit():
+            raise HTTPException(status_code=400, detail="Invalid Content-Length")
+        # Reject before reading a single byte
+        if int(declared) > limit:
+            raise HTTPException(status_code=413, detail=f"Request body exceeds {limit} bytes")
+
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        # Chunked uploads carry no Content-Length, so keep counting
+        if len(body) > limit:
+            raise HTTPException(status_code=413, detail=f"Request body exceeds {limit} bytes")
+    return body
+
+
+def parse_body(model: Type[Model], body: bytearray) -> Model:
+    try:
+        # pydantic-core parses and validates in one pass, without building an
+        # intermediate dict of the whole payload first
+        return model.model_validate_json(body)
+    except ValidationError as e:
+        # Same 422 shape as FastAPI's own body validation, minus the echoed input,
+        # which for a bad page would be the whole DOM
+        errors = e.errors(include_url=False, include_input=False)
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in errors]
+        )
+
+
+def count_dom_nodes(body: Union[bytes, bytearray, str]) -> int:
+    """Counts nodes in the raw body without parsing it.
+
+    Other encoders may add spaces, so this can undercount; check_page_limits
+    counts again after parsing.
+    """
+    markers = TEXT_NODE_MARKERS if isinstance(body, str) else NODE_MARKERS
+    return sum(body.count(marker) for marker in markers)
+
+
+def check_node_count(count: int) -> None:
+    if count > MAX_DOM_NODES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Page has {count} DOM nodes; at most {MAX_DOM_NODES} are accepted",
+        )
+
+
+def check_page_limits(dom: PageDom, screenshots: Iterable[Optional[str]]) -> None:
+    check_node_count(len(dom.map))
+    for screenshot in screenshots:
+        if screenshot and len(screenshot) > MAX_SCREENSHOT_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Screenshot is {len(screenshot)} bytes; at most {MAX_SCREENSHOT_BYTES} are accepted",
+            )
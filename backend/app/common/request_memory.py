@@ -0,0 +1,69 @@
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional, Tuple
+import os
+import resource
+import sys
+
+from . import metrics
+
+
+# Steps that grow the worker's RSS by more than this are logged with their breakdown
+MEMORY_LOG_BYTES = int(os.getenv("AGENT_MEMORY_LOG_BYTES", str(64 * 1024 * 1024)))
+
+
+def process_memory() -> Tuple[int, int]:
+    """Current and peak resident set size of this process, in bytes."""
+    try:
+        with open("/proc/self/status") as status:
+            fields = dict(line.split(":", 1) for line in status if ":" in line)
+        return int(fields["VmRSS"].split()[0]) * 1024, int(fields["VmHWM"].split()[0]) * 1024
+    except (OSError, KeyError, ValueError):
+        # No procfs (macOS): only the peak is available, in bytes there and KB on Linux
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = peak if sys.platform == "darwin" else peak * 1024
+        return peak, peak
+
+
+def screenshot_bytes(screenshots: Iterable[Optional[str]]) -> int:
+    return sum(len(screenshot) for screenshot in screenshots if screenshot)
+
+
+@dataclass
+class RequestMemory:
+    """Byte sizes of what one agent step holds, plus how far the worker's RSS moved.
+
+    The parts are exact payload sizes; RSS growth is measured but also includes
+    whatever concurrent requests allocated in the meantime.
+    """
+
+    name: str
+    rss_start: int
+    peak_start: int
+    parts: Dict[str, int] = field(default_factory=dict)
+
+    @classmethod
+    def start(cls, name: str) -> "RequestMemory":
+        rss, peak = process_memory()
+        return cls(name, rss, peak)
+
+    def add(self, part: str, size: int) -> None:
+        self.parts[part] = self.parts.get(part, 0) + size
+
+    def finish(self) -> None:
+        rss, peak = process_memory()
+        # If the process reached a new peak during the step, that peak is the
+        # closest measure of the step's own high-water mark
+        high_water = peak if peak > self.peak_start else rss
+        growth = max(high_water - self.rss_start, 0)
+        for part, size in self.parts.items():
+            metrics.observe_bytes(f"{self.name}.{part}", size)
+        metrics.observe_bytes(f"{self.name}.rss_growth", growth)
+        metrics.observe_bytes("process.rss", rss)
+        metrics.observe_bytes("process.peak_rss", peak)
+
+        if growth > MEMORY_LOG_BYTES:
+            parts = ", ".join(f"{part}={size / 1e6:.1f}MB" for part, size in self.parts.items())
+            print(
+                f"[Memory] {self.name} grew RSS by {growth / 1e6:.1f}MB "
+                f"(now {rss / 1e6:.0f}MB, peak {peak / 1e6:.0f}MB): {parts}"
+            )
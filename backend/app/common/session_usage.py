@@ -0,0 +1,122 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from .model_router import estimate_cost
+from .write_buffer import WriteBuffer
+
+
+USAGE_FIELDS = (
+    "steps",
+    "llm_calls",
+    "input_tokens",
+    "output_tokens",
+    "cached_tokens",
+    "images",
+    "llm_seconds",
+    "cost_usd",
+    "calls_saved",
+    "hedged_calls",
+)
+
+
+def response_usage(response: Any) -> Dict[str, int]:
+    usage = getattr(response, "usage_metadata", None) or {}
+    details = usage.get("input_token_details") or {}
+    return {
+        "input_tokens": usage.get("input_tokens", 0),
+        "output_tokens": usage.get("output_tokens", 0),
+        "cached_tokens": details.get("cache_read", 0) or 0,
+    }
+
+
+def count_images(messages: List[Any]) -> int:
+    # The usage metadata does not split out image tokens, so count what was attached
+    return sum(
+        1
+        for message in messages
+        if isinstance(message.content, list)
+        for part in message.content
+        if isinstance(part, dict) and part.get("type") == "image_url"
+    )
+
+
+@dataclass
+class StepUsage:
+    llm_calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    images: int = 0
+    llm_seconds: float = 0.0
+    cost_usd: float = 0.0
+    # Model calls skipped because the session was going nowhere
+    calls_saved: int = 0
+    # Extra calls sent by hedging; they were cancelled but still billed
+    hedged_calls: int = 0
+    tiers: Dict[str, int] = field(default_factory=dict)
+
+    def add_call(
+        self,
+        tier: str,
+        model_name: str,
+        messages: List[Any],
+        response: Any,
+        seconds: float,
+        attempts: int = 1,
+    ) -> None:
+        usage = response_usage(response)
+        # A cancelled hedge sent the same prompt; its output is unknown, so only
+        # the prompt is counted for it
+        prompt_tokens = usage["input_tokens"] * attempts
+        self.llm_calls += attempts
+        self.hedged_calls += attempts - 1
+        self.input_tokens += prompt_tokens
+        self.output_tokens += usage["output_tokens"]
+        self.cached_tokens += usage["cached_tokens"]
+        self.images += count_images(messages) * attempts
+        self.llm_seconds += seconds
+        self.cost_usd += estimate_cost(model_name, prompt_tokens, usage["output_tokens"])
+        self.tiers[tier] = self.tiers.get(tier, 0) + attempts
+
+
+def record_session_start(sessions_col, session_id: str, email: str, agent_mode: Optional[str]) -> None:
+    # Written straight away rather than buffered: /agent looks it up when a client
+    # falls back from a WebSocket session that failed before its first step
+    sessions_col.update_one(
+        {"session_id": session_id},
+        {"$setOnInsert": {"email": email, "agent_mode": agent_mode, "started_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+
+
+def record_step_usage(
+    buffer: WriteBuffer,
+    sessions_col,
+    users_col,
+    session_id: str,
+    email: str,
+    agent_mode: Optional[str],
+    step: StepUsage,
+) -> None:
+    now = datetime.now(timezone.utc)
+    usage = {"steps": 1, **{name: getattr(step, name) for name in USAGE_FIELDS[1:]}}
+    usage = {name: value for name, value in usage.items() if value}
+
+    buffer.update(
+        sessions_col,
+        {"session_id": session_id},
+        {
+            "$inc": {**usage, **{f"tiers.{tier}": calls for tier, calls in step.tiers.items()}},
+            "$max": {"max_step_input_tokens": step.input_tokens},
+            "$set": {"updated_at": now},
+            "$setOnInsert": {"email": email, "agent_mode": agent_mode, "started_at": now},
+        },
+        upsert=True,
+    )
+    # Lifetime totals sit next to agent_runs on the user document
+    buffer.update(
+        users_col,
+        {"email": email},
+        {"$inc": {f"usage.{name}": value for name, value in usage.items()}},
+    )
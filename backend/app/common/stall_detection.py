@@ -0,0 +1,74 @@
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import os
+
+from .interactive_dom import RenderedDom
+from .models import HistoryStep
+
+
+# Repeating the same action (or a two-step cycle, e.g. scroll down/up) on a page that
+# has not changed this many times first earns the model a hint, then a forced finish
+STALL_HINT_REPEATS = int(os.getenv("AGENT_STALL_HINT_REPEATS", "3"))
+STALL_FINISH_REPEATS = int(os.getenv("AGENT_STALL_FINISH_REPEATS", "5"))
+MAX_CYCLE_LENGTH = 2
+
+
+def page_fingerprint(rendered_dom: RenderedDom) -> str:
+    # The rendered text is ranked against a goal that changes every step, so hash it
+    # in page order. A virtualized feed keeps its structure while the posts change.
+    digest = hashlib.sha1(f"{rendered_dom.total_nodes}:{rendered_dom.content_hash}".encode())
+    for highlight_index, element in sorted(rendered_dom.index.items()):
+        digest.update(f"\n{highlight_index}:{element.xpath}".encode())
+    return digest.hexdigest()[:16]
+
+
+def step_signature(step: HistoryStep) -> Tuple[str, Optional[str], Optional[int]]:
+    return step.action, step.value, step.highlight_index
+
+
+def stalled_repeats(steps: List[HistoryStep], dom_hash: str) -> int:
+    """How many times the latest action cycle ran without changing the page."""
+    # Steps taken on this exact page, most recent last
+    window = []
+    for step in reversed(steps):
+        if step.dom_hash != dom_hash:
+            break
+        window.append(step_signature(step))
+    window.reverse()
+
+    repeats = 0
+    for length in range(1, MAX_CYCLE_LENGTH + 1):
+        cycle = window[-length:]
+        if len(cycle) < length or (length > 1 and len(set(cycle)) == 1):
+            continue
+        count = 0
+        end = len(window)
+        while end >= length and window[end - length:end] == cycle:
+            count += 1
+            end -= length
+        repeats = max(repeats, count)
+    return repeats
+
+
+def stall_hint(steps: List[HistoryStep], repeats: int) -> str:
+    last = steps[-1]
+    return (
+        f"\n## NO PROGRESS\nThe page has not changed after your last {repeats} attempts at "
+        f"'{last.action}' ({last.summary}). Repeating it will not help: try a different "
+        "element or approach, or call finish_task if the goal cannot be reached from here."
+    )
+
+
+def stall_finish_tool_call(steps: List[HistoryStep], repeats: int) -> Dict[str, Any]:
+    last = steps[-1]
+    return {
+        "name": "finish_task",
+        "args": {
+            "response": (
+                f"Agent stopped: the page did not change after repeating "
+                f"'{last.action}' {repeats} times. Task incomplete"
+            ),
+            "description": "System forced finish after repeated actions made no progress",
+        },
+        "id": "stall_finish",
+    }
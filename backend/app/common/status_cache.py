@@ -0,0 +1,83 @@
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+import hashlib
+import os
+import time
+
+import pydantic_core
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+from . import metrics
+
+
+# The side panel polls entitlements; each worker answers repeat polls from memory.
+# Writes made by this worker invalidate immediately, the TTL bounds how long a
+# change made through another worker can go unseen.
+STATUS_CACHE_TTL = float(os.getenv("STATUS_CACHE_TTL_SECONDS", "30"))
+STATUS_CACHE_MAX_ENTRIES = 10_000
+STATUS_KINDS = ("agent", "stripe")
+
+
+@dataclass
+class CachedStatus:
+    body: Dict[str, Any]
+    etag: str
+    expires_at: float
+
+
+def status_etag(body: Dict[str, Any]) -> str:
+    # Weak: the compression middleware may re-encode the bytes on the wire
+    return f'W/"{hashlib.sha1(pydantic_core.to_json(body)).hexdigest()[:16]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+class StatusCache:
+    def __init__(self, ttl: float = STATUS_CACHE_TTL, max_entries: int = STATUS_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: Dict[Tuple[str, str], CachedStatus] = {}
+
+    def get(self, kind: str, email: str) -> Optional[CachedStatus]:
+        entry = self.entries.get((kind, email))
+        if entry is None or entry.expires_at <= time.monotonic():
+            metrics.increment(f"status.{kind}.misses")
+            return None
+        metrics.increment(f"status.{kind}.hits")
+        return entry
+
+    def put(self, kind: str, email: str, body: Dict[str, Any]) -> CachedStatus:
+        entry = CachedStatus(body, status_etag(body), time.monotonic() + self.ttl)
+        self.entries.pop((kind, email), None)
+        self.entries[(kind, email)] = entry
+        if len(self.entries) > self.max_entries:
+            # Dicts keep insertion order, so this drops the entry filled longest ago
+            del self.entries[next(iter(self.entries))]
+        return entry
+
+    def get_or_load(
+        self, kind: str, email: str, load: Callable[[], Dict[str, Any]]
+    ) -> CachedStatus:
+        entry = self.get(kind, email)
+        return entry if entry is not None else self.put(kind, email, load())
+
+    def invalidate(self, email: str) -> None:
+        for kind in STATUS_KINDS:
+            self.entries.pop((kind, email), None)
+
+
+def status_response(request: Request, entry: CachedStatus) -> Response:
+    # no-cache lets the browser keep the body but revalidate with If-None-Match every poll
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        metrics.increment("status.not_modified")
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(entry.body, headers=headers)
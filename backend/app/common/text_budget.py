@@ -0,0 +1,141 @@
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - tiktoken ships with langchain-openai
+    tiktoken = None
+
+
+TOKEN_ENCODING = "o200k_base"
+CHARS_PER_TOKEN = 4
+ELLIPSIS = "…"
+
+
+@dataclass(frozen=True)
+class TextBudget:
+    max_element_tokens: int = 60
+    max_text_node_tokens: int = 120
+    max_region_tokens: int = 4000
+    max_page_tokens: int = 24000
+    max_repeated_text: int = 2
+    dedupe: bool = True
+
+
+DEFAULT_TEXT_BUDGET = TextBudget()
+
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(TOKEN_ENCODING)
+    except Exception:
+        # The BPE file is downloaded on first use; fall back to estimates offline
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = get_encoding()
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode_ordinary(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> tuple[str, int]:
+    # A token always covers at least one character, so short strings never need encoding
+    if len(text) <= max_tokens:
+        return text, 0
+
+    encoding = get_encoding()
+    if encoding is None:
+        max_chars = max_tokens * CHARS_PER_TOKEN
+        if len(text) <= max_chars:
+            return text, 0
+        trimmed = count_tokens(text[max_chars:])
+        return text[:max_chars].rstrip() + ELLIPSIS, trimmed
+
+    tokens = encoding.encode_ordinary(text)
+    if len(tokens) <= max_tokens:
+        return text, 0
+    kept = encoding.decode(tokens[:max_tokens]).rstrip()
+    return kept + ELLIPSIS, len(tokens) - max_tokens
+
+
+def collapse_whitespace(text: str) -> str:
+    return " ".join(text.split())
+
+
+@dataclass
+class TextPipeline:
+    budget: TextBudget = DEFAULT_TEXT_BUDGET
+    trimmed_tokens: int = 0
+    deduped_texts: int = 0
+    text_counts: Dict[str, int] = field(default_factory=dict)
+
+    def element_text(self, fragments: Iterable[str]) -> str:
+        parts: List[str] = []
+        seen = set()
+        for fragment in fragments:
+            fragment = collapse_whitespace(fragment)
+            if not fragment:
+                continue
+            if self.budget.dedupe:
+                if fragment in seen:
+                    self.deduped_texts += 1
+                    continue
+                seen.add(fragment)
+            parts.append(fragment)
+
+        text, trimmed = truncate_to_tokens(" ".join(parts), self.budget.max_element_tokens)
+        self.trimmed_tokens += trimmed
+        return text
+
+    def text_node(self, raw: str) -> Optional[str]:
+        text = collapse_whitespace(raw)
+        if not text:
+            return None
+
+        if self.budget.dedupe:
+            # Feeds repeat the same captions and button rows on every card
+            seen = self.text_counts.get(text, 0)
+            self.text_counts[text] = seen + 1
+            if seen >= self.budget.max_repeated_text:
+                self.deduped_texts += 1
+                return None
+
+        text, trimmed = truncate_to_tokens(text, self.budget.max_text_node_tokens)
+        self.trimmed_tokens += trimmed
+        return text
+
+    def paginate(self, lines: List[str], new_region_at: Optional[int] = None) -> List[List[str]]:
+        regions: List[List[str]] = [[]]
+        page_remaining = self.budget.max_page_tokens
+        region_remaining = self.budget.max_region_tokens
+
+        for position, line in enumerate(lines):
+            if position == new_region_at and regions[-1]:
+                regions.append([])
+                region_remaining = self.budget.max_region_tokens
+            # +1 for the newline joining this line to the next
+            line_tokens = count_tokens(line) + 1
+            page_remaining -= line_tokens
+            if page_remaining < 0:
+                dropped = lines[position:]
+                self.trimmed_tokens += sum(
+                    -(-len(dropped_line) // CHARS_PER_TOKEN) for dropped_line in dropped
+                )
+                regions[-1].append(
+                    f"... {len(dropped)} more lines not shown (page text budget reached)"
+                )
+                break
+
+            if region_remaining - line_tokens < 0 and regions[-1]:
+                regions.append([])
+                region_remaining = self.budget.max_region_tokens
+            region_remaining -= line_tokens
+            regions[-1].append(line)
+
+        return regions
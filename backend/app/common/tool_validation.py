@@ -0,0 +1,78 @@
+from typing import Any, Collection, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from pydantic import ValidationError
+
+from .history_manager import INDEXED_ACTIONS, parse_tool_call
+from .interactive_dom import IndexedElement
+from .tools import TOOLS_BY_NAME
+
+
+MAX_LISTED_INDEXES = 40
+
+
+def describe_valid_indexes(index: Dict[int, IndexedElement]) -> str:
+    if not index:
+        return "The page has no interactive elements; use scroll_page, navigate or finish_task."
+    indexes = sorted(index)
+    if len(indexes) > MAX_LISTED_INDEXES:
+        return f"Valid highlightIndex values range from {indexes[0]} to {indexes[-1]}."
+    return f"Valid highlightIndex values are: {', '.join(map(str, indexes))}."
+
+
+def validate_tool_call(
+    tool_call: Dict[str, Any],
+    index: Dict[int, IndexedElement],
+    allowed_tools: Optional[Collection[str]] = None,
+) -> str | None:
+    # Modes bind a subset of the tools; a call outside it is as unknown as a made-up one
+    allowed = TOOLS_BY_NAME if allowed_tools is None else allowed_tools
+    agent_tool = TOOLS_BY_NAME.get(tool_call["name"])
+    if agent_tool is None or tool_call["name"] not in allowed:
+        return (
+            f"Unknown tool '{tool_call['name']}'. "
+            f"Use one of: {', '.join(name for name in TOOLS_BY_NAME if name in allowed)}."
+        )
+
+    try:
+        agent_tool.args_schema.model_validate(tool_call["args"])
+    except ValidationError as error:
+        problems = "; ".join(
+            f"{'.'.join(map(str, detail['loc'])) or 'arguments'}: {detail['msg']}"
+            for detail in error.errors()
+        )
+        return f"Invalid arguments for {tool_call['name']}: {problems}."
+
+    highlight_index, action, _, _ = parse_tool_call(tool_call)
+    if action in INDEXED_ACTIONS and highlight_index not in index:
+        return (
+            f"highlightIndex {highlight_index} does not exist on the page. "
+            f"{describe_valid_indexes(index)}"
+        )
+    return None
+
+
+def validate_response(
+    tool_calls: List[Dict[str, Any]],
+    index: Dict[int, IndexedElement],
+    allowed_tools: Optional[Collection[str]] = None,
+) -> str | None:
+    if not tool_calls:
+        return "You replied without a tool call. Every reply must be a tool call."
+    # Only the first call is binding; later calls in a batch are dropped, not repaired
+    return validate_tool_call(tool_calls[0], index, allowed_tools)
+
+
+def build_repair_messages(response: AIMessage, error: str) -> List[Any]:
+    correction = f"{error} Reply again with a corrected tool call for the same step."
+    if not response.tool_calls:
+        return [response, HumanMessage(content=correction)]
+
+    # Every tool call in the rejected reply needs an answer before re-prompting
+    return [response] + [
+        ToolMessage(
+            content=correction if position == 0 else "Skipped: previous call was rejected.",
+            tool_call_id=tool_call["id"],
+        )
+        for position, tool_call in enumerate(response.tool_calls)
+    ]
@@ -80,3 +80,19 @@ TOOLS = [
     finish_task,
     upload_file,
 ]
+
+
+@tool
+def expand_dom(region: int, description: str = "") -> str:
+    """
+    Read another region of the current page's DOM without scrolling or acting. Use when the
+    element you need is not in the regions shown so far. Regions are numbered from 1 and the
+    page does not change, so highlightIndex values from every region stay valid.
+    """
+    return f"Expanded DOM region {region}: {description}"
+
+
+# Handled inside the /agent request; never sent to the extension
+SERVER_TOOLS = [expand_dom]
+
+TOOLS_BY_NAME = {agent_tool.name: agent_tool for agent_tool in TOOLS + SERVER_TOOLS}
@@ -0,0 +1,160 @@
+from typing import Any, Dict, List, Tuple
+import asyncio
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, ServerSelectionTimeoutError
+
+from . import metrics
+
+
+WRITE_FLUSH_INTERVAL = 5.0
+# Flush early once this many documents have pending updates
+WRITE_FLUSH_MAX_PENDING = 500
+# A write rejected this many times is dropped rather than retried forever
+MAX_WRITE_ATTEMPTS = 3
+
+BufferKey = Tuple[str, str]
+
+
+def merge_updates(current: Dict[str, Any], update: Dict[str, Any]) -> Dict[str, Any]:
+    merged = {operator: dict(fields) for operator, fields in current.items()}
+    for operator, fields in update.items():
+        target = merged.setdefault(operator, {})
+        for name, value in fields.items():
+            if name not in target or operator == "$set":
+                target[name] = value
+            elif operator == "$inc":
+                target[name] += value
+            elif operator == "$max":
+                target[name] = max(target[name], value)
+            elif operator == "$min":
+                target[name] = min(target[name], value)
+            elif operator != "$setOnInsert":
+                raise ValueError(f"Cannot coalesce {operator} updates")
+    return merged
+
+
+class PendingWrite:
+    def __init__(self, collection, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool):
+        self.collection = collection
+        self.filter = filter
+        self.update = update
+        self.upsert = upsert
+        self.attempts = 0
+
+    def to_operation(self) -> UpdateOne:
+        return UpdateOne(self.filter, self.update, upsert=self.upsert)
+
+
+class WriteBuffer:
+    """Coalesces non-critical updates per document and writes them in unordered batches.
+
+    Only commutative operators are accepted ($inc, $max, $min, last-wins $set and
+    first-wins $setOnInsert), so merging never changes the final document. Anything
+    that gates a decision, like the free-run quota, must not go through here.
+    """
+
+    def __init__(self, max_pending: int = WRITE_FLUSH_MAX_PENDING):
+        self.max_pending = max_pending
+        self.pending: Dict[BufferKey, PendingWrite] = {}
+        self.flushing: asyncio.Task | None = None
+
+    def update(
+        self, collection, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool = False
+    ) -> None:
+        key = (collection.name, repr(sorted(filter.items())))
+        pending = self.pending.get(key)
+        if pending is None:
+            self.pending[key] = PendingWrite(collection, filter, merge_updates({}, update), upsert)
+        else:
+            pending.update = merge_updates(pending.update, update)
+            pending.upsert = pending.upsert or upsert
+        metrics.increment("writes.buffered")
+
+        if len(self.pending) >= self.max_pending and not self.flushing:
+            self.flushing = asyncio.create_task(self.flush_async())
+
+    def requeue(self, writes: List[PendingWrite]) -> None:
+        for write in writes:
+            write.attempts += 1
+            if write.attempts >= MAX_WRITE_ATTEMPTS:
+                metrics.increment("writes.dropped")
+                print(f"[Writes] Dropping write to {write.collection.name} {write.filter}")
+                continue
+            key = (write.collection.name, repr(sorted(write.filter.items())))
+            if key in self.pending:
+                # Newer updates win for $set, so the retried one goes underneath them
+                newer = self.pending[key]
+                newer.update = merge_updates(write.update, newer.update)
+                newer.upsert = newer.upsert or write.upsert
+            else:
+                self.pending[key] = write
+
+    def drain(self) -> List[PendingWrite]:
+        drained, self.pending = self.pending, {}
+        return list(drained.values())
+
+    def write(self, writes: List[PendingWrite]) -> Tuple[int, List[PendingWrite]]:
+        # Runs off the event loop, so it must not touch self.pending
+        by_collection: Dict[str, List[PendingWrite]] = {}
+        for write in writes:
+            by_collection.setdefault(write.collection.name, []).append(write)
+
+        written = 0
+        rejected: List[PendingWrite] = []
+        for batch in by_collection.values():
+            collection = batch[0].collection
+            try:
+                collection.bulk_write([write.to_operation() for write in batch], ordered=False)
+                written += len(batch)
+            except BulkWriteError as e:
+                # Unordered batches apply everything they can; retry only what was rejected
+                failed = {error["index"] for error in e.details.get("writeErrors", [])}
+                written += len(batch) - len(failed)
+                rejected.extend(batch[position] for position in sorted(failed))
+                print(f"[Writes] {len(failed)} buffered writes to {collection.name} failed")
+            except ServerSelectionTimeoutError as e:
+                # No server was reachable, so nothing was sent and all of it can be retried
+                rejected.extend(batch)
+                print(f"[Writes] No server for {len(batch)} buffered writes to {collection.name}: {e}")
+            except Exception as e:
+                # The batch may have partly applied (e.g. AutoReconnect mid-send), and
+                # retrying its $inc updates could count them twice
+                metrics.increment("writes.dropped", len(batch))
+                print(f"[Writes] Dropping {len(batch)} buffered writes to {collection.name}: {e}")
+        return written, rejected
+
+    def record_flush(self, written: int, rejected: List[PendingWrite]) -> int:
+        self.requeue(rejected)
+        metrics.increment("writes.flushed", written)
+        metrics.increment("writes.failed", len(rejected))
+        metrics.increment("writes.flushes")
+        return written
+
+    def flush(self) -> int:
+        writes = self.drain()
+        if not writes:
+            return 0
+        return self.record_flush(*self.write(writes))
+
+    async def flush_async(self) -> int:
+        writes = self.drain()
+        try:
+            if not writes:
+                return 0
+            written, rejected = await asyncio.to_thread(self.write, writes)
+            return self.record_flush(written, rejected)
+        except Exception as e:
+            # write() handles errors from Mongo itself, so nothing here was sent
+            print(f"[Writes] Failed to flush {len(writes)} buffered writes: {e}")
+            self.record_flush(0, writes)
+            return 0
+        finally:
+            # The periodic flush also runs through here and must not clear another task's flag
+            if self.flushing is asyncio.current_task():
+                self.flushing = None
+
+    async def flush_periodically(self, interval: float = WRITE_FLUSH_INTERVAL) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush_async()
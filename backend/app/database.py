@@ -3,6 +3,12 @@ from contextlib import asynccontextmanager
 import os
 from pymongo import MongoClient
 from dotenv import load_dotenv
+import asyncio
+
+from app.common.entitlements import relay_entitlement_changes
+from app.common.pubsub import create_pubsub
+from app.common.status_cache import StatusCache
+from app.common.write_buffer import WriteBuffer
 
 load_dotenv()
 
@@ -15,18 +21,51 @@ STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
 STRIPE_PRICE_ID = os.getenv("STRIPE_PRICE_ID")
 
 OPENAI_MODEL_NAME = os.getenv("OPENAI_MODEL_NAME")
+OPENAI_FAST_MODEL_NAME = os.getenv("OPENAI_FAST_MODEL_NAME") or OPENAI_MODEL_NAME
+
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+
+MONGO_PING_TIMEOUT_MS = 2000
+# Connections kept open in the background so the first queries skip the handshake
+MONGO_MIN_POOL_SIZE = 4
+
+
+def ping_mongo(db) -> bool:
+    try:
+        db.command("ping", maxTimeMS=MONGO_PING_TIMEOUT_MS)
+        return True
+    except Exception as e:
+        print(f"[Mongo] Ping failed: {e}")
+        return False
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    mongo_client = MongoClient(MONGODB_URI)
+    mongo_client = MongoClient(MONGODB_URI, minPoolSize=MONGO_MIN_POOL_SIZE)
     db = mongo_client["opero-extension-db"]
+    write_buffer = WriteBuffer()
+    write_flusher = asyncio.create_task(write_buffer.flush_periodically())
+    pubsub = create_pubsub(db)
+    await pubsub.start()
 
     try:
         app.state.db = db
         app.state.users_col = db["users"]
         app.state.profiles_col = db["profiles"]
         app.state.premium_col = db["premium"]
+        app.state.sessions_col = db["sessions"]
+        app.state.write_buffer = write_buffer
+        app.state.status_cache = StatusCache()
+        app.state.pubsub = pubsub
+        entitlement_relay = asyncio.create_task(relay_entitlement_changes(app))
         yield
     finally:
+        write_flusher.cancel()
+        entitlement_relay.cancel()
+        await pubsub.close()
+        try:
+            # Drain what is still buffered before the client goes away
+            await write_buffer.flush_async()
+        except Exception as e:
+            print(f"[Writes] Failed to drain buffered writes on shutdown: {e}")
         mongo_client.close()
@@ -0,0 +1,97 @@
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional, Sequence
+import asyncio
+import os
+import time
+
+import httpx
+
+from app.common import metrics
+from app.common.model_router import FAST_TIER, STRONG_TIER
+from app.common.tools import TOOLS_BY_NAME
+from app.database import OPENAI_FAST_MODEL_NAME, OPENAI_MODEL_NAME
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or "https://api.openai.com/v1"
+
+MODEL_NAMES = {
+    STRONG_TIER: OPENAI_MODEL_NAME,
+    FAST_TIER: OPENAI_FAST_MODEL_NAME,
+}
+
+# Every model, tier and route shares one connection pool, so a warm TLS
+# connection opened for one is reused by all of them.
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60)
+HTTP_TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+WARMUP_CONNECTIONS = 4
+WARMUP_TIMEOUT = 10.0
+
+http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global http_client
+    if http_client is None or http_client.is_closed:
+        http_client = httpx.AsyncClient(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+    return http_client
+
+
+@lru_cache(maxsize=None)
+def get_chat_model(model_name: str, temperature: float) -> "ChatOpenAI":
+    # langchain_openai pulls in the whole openai SDK; startup preloads it off the event loop
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        model=model_name,
+        temperature=temperature,
+        http_async_client=get_http_client(),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_bound_model(model_name: str, temperature: float, tool_names: Sequence[str]):
+    # Binding converts every tool to its JSON schema, so do it once per tool set
+    tools = [TOOLS_BY_NAME[name] for name in tool_names]
+    return get_chat_model(model_name, temperature).bind_tools(tools)
+
+
+async def open_connections() -> bool:
+    if not OPENAI_API_KEY:
+        return False
+
+    client = get_http_client()
+    headers = {"Authorization": f"Bearer {OPENAI_API_KEY}"}
+    # A few concurrent requests leave that many TLS connections idle in the pool
+    results = await asyncio.gather(
+        *(
+            client.get(f"{OPENAI_BASE_URL}/models", headers=headers, timeout=WARMUP_TIMEOUT)
+            for _ in range(WARMUP_CONNECTIONS)
+        ),
+        return_exceptions=True,
+    )
+    failures = [result for result in results if isinstance(result, Exception)]
+    if failures:
+        print(f"[Startup] Could not pre-open OpenAI connections: {failures[0]}")
+    return len(failures) < len(results)
+
+
+async def warm_up_models(temperature: float, tool_sets: Sequence[Sequence[str]]) -> bool:
+    started = time.perf_counter()
+    for model_name in set(MODEL_NAMES.values()):
+        for tool_names in tool_sets:
+            get_bound_model(model_name, temperature, tuple(tool_names))
+    connected = await open_connections()
+    metrics.observe_latency("startup.llm_warmup", time.perf_counter() - started)
+    return connected
+
+
+async def close_http_client() -> None:
+    global http_client
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+    get_bound_model.cache_clear()
+    get_chat_model.cache_clear()
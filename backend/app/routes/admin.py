@@ -0,0 +1,50 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from typing import Optional
+import hmac
+
+from app.common.session_usage import USAGE_FIELDS
+from app.database import ADMIN_API_KEY
+
+MAX_SESSIONS_LIMIT = 200
+
+
+def require_admin(x_admin_key: Optional[str] = Header(None)):
+    if not ADMIN_API_KEY:
+        raise HTTPException(status_code=404, detail="Not found")
+    if not x_admin_key or not hmac.compare_digest(x_admin_key, ADMIN_API_KEY):
+        raise HTTPException(status_code=401, detail="Invalid admin key")
+
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+
+@router.get("/sessions")
+async def list_sessions(
+    req: Request,
+    sort: str = "cost_usd",
+    limit: int = 20,
+    email: Optional[str] = None,
+):
+    if sort not in USAGE_FIELDS and sort not in ("started_at", "updated_at"):
+        raise HTTPException(status_code=400, detail=f"Cannot sort by {sort}")
+
+    # Include sessions that are still buffered in memory for the next timed flush
+    await req.app.state.write_buffer.flush_async()
+
+    query = {"email": email} if email else {}
+    cursor = (
+        req.app.state.sessions_col.find(query, {"_id": 0})
+        .sort(sort, -1)
+        .limit(max(1, min(limit, MAX_SESSIONS_LIMIT)))
+    )
+    return {"sessions": list(cursor)}
+
+
+@router.get("/sessions/{session_id}")
+async def get_session(session_id: str, req: Request):
+    await req.app.state.write_buffer.flush_async()
+
+    session = req.app.state.sessions_col.find_one({"session_id": session_id}, {"_id": 0})
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return session
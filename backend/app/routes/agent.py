@@ -1,71 +1,267 @@
-from fastapi import APIRouter, Request, HTTPException
-from langchain_openai import ChatOpenAI
-from langchain.schema import SystemMessage, HumanMessage
-from app.common.models import AgentRequest
-from app.common.interactive_dom import build_interactive_dom
-from app.common.prompts import SYSTEM_PROMPT, format_user_prompt, get_mode_prompt
+from fastapi import APIRouter, Depends, FastAPI, Request, HTTPException, Response
+from langchain_core.messages import SystemMessage, HumanMessage
+from app.common.models import AgentHistory, AgentRequest, screenshot_ref
+from app.common.interactive_dom import RenderedDom
+from app.common.dom_offload import offloads, render_dom
+from app.common.render_cache import render_cache
+from app.common.prompts import format_user_prompt
 from app.common.tools import TOOLS
+from app.common.agent_modes import AgentMode, get_agent_mode
+from app.routes.admin import require_admin
+from app.common.element_ranking import (
+    RANKING_RECORD_PATH,
+    build_goal,
+    record_ranking_sample,
+)
+from app.common.dom_pagination import (
+    build_expand_messages,
+    expansion_finish_tool_call,
+    format_region,
+    is_expansion_request,
+    validate_expansion,
+)
+from app.common.tool_validation import build_repair_messages, validate_response
 from app.common.history_manager import (
+    HistoryMessages,
     build_history_messages,
-    parse_history_from_request,
+    deadline_finish_tool_call,
+    resolve_xpath,
     update_history,
+    update_history_batch,
+)
+from app.common.model_router import (
+    STRONG_TIER,
+    record_tier_call,
+    select_model_tier,
+)
+from app.common.call_control import (
+    ClientDisconnected,
+    hedge_delay,
+    hedged,
+    run_while_connected,
+)
+from app.common.session_usage import StepUsage, record_step_usage
+from app.common.stall_detection import (
+    STALL_FINISH_REPEATS,
+    STALL_HINT_REPEATS,
+    page_fingerprint,
+    stall_finish_tool_call,
+    stall_hint,
+    stalled_repeats,
+)
+from app.common.request_body import (
+    MAX_AGENT_BODY_BYTES,
+    check_node_count,
+    check_page_limits,
+    count_dom_nodes,
+    parse_body,
+    read_body,
 )
+from app.common.request_memory import RequestMemory, screenshot_bytes
+from app.common.status_cache import status_response
+from app.common.entitlements import FREE_RUN_LIMITS, load_agent_status
+from app.common import metrics
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from app.database import OPENAI_MODEL_NAME
+from typing import Any, Awaitable, Callable, Optional, Union
+import asyncio
+import time
+from app.llm import MODEL_NAMES, get_bound_model
 
 router = APIRouter()
 
-llm = ChatOpenAI(model=OPENAI_MODEL_NAME, temperature=0.1)
+AGENT_TEMPERATURE = 0.1
 
-FREE_RUN_LIMITS = 3
+MAX_REPAIR_ATTEMPTS = 2
+# Non-standard status (nginx) for a request the client abandoned
+CLIENT_CLOSED_REQUEST = 499
 
 
-@router.post("/agent")
-async def run_agent(req: Request, agent_request: AgentRequest):
-    users_col = req.app.state.users_col
-    user_doc = users_col.find_one({"email": agent_request.email})
+def tool_names(tools: list) -> tuple[str, ...]:
+    return tuple(tool.name for tool in tools)
+
+
+def bound_agent_model(tier: str, tools: list):
+    return get_bound_model(MODEL_NAMES[tier], AGENT_TEMPERATURE, tool_names(tools))
+
+
+async def invoke_model_tier(
+    tier: str, messages: list, step_usage: StepUsage, tools: list = TOOLS
+):
+    llm_with_tools = bound_agent_model(tier, tools)
+    started = time.perf_counter()
+    response, attempts = await hedged(
+        lambda: llm_with_tools.ainvoke(messages), hedge_delay(f"llm.{tier}")
+    )
+    elapsed = time.perf_counter() - started
+    record_tier_call(tier, MODEL_NAMES[tier], response, elapsed)
+    step_usage.add_call(tier, MODEL_NAMES[tier], messages, response, elapsed, attempts)
+    return response
+
+
+async def invoke_agent_model(
+    tier: str, messages: list, rendered_dom: RenderedDom, step_usage: StepUsage, mode: AgentMode
+) -> list:
+    tools = mode.tools_with_server if len(rendered_dom.regions) > 1 else mode.tools
+    allowed_tools = {agent_tool.name for agent_tool in tools}
+    response = await invoke_model_tier(tier, messages, step_usage, tools)
+    repairs = 0
+    expansions = 0
+
+    while True:
+        if is_expansion_request(response):
+            region = response.tool_calls[0]["args"].get("region")
+            error = validate_expansion(region, rendered_dom, expansions)
+            if error is None:
+                # Served from the DOM already rendered for this request, no client round-trip
+                expansions += 1
+                metrics.increment("dom.expansions")
+                messages = messages + build_expand_messages(response, rendered_dom, region)
+                response = await invoke_model_tier(tier, messages, step_usage, tools)
+                continue
+        else:
+            error = validate_response(response.tool_calls, rendered_dom.index, allowed_tools)
+            if error is None:
+                if repairs:
+                    metrics.increment("agent.repairs_succeeded")
+                return response.tool_calls
+
+        if repairs >= MAX_REPAIR_ATTEMPTS:
+            break
+        repairs += 1
+
+        metrics.increment("agent.validation_failures")
+        started = time.perf_counter()
+        if tier != STRONG_TIER:
+            metrics.increment(f"llm.{tier}.escalations")
+            tier = STRONG_TIER
+
+        # Appending keeps the original messages as an unchanged, cacheable prefix
+        messages = messages + build_repair_messages(response, error)
+        response = await invoke_model_tier(tier, messages, step_usage, tools)
+        metrics.observe_latency("agent.repair", time.perf_counter() - started)
+
+    if is_expansion_request(response):
+        metrics.increment("dom.expansions_unresolved")
+        return [expansion_finish_tool_call()]
+    return response.tool_calls
+
+
+def record_session_usage(
+    app: FastAPI, agent_request: AgentRequest, history: AgentHistory, step_usage: StepUsage
+) -> None:
+    record_step_usage(
+        app.state.write_buffer,
+        app.state.sessions_col,
+        app.state.users_col,
+        history.session_id,
+        agent_request.email,
+        agent_request.agentMode,
+        step_usage,
+    )
+
+
+def response_history(agent_request: AgentRequest, history: AgentHistory) -> AgentHistory:
+    return history if agent_request.includeScreenshots else history.without_screenshots()
+
+
+def history_response(
+    agent_request: AgentRequest, history: AgentHistory, history_limit: Optional[int]
+) -> dict:
+    return {
+        "history": response_history(agent_request, history),
+        # Clients keep only these, so the history they send back stops growing with the run
+        "screenshotRefs": history.recent_screenshot_refs(history_limit),
+    }
+
+
+def starts_new_session(app: FastAPI, agent_request: AgentRequest) -> bool:
+    history = agent_request.history
+    if history is None:
+        return True
+    if history.steps:
+        return False
+    # An empty history naming a WebSocket session that was already charged is a
+    # client continuing that run over HTTP
+    started = app.state.sessions_col.find_one(
+        {"session_id": history.session_id, "email": agent_request.email}, {"_id": 1}
+    )
+    return started is None
+
+
+def check_agent_entitlement(app: FastAPI, email: str, is_new_session: bool) -> None:
+    users_col = app.state.users_col
+    user_doc = users_col.find_one({"email": email})
 
     if not user_doc:
         raise HTTPException(status_code=404, detail="User not found")
     
-    is_premium = user_doc.get("premium", 0) == 1
-    agent_runs = user_doc.get("agent_runs", 0)
-    
-    is_new_session = not agent_request.history
-    
     if is_new_session:
-        if not is_premium and agent_runs >= FREE_RUN_LIMITS:
+        # Check and increment in one conditional update so concurrent sessions
+        # cannot both pass the free-run limit
+        counted = users_col.find_one_and_update(
+            {
+                "email": email,
+                "$or": [
+                    {"premium": 1},
+                    {"agent_runs": {"$lt": FREE_RUN_LIMITS}},
+                    {"agent_runs": {"$exists": False}},
+                ],
+            },
+            {"$inc": {"agent_runs": 1}},
+            projection={"_id": 1},
+        )
+        if not counted:
             raise HTTPException(
                 status_code=403, 
                 detail="Free users are limited to 3 agent runs. Please upgrade to premium for unlimited runs."
             )
+        app.state.status_cache.invalidate(email)
         
-        users_col.update_one(
-            {"email": agent_request.email},
-            {
-                "$inc": {"agent_runs": 1},
-                "$set": {"last_agent_run": datetime.now(timezone.utc)}
-            }
+        app.state.write_buffer.update(
+            users_col,
+            {"email": email},
+            {"$max": {"last_agent_run": datetime.now(timezone.utc)}},
         )
-    
-    system_prompt = SYSTEM_PROMPT
-    mode_prompt = get_mode_prompt(agent_request.agentMode, agent_request.jobApplicationData)
-    if mode_prompt:
-        system_prompt = system_prompt + "\n" + mode_prompt
-    
-    messages = [SystemMessage(content=system_prompt)]
 
-    llm_with_tools = llm.bind_tools(TOOLS)
-    dom_text = build_interactive_dom(agent_request.dom)
-    history_steps = parse_history_from_request(agent_request.history)
-    messages.extend(build_history_messages(history_steps))
 
-    user_content = [
-        {
-            "type": "text",
-            "text": format_user_prompt(dom_text, agent_request.prompt),
-        }
-    ]
+def build_system_message(
+    agent_mode: Optional[str], job_application_data: Optional[dict], multi_action: bool
+) -> SystemMessage:
+    return get_agent_mode(agent_mode).system_message(job_application_data, multi_action)
+
+
+@dataclass
+class PromptState:
+    """Prompt pieces a live session builds once instead of on every step."""
+
+    system_message: SystemMessage
+    history_messages: HistoryMessages = field(default_factory=HistoryMessages)
+
+
+def build_agent_messages(
+    agent_request: AgentRequest,
+    history: AgentHistory,
+    rendered_dom: RenderedDom,
+    prompt_state: Optional[PromptState],
+    hint: Optional[str] = None,
+) -> list:
+    history_limit = get_agent_mode(agent_request.agentMode).history_limit
+    if prompt_state is None:
+        system_message = build_system_message(
+            agent_request.agentMode, agent_request.jobApplicationData, agent_request.multiAction
+        )
+        messages = [system_message, *build_history_messages(history, history_limit)]
+    else:
+        messages = [
+            prompt_state.system_message,
+            *prompt_state.history_messages.extend(history, history_limit),
+        ]
+
+    text = format_user_prompt(format_region(rendered_dom, 1), agent_request.prompt)
+    if hint:
+        text = text + hint
+    user_content = [{"type": "text", "text": text}]
 
     if agent_request.screenshot:
         user_content.append(
@@ -73,36 +269,180 @@ async def run_agent(req: Request, agent_request: AgentRequest):
         )
 
     messages.append(HumanMessage(content=user_content))
+    return messages
+
+
+async def run_agent_step(
+    app: FastAPI,
+    agent_request: AgentRequest,
+    history: AgentHistory,
+    run_call: Callable[[Awaitable[Any], float], Awaitable[Any]],
+    prompt_state: Optional[PromptState] = None,
+    dom_source: Optional[Union[bytes, bytearray]] = None,
+) -> dict:
+    """One observation in, the next action(s) out; appends them to history.
+
+    run_call bounds the model call by the step deadline and raises
+    ClientDisconnected when whoever asked for the step has gone away.
+    dom_source is the raw body of a page large enough to render in a worker.
+    """
+    step_usage = StepUsage()
+    mode = get_agent_mode(agent_request.agentMode)
+    goal = None
+    if agent_request.rankElements:
+        goal = build_goal(
+            agent_request.prompt,
+            [step.summary for step in history.steps],
+            mode.ranking.history_steps,
+        )
+    rendered_dom = await render_dom(
+        agent_request.dom,
+        dom_source,
+        goal=goal,
+        text_budget=mode.text_budget,
+        ranking=mode.ranking,
+        keep_unranked=bool(RANKING_RECORD_PATH),
+    )
+    metrics.increment("dom.trimmed_tokens", rendered_dom.trimmed_tokens)
+    dom_hash = page_fingerprint(rendered_dom)
+    repeats = stalled_repeats(history.steps, dom_hash)
+
+    if mode.fast_path is not None:
+        autofill_calls = mode.fast_path(agent_request, history)
+        if autofill_calls:
+            actions, updated_history = update_history_batch(
+                autofill_calls,
+                agent_request.screenshot,
+                history,
+                rendered_dom.index,
+                dom_hash,
+            )
+            metrics.increment("autofill.fast_path_steps")
+            metrics.increment("autofill.fields", len(actions))
+            record_session_usage(app, agent_request, history, step_usage)
+            return {
+                **actions[0],
+                "actions": actions,
+                **history_response(agent_request, updated_history, mode.history_limit),
+            }
+
+    if repeats >= STALL_FINISH_REPEATS:
+        # Another call would see the same page after the same actions; stop paying for them
+        tool_calls = [stall_finish_tool_call(history.steps, repeats)]
+        step_usage.calls_saved += 1
+        metrics.increment("agent.stall.finishes")
+        metrics.increment("agent.stall.calls_saved")
+    else:
+        hint = None
+        if repeats >= STALL_HINT_REPEATS:
+            hint = stall_hint(history.steps, repeats)
+            metrics.increment("agent.stall.hints")
+        messages = build_agent_messages(agent_request, history, rendered_dom, prompt_state, hint)
+
+        tier = select_model_tier(
+            history.steps,
+            rendered_dom.clickable_count,
+            mode.tier,
+            screenshot_ref(agent_request.screenshot) if agent_request.screenshot else None,
+        )
+        deadline = mode.step_deadline
+        try:
+            tool_calls = await run_call(
+                invoke_agent_model(tier, messages, rendered_dom, step_usage, mode), deadline
+            )
+        except ClientDisconnected:
+            # Nobody is waiting for this step; the model call was cancelled mid-flight
+            record_session_usage(app, agent_request, history, step_usage)
+            raise
+        except asyncio.TimeoutError:
+            tool_calls = [deadline_finish_tool_call(deadline)]
+    record_session_usage(app, agent_request, history, step_usage)
+
+    if RANKING_RECORD_PATH and tool_calls and rendered_dom.unranked_lines is not None:
+        await asyncio.to_thread(
+            record_ranking_sample,
+            RANKING_RECORD_PATH,
+            rendered_dom.unranked_lines,
+            agent_request.prompt,
+            [step.summary for step in history.steps],
+            tool_calls[0]["args"].get("highlight_index"),
+        )
 
-    response = await llm_with_tools.ainvoke(messages)
+    if agent_request.multiAction:
+        actions, updated_history = update_history_batch(
+            tool_calls,
+            agent_request.screenshot,
+            history,
+            rendered_dom.index,
+            dom_hash,
+        )
+        return {
+            **actions[0],
+            "actions": actions,
+            **history_response(agent_request, updated_history, mode.history_limit),
+        }
 
     highlight_index, action, value, updated_history = update_history(
-        response.tool_calls, agent_request.screenshot, history_steps
+        tool_calls, agent_request.screenshot, history, rendered_dom.index, dom_hash
     )
 
     return {
         "highlightIndex": highlight_index,
         "action": action,
         "value": value,
-        "history": updated_history,
+        "xpath": resolve_xpath(highlight_index, rendered_dom.index),
+        **history_response(agent_request, updated_history, mode.history_limit),
     }
 
 
+@router.post("/agent")
+async def run_agent(req: Request):
+    # Read and validate the raw body ourselves: FastAPI would json.loads the whole
+    # DOM and screenshot into dicts first and then validate those a second time
+    memory = RequestMemory.start("agent.memory")
+    body = await read_body(req, MAX_AGENT_BODY_BYTES)
+    # Turn away oversized pages before building tens of thousands of node objects
+    check_node_count(count_dom_nodes(body))
+    started = time.perf_counter()
+    agent_request = parse_body(AgentRequest, body)
+    metrics.observe_latency("agent.parse", time.perf_counter() - started)
+    metrics.increment("agent.body_bytes", len(body))
+    memory.add("body", len(body))
+    # Large pages are rendered in a worker straight from the body; drop it otherwise
+    dom_source = body if offloads(len(agent_request.dom.map)) else None
+    del body
+
+    history = agent_request.history or AgentHistory.new_session()
+    check_page_limits(agent_request.dom, [agent_request.screenshot, *history.screenshots.values()])
+    memory.add("screenshot", screenshot_bytes([agent_request.screenshot]))
+    memory.add("history_screenshots", screenshot_bytes(history.screenshots.values()))
+
+    check_agent_entitlement(req.app, agent_request.email, starts_new_session(req.app, agent_request))
+
+    try:
+        return await run_agent_step(
+            req.app,
+            agent_request,
+            history,
+            lambda call, deadline: run_while_connected(req, call, deadline),
+            dom_source=dom_source,
+        )
+    except ClientDisconnected:
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+    finally:
+        memory.finish()
+
+
 @router.get("/agent/status")
 async def get_agent_status(email: str, req: Request):
-    users_col = req.app.state.users_col
-    
-    user_doc = users_col.find_one({"email": email})
-    if not user_doc:
-        return {"agent_runs": 0, "is_premium": False, "runs_remaining": FREE_RUN_LIMITS}
-    
-    agent_runs = user_doc.get("agent_runs", 0)
-    is_premium = user_doc.get("premium", 0) == 1
-    
-    runs_remaining = "unlimited" if is_premium else max(0, FREE_RUN_LIMITS - agent_runs)
-    
-    return {
-        "agent_runs": agent_runs,
-        "is_premium": is_premium,
-        "runs_remaining": runs_remaining
-    }
+    cached = req.app.state.status_cache.get_or_load(
+        "agent", email, lambda: load_agent_status(req.app.state.users_col, email)
+    )
+    return status_response(req, cached)
+
+
+@router.get("/agent/metrics", dependencies=[Depends(require_admin)])
+async def get_agent_metrics():
+    # Size and hit ratio of this process's subtree cache; offload workers keep their own
+    render_cache_stats = render_cache.stats() if render_cache is not None else None
+    return {**metrics.snapshot(), "dom_render_cache": render_cache_stats}
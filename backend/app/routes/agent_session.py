@@ -0,0 +1,189 @@
+from dataclasses import dataclass
+from typing import Optional
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from pydantic import TypeAdapter, ValidationError
+from starlette.websockets import WebSocketState
+import asyncio
+import os
+import time
+
+import pydantic_core
+
+from app.common import metrics
+from app.common.agent_modes import get_agent_mode
+from app.common.call_control import ClientDisconnected, run_until_cancelled
+from app.common.dom_offload import offloads
+from app.common.models import (
+    AgentHistory,
+    AgentObservation,
+    AgentRequest,
+    AgentSessionMessage,
+    AgentSessionStart,
+    AgentSessionStop,
+)
+from app.common.request_body import (
+    MAX_AGENT_BODY_BYTES,
+    check_node_count,
+    check_page_limits,
+    count_dom_nodes,
+)
+from app.common.request_memory import RequestMemory, screenshot_bytes
+from app.common.session_usage import record_session_start
+from app.routes.agent import (
+    PromptState,
+    build_system_message,
+    check_agent_entitlement,
+    run_agent_step,
+)
+
+router = APIRouter()
+
+# A session waits this long for the client's next observation (page loads, slow
+# uploads) before it is closed and the client has to start over
+SESSION_IDLE_TIMEOUT = float(os.getenv("AGENT_SESSION_IDLE_SECONDS", "300"))
+# RFC 6455 close codes
+POLICY_VIOLATION = 1008
+MESSAGE_TOO_BIG = 1009
+
+session_messages = TypeAdapter(AgentSessionMessage)
+
+
+@dataclass
+class AgentSession:
+    """What /agent otherwise re-receives, re-parses and re-checks on every step."""
+
+    start: AgentSessionStart
+    history: AgentHistory
+    prompt_state: PromptState
+
+    @property
+    def history_limit(self) -> Optional[int]:
+        return get_agent_mode(self.start.agentMode).history_limit
+
+    def request_for(self, observation: AgentObservation) -> AgentRequest:
+        return AgentRequest(
+            dom=observation.dom,
+            prompt=self.start.prompt,
+            history=self.history,
+            screenshot=observation.screenshot,
+            agentMode=self.start.agentMode,
+            jobApplicationData=self.start.jobApplicationData,
+            email=self.start.email,
+            multiAction=self.start.multiAction,
+            rankElements=self.start.rankElements,
+        )
+
+
+def is_finished(result: dict) -> bool:
+    return any(action["action"] == "finish" for action in result.get("actions") or [result])
+
+
+async def close_socket(websocket: WebSocket, code: int = 1000) -> None:
+    # Closing a socket the client already closed raises
+    if (
+        websocket.client_state == WebSocketState.CONNECTED
+        and websocket.application_state == WebSocketState.CONNECTED
+    ):
+        await websocket.close(code=code)
+
+
+async def send_error(websocket: WebSocket, status: int, detail, code: int = POLICY_VIOLATION) -> None:
+    if websocket.client_state != WebSocketState.CONNECTED:
+        return
+    await websocket.send_json({"type": "error", "status": status, "detail": detail})
+    await close_socket(websocket, code)
+
+
+async def receive_message(websocket: WebSocket) -> str:
+    message = await asyncio.wait_for(websocket.receive_text(), timeout=SESSION_IDLE_TIMEOUT)
+    if len(message) > MAX_AGENT_BODY_BYTES:
+        raise HTTPException(status_code=413, detail=f"Message exceeds {MAX_AGENT_BODY_BYTES} bytes")
+    check_node_count(count_dom_nodes(message))
+    return message
+
+
+@router.websocket("/agent/ws")
+async def agent_session(websocket: WebSocket):
+    """Runs a whole agent task over one connection.
+
+    The client sends a start message, then one observation (DOM + screenshot)
+    per step; the server answers each with the step's actions, keeping the
+    history, prompt and entitlement in memory between steps.
+    """
+    app = websocket.app
+    await websocket.accept()
+    try:
+        start = AgentSessionStart.model_validate_json(await receive_message(websocket))
+        check_agent_entitlement(app, start.email, is_new_session=True)
+    except ValidationError as e:
+        await send_error(websocket, 422, e.errors(include_url=False, include_input=False))
+        return
+    except HTTPException as e:
+        await send_error(websocket, e.status_code, e.detail)
+        return
+    except (WebSocketDisconnect, asyncio.TimeoutError):
+        await close_socket(websocket)
+        return
+
+    history = AgentHistory.new_session()
+    record_session_start(app.state.sessions_col, history.session_id, start.email, start.agentMode)
+    system_message = build_system_message(start.agentMode, start.jobApplicationData, start.multiAction)
+    session = AgentSession(start, history, PromptState(system_message))
+    metrics.increment("agent.sessions.started")
+    await websocket.send_json({"type": "session", "session_id": history.session_id})
+
+    try:
+        while True:
+            memory = RequestMemory.start("agent.session.memory")
+            raw = await receive_message(websocket)
+            message = session_messages.validate_json(raw)
+            memory.add("message", len(raw))
+            if isinstance(message, AgentSessionStop):
+                break
+            # Large pages are rendered in a worker straight from the message
+            dom_source = raw.encode() if offloads(len(message.dom.map)) else None
+            del raw
+            check_page_limits(message.dom, [message.screenshot])
+            memory.add("screenshot", screenshot_bytes([message.screenshot]))
+            memory.add("history_screenshots", screenshot_bytes(session.history.screenshots.values()))
+
+            started = time.perf_counter()
+            try:
+                result = await run_agent_step(
+                    app,
+                    session.request_for(message),
+                    session.history,
+                    # The client sends nothing while a step runs; any message or a
+                    # closed socket means the user stopped the agent
+                    lambda call, deadline: run_until_cancelled(
+                        call, websocket.receive_text(), deadline
+                    ),
+                    session.prompt_state,
+                    dom_source,
+                )
+            except ClientDisconnected:
+                break
+            finally:
+                memory.finish()
+            metrics.increment("agent.sessions.steps")
+            metrics.observe_latency("agent.session.step", time.perf_counter() - started)
+
+            await websocket.send_text(
+                pydantic_core.to_json({"type": "result", **result}).decode()
+            )
+            # Only steps the model still sees in full need their screenshots; without
+            # this a long session keeps one per step for as long as the socket is open
+            session.history.keep_recent_screenshots(session.history_limit)
+            if is_finished(result):
+                break
+        await close_socket(websocket)
+    except ValidationError as e:
+        await send_error(websocket, 422, e.errors(include_url=False, include_input=False))
+    except HTTPException as e:
+        await send_error(websocket, e.status_code, e.detail, code=MESSAGE_TOO_BIG)
+    except asyncio.TimeoutError:
+        metrics.increment("agent.sessions.idle_timeouts")
+        await close_socket(websocket)
+    except WebSocketDisconnect:
+        pass
+
@@ -1,19 +1,20 @@
 from fastapi import APIRouter
-from langchain_openai import ChatOpenAI
-from langchain.schema import SystemMessage, HumanMessage
+from langchain_core.messages import SystemMessage, HumanMessage
 from app.common.models import EnrichRequest, EnrichResponse
-from app.common.prompts import ENRICH_SYSTEM_PROMPT, get_enrich_mode_context
+from app.common.prompts import ENRICH_SYSTEM_PROMPT
+from app.common.agent_modes import get_agent_mode
 from app.database import OPENAI_MODEL_NAME
+from app.llm import get_chat_model
 
 router = APIRouter()
 
-llm = ChatOpenAI(model=OPENAI_MODEL_NAME, temperature=0.4)
+ENRICH_TEMPERATURE = 0.4
 
 
 @router.post("/enrich", response_model=EnrichResponse)
 async def enrich_prompt(request: EnrichRequest):
     system_prompt = ENRICH_SYSTEM_PROMPT
-    mode_context = get_enrich_mode_context(request.agentMode)
+    mode_context = get_agent_mode(request.agentMode).enrich_context
     if mode_context:
         system_prompt = system_prompt + "\n" + mode_context
     
@@ -22,6 +23,7 @@ async def enrich_prompt(request: EnrichRequest):
         HumanMessage(content=request.prompt),
     ]
 
+    llm = get_chat_model(OPENAI_MODEL_NAME, ENRICH_TEMPERATURE)
     response = await llm.ainvoke(messages)
     print(response.content)
     return EnrichResponse(prompt=response.content)
@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+import asyncio
+import json
+
+from app.common import metrics
+from app.common.entitlements import entitlements_channel, entitlements_snapshot
+
+router = APIRouter()
+
+# Proxies and load balancers drop connections that stay silent for about a minute
+HEARTBEAT_INTERVAL = 25.0
+# Tells EventSource how long to wait before reconnecting after a drop
+RECONNECT_DELAY_MS = 5000
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.get("/events/entitlements")
+async def stream_entitlements(email: str, req: Request):
+    pubsub = req.app.state.pubsub
+    # Subscribe before taking the snapshot so a change in between is not lost
+    channel = entitlements_channel(email)
+    queue = pubsub.subscribe(channel)
+    metrics.increment("events.entitlements.connections")
+
+    async def events():
+        try:
+            yield f"retry: {RECONNECT_DELAY_MS}\n\n"
+            yield sse_event("entitlements", entitlements_snapshot(req.app, email))
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                # The relay that drops cached statuses hears this message too, in
+                # no fixed order, so drop the entry here before reading it back
+                req.app.state.status_cache.invalidate(email)
+                metrics.increment("events.entitlements.pushed")
+                yield sse_event("entitlements", entitlements_snapshot(req.app, email))
+        finally:
+            pubsub.unsubscribe(channel, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
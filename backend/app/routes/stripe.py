@@ -1,40 +1,36 @@
 from fastapi import APIRouter, Request, HTTPException, Header
 from fastapi.responses import HTMLResponse
-import stripe
+from functools import lru_cache
 import json
 from datetime import datetime, timezone
 from app.database import STRIPE_SECRET_KEY, STRIPE_PRICE_ID, STRIPE_WEBHOOK_SECRET
 from app.common.models import StripeRequest
-
-stripe.api_key = STRIPE_SECRET_KEY
+from app.common.status_cache import status_response
+from app.common.entitlements import load_stripe_status, notify_entitlements_changed
 
 router = APIRouter()
 
 
-@router.get("/stripe/status")
-async def get_stripe_status(email: str, request: Request):
-    premium_col = request.app.state.premium_col
-    premium_doc = premium_col.find_one({"email": email}, {"_id": 0})
+@lru_cache(maxsize=1)
+def get_stripe():
+    # The SDK is slow to import and only billing routes need it, so load it on first use
+    import stripe
 
-    if not premium_doc:
-        return {"active": False, "status": None}
+    stripe.api_key = STRIPE_SECRET_KEY
+    return stripe
 
-    current_period_end = premium_doc.get("subscription_current_period_end")
-    
-    if current_period_end and hasattr(current_period_end, 'timestamp'):
-        current_period_end_ts = str(int(current_period_end.timestamp()))
-    else:
-        current_period_end_ts = None
-    
-    return {
-        "active": premium_doc.get("subscription_status"),
-        "status": premium_doc.get("subscription_status"),
-        "current_period_end": current_period_end_ts,
-    }
+
+@router.get("/stripe/status")
+async def get_stripe_status(email: str, request: Request):
+    cached = request.app.state.status_cache.get_or_load(
+        "stripe", email, lambda: load_stripe_status(request.app.state.premium_col, email)
+    )
+    return status_response(request, cached)
 
 
 @router.post("/stripe/checkout")
 async def create_stripe_checkout_session(stripe_req: StripeRequest, request: Request):
+    stripe = get_stripe()
     if not STRIPE_PRICE_ID:
         raise HTTPException(status_code=500, detail="Stripe product price is not configured.")
 
@@ -150,6 +146,7 @@ async def payment_success():
 
 @router.post("/stripe/webhook", include_in_schema=False)
 async def stripe_webhook(request: Request, stripe_signature: str = Header(None, alias="stripe-signature")):  # type: ignore
+    stripe = get_stripe()
     payload = await request.body()
 
     try:
@@ -194,19 +191,24 @@ async def stripe_webhook(request: Request, stripe_signature: str = Header(None,
         premium_doc = premium_col.find_one({"stripe_customer_id": customer_id})
         if premium_doc and premium_doc.get("email"):
             users_col.update_one({"email": premium_doc["email"]}, {"$set": {"premium": premium_flag}})
+            await notify_entitlements_changed(request.app, premium_doc["email"])
 
     elif event.type == "invoice.payment_failed":
         customer_id = event.data["object"]["customer"]
-        premium_col.update_one(
+        premium_doc = premium_col.find_one_and_update(
             {"stripe_customer_id": customer_id},
             {"$set": {"subscription_status": "payment_failed"}},
+            projection={"email": 1},
         )
+        if premium_doc and premium_doc.get("email"):
+            await notify_entitlements_changed(request.app, premium_doc["email"])
 
     return {"received": True}
 
 
 @router.post("/stripe/cancel")
 async def cancel_subscription(request: Request, body: dict):
+    stripe = get_stripe()
     email = body.get("email")
     if not email:
         raise HTTPException(status_code=400, detail="Email is required")
@@ -243,6 +245,7 @@ async def cancel_subscription(request: Request, body: dict):
                 }
             }
         )
+        await notify_entitlements_changed(request.app, email)
         
         return {"success": True, "message": "Subscription will be canceled at the end of the billing period"}
         
@@ -252,6 +255,7 @@ async def cancel_subscription(request: Request, body: dict):
 
 @router.post("/stripe/reactivate")
 async def reactivate_subscription(request: Request, body: dict):
+    stripe = get_stripe()
     email = body.get("email")
     if not email:
         raise HTTPException(status_code=400, detail="Email is required")
@@ -299,6 +303,7 @@ async def reactivate_subscription(request: Request, body: dict):
         )
         
         users_col.update_one({"email": email}, {"$set": {"premium": 1}})
+        await notify_entitlements_changed(request.app, email)
         
         return {"success": True, "message": "Subscription has been reactivated"}
         
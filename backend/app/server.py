@@ -1,11 +1,111 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+import asyncio
+import importlib
+import os
+import time
 
 from app.routes.auth import router as auth_router
-from app.routes.agent import router as agent_router
-from app.routes.enrich import router as enrich_router
+from app.routes.agent import AGENT_TEMPERATURE, router as agent_router
+from app.routes.enrich import ENRICH_TEMPERATURE, router as enrich_router
 from app.routes.stripe import router as stripe_router
-from app.database import lifespan
+from app.routes.admin import router as admin_router
+from app.routes.events import router as events_router
+from app.routes.agent_session import router as agent_session_router
+from app.common import metrics
+from app.common.agent_modes import agent_tool_sets, compile_agent_modes
+from app.common.compression import CompressionMiddleware
+from app.common.dom_offload import shutdown_offload_pool, start_offload_pool
+from app.database import MONGO_PING_TIMEOUT_MS, OPENAI_MODEL_NAME, lifespan as database_lifespan, ping_mongo
+from app.llm import close_http_client, get_chat_model, warm_up_models
+
+# Set to 0 to serve immediately without warming, e.g. to compare cold first requests
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") != "0"
+WARMUP_TIMEOUT = 15.0
+PROBE_PATHS = {"/", "/healthz", "/readyz"}
+# Loaded on first use by the routes that need them. Startup imports them in a
+# thread so the cost overlaps Mongo and OpenAI warm-up instead of blocking import.
+DEFERRED_IMPORTS = ("langchain_openai", "stripe")
+
+
+def preload_deferred_imports() -> None:
+    started = time.perf_counter()
+    for module_name in DEFERRED_IMPORTS:
+        importlib.import_module(module_name)
+    metrics.observe_latency("startup.deferred_imports", time.perf_counter() - started)
+
+
+async def warm_up_llm() -> bool:
+    await asyncio.to_thread(preload_deferred_imports)
+    get_chat_model(OPENAI_MODEL_NAME, ENRICH_TEMPERATURE)
+    compile_agent_modes()
+    return await warm_up_models(AGENT_TEMPERATURE, agent_tool_sets())
+
+
+async def warm_up(app: FastAPI) -> None:
+    started = time.perf_counter()
+    try:
+        mongo_ok, openai_ok, _ = await asyncio.wait_for(
+            asyncio.gather(
+                asyncio.to_thread(ping_mongo, app.state.db), warm_up_llm(), start_offload_pool()
+            ),
+            timeout=WARMUP_TIMEOUT,
+        )
+    except asyncio.TimeoutError:
+        # Serve anyway; /readyz keeps checking Mongo on its own
+        mongo_ok = openai_ok = False
+    elapsed = time.perf_counter() - started
+    metrics.observe_latency("startup.warmup", elapsed)
+    print(f"[Startup] Warm-up took {elapsed:.2f}s (mongo={mongo_ok}, openai={openai_ok})")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with database_lifespan(app):
+        app.state.ready = False
+        app.state.warmed = WARMUP_ON_STARTUP
+        app.state.first_request_seen = False
+        if WARMUP_ON_STARTUP:
+            await warm_up(app)
+        else:
+            asyncio.create_task(asyncio.to_thread(preload_deferred_imports))
+        app.state.ready = True
+        try:
+            yield
+        finally:
+            app.state.ready = False
+            shutdown_offload_pool()
+            await close_http_client()
+
+
+class FirstRequestMiddleware:
+    """Times the first request that is not a probe.
+
+    Plain ASGI rather than @app.middleware("http"), which wraps receive and hides
+    client disconnects from the routes.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        state = scope["app"].state
+        if scope["type"] != "http" or state.first_request_seen or scope["path"] in PROBE_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        state.first_request_seen = True
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # Compare across deploys with WARMUP_ON_STARTUP on and off
+            warmth = "warm" if state.warmed else "cold"
+            metrics.observe_latency(f"startup.first_request.{warmth}", time.perf_counter() - started)
+
 
 app = FastAPI(lifespan=lifespan)
 
@@ -15,14 +115,43 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(FirstRequestMiddleware)
+
 
 app.include_router(auth_router)
 app.include_router(agent_router)
+app.include_router(agent_session_router)
 app.include_router(enrich_router)
 app.include_router(stripe_router)
+app.include_router(admin_router)
+app.include_router(events_router)
 
 
 @app.get("/")
 async def health_check():
     return {"status": "Backend running..."}
+
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz(request: Request):
+    if not request.app.state.ready:
+        return JSONResponse(status_code=503, content={"status": "starting"})
+
+    try:
+        mongo_ok = await asyncio.wait_for(
+            asyncio.to_thread(ping_mongo, request.app.state.db),
+            timeout=MONGO_PING_TIMEOUT_MS / 1000,
+        )
+    except asyncio.TimeoutError:
+        mongo_ok = False
+    if not mongo_ok:
+        return JSONResponse(status_code=503, content={"status": "mongo unavailable"})
+    return {"status": "ready", "warmed": request.app.state.warmed}
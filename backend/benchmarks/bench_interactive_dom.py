@@ -0,0 +1,66 @@
+"""Time build_interactive_dom on synthetic feed pages.
+
+Run from backend/: python -m benchmarks.bench_interactive_dom
+
+uncached renders without the subtree cache; cold starts every run from an empty
+cache; template renders a page whose posts differ from one already cached, as
+another user on the same site would; repeat renders the same page again.
+"""
+import contextlib
+import gc
+import io
+import statistics
+import time
+
+from app.common.interactive_dom import build_interactive_dom
+from app.common.render_cache import SubtreeCache
+from benchmarks.fixtures import make_feed_page_dom
+
+
+def timed(render, prepare, repeat: int):
+    timings = []
+    # CPU time with the collector paused keeps runs comparable on a noisy host
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            with contextlib.redirect_stdout(io.StringIO()):
+                prepare()
+                started = time.process_time()
+                rendered = render()
+                timings.append(time.process_time() - started)
+    finally:
+        gc.enable()
+    return rendered, timings
+
+
+def bench(cards: int, repeat: int = 9) -> None:
+    dom = make_feed_page_dom(cards)
+    other_page = make_feed_page_dom(cards, first_post=cards)
+    shared = SubtreeCache()
+
+    def fill_from_other_page():
+        shared.clear()
+        build_interactive_dom(other_page, cache=shared)
+
+    cases = {
+        "uncached": (lambda: build_interactive_dom(dom, cache=None), lambda: None),
+        "cold": (lambda: build_interactive_dom(dom, cache=SubtreeCache()), lambda: None),
+        "template": (lambda: build_interactive_dom(dom, cache=shared), fill_from_other_page),
+        "repeat": (lambda: build_interactive_dom(dom, cache=shared), lambda: None),
+    }
+    for case, (render, prepare) in cases.items():
+        rendered, timings = timed(render, prepare, repeat)
+        lookups = rendered.cache_hits + rendered.cache_misses
+        hit_ratio = f"{rendered.cache_hits / lookups:.2f}" if lookups else "-"
+        print(
+            f"cards={cards:<5} nodes={len(dom.map):<6} {case:<9} chars={len(rendered.text):<8} "
+            f"median={statistics.median(timings) * 1000:.1f}ms min={min(timings) * 1000:.1f}ms "
+            f"hit_ratio={hit_ratio}"
+        )
+    stats = shared.stats()
+    print(f"  cache: {stats['entries']} entries, {stats['bytes'] / 1e6:.1f}MB")
+
+
+if __name__ == "__main__":
+    for cards in (100, 1000, 3000):
+        bench(cards)
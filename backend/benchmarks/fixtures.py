@@ -0,0 +1,85 @@
+from typing import Any, Dict
+
+from app.common.models import PageDom
+
+
+ACTION_LABELS = ["Reply", "Repost", "Like", "Bookmark", "Share"]
+
+
+def make_feed_dom(cards: int = 500, first_post: int = 0) -> Dict[str, Any]:
+    """Synthetic social feed: repeated post cards with an identical action-button row.
+
+    first_post shifts the post numbers, giving another page of the same template.
+    """
+    node_map: Dict[str, Any] = {}
+    highlight_index = 0
+
+    def element(node_id: str, tag: str, attributes: Dict[str, str], children, **flags):
+        node_map[node_id] = {
+            "type": "ELEMENT_NODE",
+            "tagName": tag,
+            "attributes": attributes,
+            "xpath": f"/html/body/{node_id}",
+            "children": children,
+            "isVisible": True,
+            **flags,
+        }
+
+    def text(node_id: str, value: str):
+        node_map[node_id] = {"type": "TEXT_NODE", "text": value, "isVisible": True}
+
+    card_ids = []
+    for card in range(cards):
+        card_id = f"card{card}"
+        card_ids.append(card_id)
+
+        post = first_post + card
+        text(f"{card_id}-body-text", f"  Post number {post} with some   body text about topic {post % 7}  ")
+        element(f"{card_id}-body", "div", {"class": "post-body", "dir": "auto"}, [f"{card_id}-body-text"], isTopElement=True)
+
+        text(f"{card_id}-author-text", f"User {card % 50}")
+        element(
+            f"{card_id}-author",
+            "a",
+            {"href": f"/user{card % 50}", "role": "link", "class": "author", "tabindex": "0"},
+            [f"{card_id}-author-text"],
+            isTopElement=True,
+            isInteractive=True,
+            isInViewport=card < 5,
+            highlightIndex=highlight_index,
+        )
+        highlight_index += 1
+
+        button_ids = []
+        for label in ACTION_LABELS:
+            button_id = f"{card_id}-{label}"
+            button_ids.append(button_id)
+            text(f"{button_id}-text", label)
+            element(
+                button_id,
+                "button",
+                {"aria-label": label, "role": "button", "type": "button", "data-testid": label.lower(), "class": "action"},
+                [f"{button_id}-text"],
+                isTopElement=True,
+                isInteractive=True,
+                isInViewport=card < 5,
+                highlightIndex=highlight_index,
+            )
+            highlight_index += 1
+        element(f"{card_id}-actions", "div", {"role": "group", "class": "actions"}, button_ids, isTopElement=True)
+
+        element(
+            card_id,
+            "article",
+            {"role": "article", "class": "post", "tabindex": "-1"},
+            [f"{card_id}-author", f"{card_id}-body", f"{card_id}-actions"],
+            isTopElement=True,
+        )
+
+    element("feed", "main", {"role": "main"}, card_ids, isTopElement=True)
+    element("root", "body", {}, ["feed"], isTopElement=True)
+    return {"rootId": "root", "map": node_map}
+
+
+def make_feed_page_dom(cards: int = 500, first_post: int = 0) -> PageDom:
+    return PageDom.model_validate(make_feed_dom(cards, first_post))
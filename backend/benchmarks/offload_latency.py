@@ -0,0 +1,83 @@
+"""Latency of small agent steps while large pages render, inline vs in the process pool.
+
+Run from backend/: python -m benchmarks.offload_latency
+
+Light clients render a small page and then wait on a stand-in for the model call;
+one heavy client does the same with a large page. With rendering inline the heavy
+page blocks the event loop and the light clients' tail latency grows with it.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+
+from app.common import dom_offload
+from benchmarks.fixtures import make_feed_page_dom
+
+LIGHT_CLIENTS = 8
+LIGHT_CARDS = 20
+HEAVY_CARDS = 1000
+MODEL_DELAY = 0.05
+DURATION = 5.0
+
+
+def silence_worker() -> None:
+    sys.stdout = open(os.devnull, "w")
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+async def light_client(latencies, deadline: float) -> None:
+    dom = make_feed_page_dom(LIGHT_CARDS)
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await dom_offload.render_dom(dom)
+        await asyncio.sleep(MODEL_DELAY)
+        latencies.append(time.perf_counter() - started)
+
+
+async def heavy_client(deadline: float) -> int:
+    dom = make_feed_page_dom(HEAVY_CARDS)
+    renders = 0
+    while time.perf_counter() < deadline:
+        await dom_offload.render_dom(dom)
+        await asyncio.sleep(MODEL_DELAY)
+        renders += 1
+    return renders
+
+
+async def run(workers: int) -> None:
+    dom_offload.DOM_OFFLOAD_WORKERS = workers
+    if workers:
+        dom_offload.offload_pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=get_context("spawn"), initializer=silence_worker
+        )
+        await dom_offload.start_offload_pool()
+
+    latencies = []
+    deadline = time.perf_counter() + DURATION
+    with contextlib.redirect_stdout(io.StringIO()):
+        *_, renders = await asyncio.gather(
+            *(light_client(latencies, deadline) for _ in range(LIGHT_CLIENTS)),
+            heavy_client(deadline),
+        )
+    dom_offload.shutdown_offload_pool()
+
+    print(
+        f"workers={workers} light_steps={len(latencies):<5} heavy_renders={renders:<3} "
+        f"p50={statistics.median(latencies) * 1000:.0f}ms "
+        f"p99={percentile(latencies, 99) * 1000:.0f}ms max={max(latencies) * 1000:.0f}ms"
+    )
+
+
+if __name__ == "__main__":
+    for workers in (0, 2):
+        asyncio.run(run(workers))
@@ -0,0 +1,47 @@
+"""Recall of the goal-conditioned element ranking on recorded agent steps.
+
+Record samples by running the backend with DOM_RANKING_RECORD_PATH=/path/samples.jsonl,
+then run from backend/: python -m benchmarks.ranking_recall /path/samples.jsonl [max_elements ...]
+
+A sample counts as recalled when the element the model chose is still in the first,
+most relevant part of the page after ranking keeps max_elements there.
+"""
+import json
+import re
+import sys
+from dataclasses import replace
+
+from app.common.element_ranking import DEFAULT_RANKING_CONFIG, build_goal, rank_lines
+
+
+RENDERED_INDEX = re.compile(r"^\s*\[(\d+)\]<", re.MULTILINE)
+
+
+def load_samples(path: str):
+    with open(path, encoding="utf-8") as source:
+        for line in source:
+            if line.strip():
+                yield json.loads(line)
+
+
+def recall(samples, max_elements: int) -> tuple[int, int, int]:
+    config = replace(DEFAULT_RANKING_CONFIG, max_elements=max_elements)
+    hits = total = ranked = 0
+    for sample in samples:
+        goal = build_goal(sample["prompt"], sample["history"], config.history_steps)
+        kept, _, ranked_out = rank_lines(sample["lines"], goal, config)
+        visible = {int(match) for match in RENDERED_INDEX.findall("\n".join(kept))}
+        total += 1
+        ranked += ranked_out > 0
+        hits += sample["chosen_index"] in visible
+    return hits, total, ranked
+
+
+if __name__ == "__main__":
+    samples = list(load_samples(sys.argv[1]))
+    for max_elements in [int(arg) for arg in sys.argv[2:]] or [50, 100, 150, 300]:
+        hits, total, ranked = recall(samples, max_elements)
+        print(
+            f"max_elements={max_elements:<5} recall={hits / max(total, 1):.3f} "
+            f"({hits}/{total}, ranking applied on {ranked})"
+        )
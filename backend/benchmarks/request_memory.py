@@ -0,0 +1,129 @@
+"""Peak memory of one large /agent step: parse, render and prompt building.
+
+Run from backend/: python -m benchmarks.request_memory
+
+Each size runs in a fresh process. "rss" is how far the resident set peaked
+above where it stood with only the raw body in memory (Linux, via VmHWM);
+"heap" is the Python allocation peak from tracemalloc in a second run, which
+excludes pydantic-core's native JSON parse.
+"""
+import base64
+import contextlib
+import gc
+import io
+import json
+import os
+import subprocess
+import sys
+import tracemalloc
+
+from benchmarks.fixtures import make_feed_dom
+
+SCREENSHOT_BYTES = 600_000
+HISTORY_STEPS = 10
+HISTORY_SCREENSHOT_BYTES = 300_000
+PHASES = ("parse", "render", "prompt")
+
+
+def data_url(size: int) -> str:
+    return f"data:image/jpeg;base64,{base64.b64encode(os.urandom(size)).decode()}"
+
+
+def make_body(cards: int) -> bytes:
+    history = {
+        "version": 2,
+        "session_id": "benchmark",
+        "steps": [
+            {"step_number": step, "action": "scroll", "value": "down", "summary": "Scrolled", "screenshot_ref": f"shot{step}"}
+            for step in range(1, HISTORY_STEPS + 1)
+        ],
+        "screenshots": {f"shot{step}": data_url(HISTORY_SCREENSHOT_BYTES) for step in range(1, HISTORY_STEPS + 1)},
+    }
+    return json.dumps({
+        "dom": make_feed_dom(cards),
+        "prompt": "Like the first post",
+        "email": "benchmark@example.com",
+        "history": history,
+        "screenshot": data_url(SCREENSHOT_BYTES),
+    }).encode()
+
+
+def resident() -> tuple[int, int]:
+    with open("/proc/self/status") as status:
+        fields = dict(line.split(":", 1) for line in status if ":" in line)
+    return int(fields["VmRSS"].split()[0]) * 1024, int(fields["VmHWM"].split()[0]) * 1024
+
+
+def reset_peak() -> None:
+    with open("/proc/self/clear_refs", "w") as clear_refs:
+        clear_refs.write("5")
+
+
+def run_step(body: bytes, measure) -> dict:
+    from app.common.interactive_dom import build_interactive_dom
+    from app.common.models import AgentRequest
+    from app.routes.agent import build_agent_messages
+
+    results = {}
+    with measure(results, "parse"):
+        agent_request = AgentRequest.model_validate_json(body)
+    with measure(results, "render"), contextlib.redirect_stdout(io.StringIO()):
+        rendered = build_interactive_dom(agent_request.dom, cache=None)
+    with measure(results, "prompt"):
+        messages = build_agent_messages(agent_request, agent_request.history, rendered, None)
+    results["nodes"] = len(agent_request.dom.map)
+    del messages
+    return results
+
+
+def child(cards: int, mode: str) -> None:
+    # Import everything up front so module loading does not count as request memory
+    import app.routes.agent  # noqa: F401
+
+    body = make_body(cards)
+    gc.collect()
+
+    @contextlib.contextmanager
+    def measure(results: dict, phase: str):
+        if mode == "rss":
+            before, _ = resident()
+            reset_peak()
+            yield
+            _, peak = resident()
+            results[phase] = peak - before
+        else:
+            tracemalloc.start()
+            yield
+            results[phase] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    results = run_step(body, measure)
+    results["body"] = len(body)
+    print(json.dumps(results))
+
+
+def bench(cards: int) -> None:
+    runs = {}
+    for mode in ("rss", "heap"):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.request_memory", "--child", str(cards), mode],
+            capture_output=True,
+            text=True,
+            check=True,
+            env={**os.environ, "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "benchmark")},
+        )
+        runs[mode] = json.loads(output.stdout.strip().splitlines()[-1])
+
+    rss, heap = runs["rss"], runs["heap"]
+    phases = " ".join(
+        f"{phase}={rss[phase] / 1e6:5.1f}/{heap[phase] / 1e6:5.1f}MB" for phase in PHASES
+    )
+    print(f"cards={cards:<5} nodes={rss['nodes']:<6} body={rss['body'] / 1e6:5.1f}MB  rss/heap peak: {phases}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        child(int(sys.argv[2]), sys.argv[3])
+    else:
+        for cards in (500, 1000, 2000):
+            bench(cards)
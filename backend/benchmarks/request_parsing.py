@@ -0,0 +1,56 @@
+"""Parse /agent request bodies the way FastAPI does and the way run_agent now does.
+
+Run from backend/: python -m benchmarks.request_parsing
+
+"dict" is json.loads followed by model_validate, which is what a typed body
+parameter costs. "raw" is model_validate_json on the bytes in one pass.
+"""
+import base64
+import gc
+import json
+import os
+import statistics
+import time
+
+from app.common.models import AgentRequest
+from benchmarks.fixtures import make_feed_dom
+
+SCREENSHOT_BYTES = 400_000
+
+
+def make_body(cards: int) -> bytes:
+    screenshot = base64.b64encode(os.urandom(SCREENSHOT_BYTES)).decode()
+    return json.dumps({
+        "dom": make_feed_dom(cards),
+        "prompt": "Like the first post",
+        "email": "benchmark@example.com",
+        "screenshot": f"data:image/jpeg;base64,{screenshot}",
+    }).encode()
+
+
+def timed(parse, body: bytes, repeat: int) -> float:
+    timings = []
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = time.process_time()
+            parse(body)
+            timings.append(time.process_time() - started)
+    finally:
+        gc.enable()
+    return statistics.median(timings)
+
+
+def bench(cards: int, repeat: int = 9) -> None:
+    body = make_body(cards)
+    as_dict = timed(lambda raw: AgentRequest.model_validate(json.loads(raw)), body, repeat)
+    as_raw = timed(AgentRequest.model_validate_json, body, repeat)
+    print(
+        f"cards={cards:<5} body={len(body) / 1e6:5.1f}MB "
+        f"dict={as_dict * 1000:7.1f}ms raw={as_raw * 1000:7.1f}ms"
+    )
+
+
+if __name__ == "__main__":
+    for cards in (100, 500, 1000):
+        bench(cards)
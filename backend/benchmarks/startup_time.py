@@ -0,0 +1,93 @@
+"""Profile backend imports and time process start until the server answers a probe.
+
+Run from backend/: python -m benchmarks.startup_time [--probe /readyz] [--runs 5]
+
+The import profile is `python -X importtime -c "import app.server"`, summarised
+by cumulative time. Start-to-ready launches uvicorn and polls the probe path;
+/healthz answers once the lifespan has finished, /readyz additionally needs Mongo.
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+POLL_INTERVAL = 0.02
+READY_TIMEOUT = 60.0
+
+
+def import_profile(top: int) -> None:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.server"],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "benchmark")},
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, self_us, cumulative_us, name = (part.strip() for part in line.replace(":", "|", 1).split("|"))
+        rows.append((int(cumulative_us), int(self_us), name))
+
+    total = next((cumulative for cumulative, _, name in rows if name == "app.server"), 0)
+    print(f"import app.server: {total / 1000:.0f}ms cumulative")
+    for cumulative, self_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"  {cumulative / 1000:8.1f}ms  (self {self_us / 1000:6.1f}ms)  {name}")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_to_ready(probe: str, warmup: bool) -> float:
+    port = free_port()
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "benchmark"),
+        "WARMUP_ON_STARTUP": "1" if warmup else "0",
+    }
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.server:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < READY_TIMEOUT:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}{probe}", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            if server.poll() is not None:
+                raise RuntimeError("server exited before becoming ready")
+            time.sleep(POLL_INTERVAL)
+        raise TimeoutError(f"{probe} did not answer 200 within {READY_TIMEOUT:.0f}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--probe", default="/healthz")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--warmup", action="store_true", help="run the lifespan warm-up")
+    args = parser.parse_args()
+
+    import_profile(args.top)
+    timings = [start_to_ready(args.probe, args.warmup) for _ in range(args.runs)]
+    print(
+        f"start-to-ready ({args.probe}, warmup={'on' if args.warmup else 'off'}): "
+        f"median={statistics.median(timings) * 1000:.0f}ms min={min(timings) * 1000:.0f}ms"
+    )
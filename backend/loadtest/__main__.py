@@ -0,0 +1,179 @@
+"""Load test one app worker against fake OpenAI, Mongo and Stripe.
+
+Run from backend/: python -m loadtest --users 10,50,100 --duration 30
+
+The fakes and the worker each run in their own process and the load comes from
+this one, so the worker's numbers only include the app's own work. Each scenario
+runs at each user count as a closed loop: every virtual user sends its next
+request as soon as the previous one returns (plus --think). The report gives
+throughput, p50/p95/p99 latency of successful requests, and how late the
+worker's event loop woke a task sleeping 10ms, which is how long any request
+could have been held up behind blocking work. Latency is measured here, so at
+hundreds of requests a second this process can become the limit before the
+worker does; low lag with rising latency is the sign.
+"""
+from contextlib import asynccontextmanager
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from app.common.metrics import LatencyStats
+from loadtest.scenarios import SCENARIOS, Context, Options, pages_for
+
+STARTUP_TIMEOUT = 60.0
+REQUEST_TIMEOUT = 180.0
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def start_process(args: list, env: dict, log) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, *args], env={**os.environ, **env}, stdout=log, stderr=subprocess.STDOUT
+    )
+
+
+async def wait_until_ready(url: str, process: subprocess.Popen, log_path: str) -> None:
+    deadline = time.perf_counter() + STARTUP_TIMEOUT
+    async with httpx.AsyncClient() as client:
+        while time.perf_counter() < deadline:
+            if process.poll() is not None:
+                raise SystemExit(f"{url} exited during startup, see {log_path}")
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise SystemExit(f"{url} was not ready after {STARTUP_TIMEOUT:.0f}s, see {log_path}")
+
+
+@asynccontextmanager
+async def services(args: argparse.Namespace, seeded_users: int):
+    fakes_port, worker_port = free_port(), free_port()
+    fakes_url = f"http://127.0.0.1:{fakes_port}"
+    log_dir = tempfile.mkdtemp(prefix="loadtest-")
+    fakes_log_path, worker_log_path = f"{log_dir}/fakes.log", f"{log_dir}/worker.log"
+    fake_env = {
+        "LOADTEST_LLM_LATENCY": str(args.llm_latency),
+        "LOADTEST_LLM_JITTER": str(args.llm_jitter),
+        "LOADTEST_LLM_ACTIONS": args.llm_actions,
+        "LOADTEST_STRIPE_LATENCY": str(args.stripe_latency),
+    }
+    processes = []
+    with open(fakes_log_path, "w") as fakes_log, open(worker_log_path, "w") as worker_log:
+        try:
+            processes.append(start_process(
+                ["-m", "uvicorn", "loadtest.fake_services:app", "--port", str(fakes_port), "--log-level", "warning"],
+                fake_env,
+                fakes_log,
+            ))
+            await wait_until_ready(f"{fakes_url}/healthz", processes[0], fakes_log_path)
+            processes.append(start_process(
+                ["-m", "loadtest.worker", "--port", str(worker_port), "--fakes", fakes_url, "--users", str(seeded_users)],
+                {},
+                worker_log,
+            ))
+            worker_url = f"http://127.0.0.1:{worker_port}"
+            await wait_until_ready(f"{worker_url}/readyz", processes[1], worker_log_path)
+            print(f"[Loadtest] Worker at {worker_url}, fakes at {fakes_url}, logs in {log_dir}")
+            yield worker_url
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+
+def ms(seconds) -> str:
+    return "-" if seconds is None else f"{seconds * 1000:.0f}ms"
+
+
+def latency_columns(stats: LatencyStats) -> str:
+    return " ".join(f"{ms(stats.percentile(pct)):>8}" for pct in (50, 95, 99))
+
+
+async def collect_loop_lag(worker_url: str) -> dict:
+    # Its own connection, since the worker closes ones that saw a server error
+    async with httpx.AsyncClient(base_url=worker_url) as client:
+        return (await client.get("/loadtest/lag")).json()
+
+
+async def run_scenario(worker_url: str, name: str, users: int, duration: float, options: Options) -> None:
+    limits = httpx.Limits(max_connections=users * 2, max_keepalive_connections=users * 2)
+    # Lag since the previous scenario belongs to nobody
+    await collect_loop_lag(worker_url)
+    async with httpx.AsyncClient(base_url=worker_url, timeout=REQUEST_TIMEOUT, limits=limits) as client:
+        ctx = Context(client, options, time.perf_counter() + duration)
+        started = time.perf_counter()
+        await asyncio.gather(*(SCENARIOS[name](ctx, user) for user in range(users)))
+        elapsed = time.perf_counter() - started
+    lag = await collect_loop_lag(worker_url)
+
+    results = ctx.results
+    requests = results.total.count
+    print(
+        f"{name:<28} {users:>5} {requests:>8} {results.errors:>6} {requests / elapsed:>8.1f} "
+        f"{latency_columns(results.total)}   {ms(lag['p50']):>7} {ms(lag['p99']):>6} {ms(lag['max']):>6}"
+    )
+    for group, stats in sorted(results.groups.items()):
+        print(f"  {group:<26} {'':>5} {stats.count:>8} {'':>6} {stats.count / elapsed:>8.1f} {latency_columns(stats)}")
+    if results.first_error:
+        print(f"  first error: {results.first_error}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated, run in this order")
+    parser.add_argument("--users", default="10,50", help="Concurrent virtual users; comma-separated to step up")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per scenario and user count")
+    parser.add_argument("--think", type=float, default=0.0, help="Seconds each user waits between requests")
+    parser.add_argument("--agent-steps", type=int, default=15, help="Steps per agent session before starting over")
+    parser.add_argument("--cards", type=int, default=40, help="Post cards on each agent page (about 20 nodes each)")
+    parser.add_argument("--screenshot-kb", type=int, default=60)
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="Mean seconds per fake completion")
+    parser.add_argument("--llm-jitter", type=float, default=0.25)
+    parser.add_argument("--llm-actions", default="click_element,scroll_page,input_text")
+    parser.add_argument("--stripe-latency", type=float, default=0.3)
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios {', '.join(unknown)}; choose from {', '.join(SCENARIOS)}")
+    user_counts = [int(users) for users in args.users.split(",")]
+    options = Options(
+        agent_steps=args.agent_steps,
+        cards=args.cards,
+        screenshot_bytes=args.screenshot_kb * 1000,
+        think=args.think,
+        seeded_users=max(user_counts),
+    )
+    if "agent" in scenarios:
+        pages_for(options)
+
+    async with services(args, options.seeded_users) as worker_url:
+        print(
+            f"{'scenario':<28} {'users':>5} {'requests':>8} {'errors':>6} {'req/s':>8} "
+            f"{'p50':>8} {'p95':>8} {'p99':>8}   {'lag p50':>7} {'p99':>6} {'max':>6}"
+        )
+        for name in scenarios:
+            for users in user_counts:
+                await run_scenario(worker_url, name, users, args.duration, options)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+from typing import Any, Dict, List
+import asyncio
+import itertools
+import json
+import os
+import random
+import re
+import time
+
+from fastapi import APIRouter, Request
+
+
+# Seconds each completion takes: a normal draw around the mean, never below zero
+LLM_LATENCY = float(os.getenv("LOADTEST_LLM_LATENCY", "1.0"))
+LLM_JITTER = float(os.getenv("LOADTEST_LLM_JITTER", "0.25"))
+# Tools the fake answers with, in turn; ones the request did not bind are skipped
+LLM_ACTIONS = os.getenv("LOADTEST_LLM_ACTIONS", "click_element,scroll_page,input_text").split(",")
+LLM_OUTPUT_TOKENS = int(os.getenv("LOADTEST_LLM_OUTPUT_TOKENS", "60"))
+
+HIGHLIGHT_PATTERN = re.compile(r"\[(\d+)\]<")
+
+router = APIRouter(prefix="/v1")
+completion_ids = itertools.count(1)
+
+
+def message_text(message: Dict[str, Any]) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return "\n".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+def tool_arguments(name: str, highlight_indexes: List[int], completion: int) -> Dict[str, Any]:
+    highlight_index = highlight_indexes[completion % len(highlight_indexes)] if highlight_indexes else 0
+    if name == "scroll_page":
+        return {"direction": "down", "description": "Load more of the page"}
+    if name == "input_text":
+        return {"highlight_index": highlight_index, "text": f"load test {completion}", "description": "Type"}
+    if name == "press_key":
+        return {"highlight_index": highlight_index, "key": "Enter", "description": "Submit"}
+    if name == "navigate":
+        return {"url": "https://example.com/", "description": "Open the site"}
+    if name == "finish_task":
+        return {"response": "Load test task finished"}
+    if name == "expand_dom":
+        return {"region": 2, "description": "Read further down"}
+    return {"highlight_index": highlight_index, "description": f"Act on element {highlight_index}"}
+
+
+def choose_tool(bound: List[str], completion: int) -> str:
+    available = [name for name in LLM_ACTIONS if name in bound] or bound
+    return available[completion % len(available)]
+
+
+@router.get("/models")
+async def list_models():
+    return {"object": "list", "data": [{"id": "loadtest", "object": "model", "owned_by": "loadtest"}]}
+
+
+@router.post("/chat/completions")
+async def chat_completion(request: Request):
+    body = await request.json()
+    completion = next(completion_ids)
+    await asyncio.sleep(max(0.0, random.gauss(LLM_LATENCY, LLM_JITTER)))
+
+    messages = body.get("messages", [])
+    # The rendered page is in the last user message; act on the elements listed there
+    page = next((message_text(message) for message in reversed(messages) if message.get("role") == "user"), "")
+    highlight_indexes = [int(index) for index in HIGHLIGHT_PATTERN.findall(page)]
+    bound = [tool["function"]["name"] for tool in body.get("tools", [])]
+
+    message: Dict[str, Any] = {"role": "assistant", "content": None}
+    if bound:
+        name = choose_tool(bound, completion)
+        message["tool_calls"] = [
+            {
+                "id": f"call_{completion}",
+                "type": "function",
+                "function": {"name": name, "arguments": json.dumps(tool_arguments(name, highlight_indexes, completion))},
+            }
+        ]
+        finish_reason = "tool_calls"
+    else:
+        message["content"] = "Open the site, find the first matching result and report what it says."
+        finish_reason = "stop"
+
+    prompt_tokens = len(json.dumps(messages)) // 4
+    return {
+        "id": f"chatcmpl-loadtest-{completion}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "loadtest"),
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": LLM_OUTPUT_TOKENS,
+            "total_tokens": prompt_tokens + LLM_OUTPUT_TOKENS,
+            "prompt_tokens_details": {"cached_tokens": 0},
+        },
+    }
@@ -0,0 +1,17 @@
+"""The OpenAI and Stripe stand-ins, served together from their own process so
+their work never shows up in the worker's latency or event-loop lag.
+
+Run from backend/: uvicorn loadtest.fake_services:app --port 8101
+"""
+from fastapi import FastAPI
+
+from loadtest import fake_openai, fake_stripe
+
+app = FastAPI()
+app.include_router(fake_openai.router, prefix="/openai")
+app.include_router(fake_stripe.router, prefix="/stripe")
+
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
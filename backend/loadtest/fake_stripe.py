@@ -0,0 +1,96 @@
+from typing import Any, Dict
+import asyncio
+import hashlib
+import hmac
+import itertools
+import json
+import os
+import time
+from urllib.parse import parse_qsl
+
+from fastapi import APIRouter, Request
+
+
+STRIPE_LATENCY = float(os.getenv("LOADTEST_STRIPE_LATENCY", "0.3"))
+WEBHOOK_SECRET = "whsec_loadtest"
+PRICE_ID = "price_loadtest"
+
+router = APIRouter(prefix="/v1")
+object_ids = itertools.count(1)
+
+
+def subscription(subscription_id: str, customer_id: str, cancel_at_period_end: bool) -> Dict[str, Any]:
+    period_end = int(time.time()) + 30 * 24 * 3600
+    return {
+        "id": subscription_id,
+        "object": "subscription",
+        "customer": customer_id,
+        "status": "active",
+        "cancel_at_period_end": cancel_at_period_end,
+        "cancel_at": period_end if cancel_at_period_end else None,
+        "items": {"object": "list", "data": [{"id": f"si_{subscription_id}", "object": "subscription_item", "current_period_end": period_end}]},
+    }
+
+
+def subscription_event(customer_id: str, status: str, cancel_at_period_end: bool = False) -> Dict[str, Any]:
+    event_id = next(object_ids)
+    return {
+        "id": f"evt_loadtest_{event_id}",
+        "object": "event",
+        "type": "customer.subscription.updated",
+        "data": {"object": {**subscription(f"sub_{customer_id}", customer_id, cancel_at_period_end), "status": status}},
+    }
+
+
+def sign_webhook(payload: bytes, secret: str = WEBHOOK_SECRET) -> str:
+    """The stripe-signature header Stripe would send with this payload."""
+    timestamp = int(time.time())
+    signature = hmac.new(secret.encode(), f"{timestamp}.".encode() + payload, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def webhook_payload(customer_id: str, status: str) -> bytes:
+    return json.dumps(subscription_event(customer_id, status)).encode()
+
+
+async def stripe_call(request: Request) -> Dict[str, str]:
+    await asyncio.sleep(STRIPE_LATENCY)
+    # The SDK sends form-encoded parameters; nested ones keep their bracketed keys
+    return dict(parse_qsl((await request.body()).decode()))
+
+
+@router.post("/customers")
+async def create_customer(request: Request):
+    form = await stripe_call(request)
+    return {"id": f"cus_loadtest_{next(object_ids)}", "object": "customer", "email": form.get("email")}
+
+
+@router.post("/checkout/sessions")
+async def create_checkout_session(request: Request):
+    form = await stripe_call(request)
+    session_id = f"cs_loadtest_{next(object_ids)}"
+    return {
+        "id": session_id,
+        "object": "checkout.session",
+        "customer": form.get("customer"),
+        "mode": form.get("mode"),
+        "url": f"https://checkout.stripe.com/c/pay/{session_id}",
+    }
+
+
+@router.get("/subscriptions")
+async def list_subscriptions(request: Request, customer: str, status: str = "active"):
+    await stripe_call(request)
+    return {
+        "object": "list",
+        "url": "/v1/subscriptions",
+        "has_more": False,
+        "data": [subscription(f"sub_{customer}", customer, cancel_at_period_end=status == "all")],
+    }
+
+
+@router.post("/subscriptions/{subscription_id}")
+async def update_subscription(subscription_id: str, request: Request):
+    form = await stripe_call(request)
+    customer_id = subscription_id.removeprefix("sub_")
+    return subscription(subscription_id, customer_id, form.get("cancel_at_period_end") == "true")
@@ -0,0 +1,253 @@
+from typing import Any, Dict, Iterator, List, Optional
+import copy
+import threading
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+
+# Just enough of pymongo's client for the queries the app makes. Every lookup
+# scans its collection, which is fine for the few thousand documents a load
+# test creates.
+
+MISSING = object()
+
+
+def get_path(document: Dict[str, Any], path: str) -> Any:
+    value: Any = document
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return MISSING
+        value = value[part]
+    return value
+
+
+def set_path(document: Dict[str, Any], path: str, value: Any) -> None:
+    *parents, last = path.split(".")
+    for part in parents:
+        document = document.setdefault(part, {})
+    document[last] = value
+
+
+def unset_path(document: Dict[str, Any], path: str) -> None:
+    *parents, last = path.split(".")
+    for part in parents:
+        document = document.get(part)
+        if not isinstance(document, dict):
+            return
+    document.pop(last, None)
+
+
+def compare(value: Any, operator: str, expected: Any) -> bool:
+    if operator == "$exists":
+        return (value is not MISSING) == bool(expected)
+    if operator == "$eq":
+        return value == expected
+    if operator == "$ne":
+        return value != expected
+    if operator == "$in":
+        return value in expected
+    if operator == "$nin":
+        return value not in expected
+    if value is MISSING or value is None:
+        return False
+    if operator == "$lt":
+        return value < expected
+    if operator == "$lte":
+        return value <= expected
+    if operator == "$gt":
+        return value > expected
+    if operator == "$gte":
+        return value >= expected
+    raise ValueError(f"Unsupported query operator {operator}")
+
+
+def matches(document: Dict[str, Any], filter: Optional[Dict[str, Any]]) -> bool:
+    for key, condition in (filter or {}).items():
+        if key == "$or":
+            if not any(matches(document, clause) for clause in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(document, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict) and condition and all(name.startswith("$") for name in condition):
+            value = get_path(document, key)
+            if not all(compare(value, operator, expected) for operator, expected in condition.items()):
+                return False
+        elif get_path(document, key) != condition:
+            return False
+    return True
+
+
+def apply_update(document: Dict[str, Any], update: Dict[str, Any], inserting: bool) -> None:
+    for operator, fields in update.items():
+        for path, value in fields.items():
+            current = get_path(document, path)
+            if operator == "$set":
+                set_path(document, path, value)
+            elif operator == "$setOnInsert":
+                if inserting:
+                    set_path(document, path, value)
+            elif operator == "$inc":
+                set_path(document, path, (0 if current is MISSING else current) + value)
+            elif operator == "$max":
+                if current is MISSING or value > current:
+                    set_path(document, path, value)
+            elif operator == "$min":
+                if current is MISSING or value < current:
+                    set_path(document, path, value)
+            elif operator == "$unset":
+                unset_path(document, path)
+            else:
+                raise ValueError(f"Unsupported update operator {operator}")
+
+
+def project(document: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    document = copy.deepcopy(document)
+    if not projection:
+        return document
+    included = {key for key, flag in projection.items() if flag and key != "_id"}
+    if included:
+        kept = {key: document[key] for key in included if key in document}
+        if projection.get("_id", 1) and "_id" in document:
+            kept["_id"] = document["_id"]
+        return kept
+    for key, flag in projection.items():
+        if not flag:
+            document.pop(key, None)
+    return document
+
+
+class MemoryCursor:
+    def __init__(self, documents: List[Dict[str, Any]]):
+        self.documents = documents
+
+    def sort(self, key: str, direction: int = 1) -> "MemoryCursor":
+        present = [document for document in self.documents if get_path(document, key) not in (MISSING, None)]
+        absent = [document for document in self.documents if get_path(document, key) in (MISSING, None)]
+        present.sort(key=lambda document: get_path(document, key), reverse=direction < 0)
+        # Mongo orders missing fields before every value
+        self.documents = absent + present if direction > 0 else present + absent
+        return self
+
+    def limit(self, count: int) -> "MemoryCursor":
+        if count:
+            self.documents = self.documents[:count]
+        return self
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.documents)
+
+
+class MemoryCollection:
+    def __init__(self, name: str):
+        self.name = name
+        self.documents: List[Dict[str, Any]] = []
+        # Buffered writes land from worker threads while requests read on the event loop
+        self.lock = threading.Lock()
+
+    def first_match(self, filter: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        return next((document for document in self.documents if matches(document, filter)), None)
+
+    def upsert_document(self, filter: Dict[str, Any]) -> Dict[str, Any]:
+        document: Dict[str, Any] = {"_id": ObjectId()}
+        for key, value in filter.items():
+            if not key.startswith("$") and not (isinstance(value, dict) and any(name.startswith("$") for name in value)):
+                set_path(document, key, value)
+        self.documents.append(document)
+        return document
+
+    def find_one(self, filter: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None, **_: Any):
+        with self.lock:
+            document = self.first_match(filter)
+            return None if document is None else project(document, projection)
+
+    def find(self, filter: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None, **_: Any):
+        with self.lock:
+            return MemoryCursor([project(document, projection) for document in self.documents if matches(document, filter)])
+
+    def count_documents(self, filter: Dict[str, Any], **_: Any) -> int:
+        with self.lock:
+            return sum(1 for document in self.documents if matches(document, filter))
+
+    def insert_one(self, document: Dict[str, Any], **_: Any):
+        with self.lock:
+            stored = copy.deepcopy(document)
+            stored.setdefault("_id", ObjectId())
+            self.documents.append(stored)
+            document.setdefault("_id", stored["_id"])
+            return InsertResult(stored["_id"])
+
+    def insert_many(self, documents: List[Dict[str, Any]], **_: Any):
+        return [self.insert_one(document).inserted_id for document in documents]
+
+    def update(self, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool) -> Optional[Dict[str, Any]]:
+        document = self.first_match(filter)
+        if document is not None:
+            apply_update(document, update, inserting=False)
+        elif upsert:
+            document = self.upsert_document(filter)
+            apply_update(document, update, inserting=True)
+        return document
+
+    def update_one(self, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool = False, **_: Any):
+        with self.lock:
+            self.update(filter, update, upsert)
+
+    def find_one_and_update(
+        self,
+        filter: Dict[str, Any],
+        update: Dict[str, Any],
+        projection: Optional[Dict[str, Any]] = None,
+        upsert: bool = False,
+        return_document: bool = ReturnDocument.BEFORE,
+        **_: Any,
+    ):
+        with self.lock:
+            document = self.first_match(filter)
+            before = None if document is None else copy.deepcopy(document)
+            document = self.update(filter, update, upsert)
+            result = document if return_document == ReturnDocument.AFTER else before
+            return None if result is None else project(result, projection)
+
+    def bulk_write(self, requests: List[Any], ordered: bool = True, **_: Any) -> None:
+        # Only UpdateOne is used (by the write buffer); its fields are private in pymongo
+        with self.lock:
+            for request in requests:
+                self.update(request._filter, request._doc, bool(request._upsert))
+
+    def create_index(self, *_: Any, **__: Any) -> str:
+        return "memory"
+
+
+class InsertResult:
+    def __init__(self, inserted_id: Any):
+        self.inserted_id = inserted_id
+
+
+class MemoryDatabase:
+    def __init__(self):
+        self.collections: Dict[str, MemoryCollection] = {}
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        if name not in self.collections:
+            self.collections[name] = MemoryCollection(name)
+        return self.collections[name]
+
+    def command(self, name: str, **_: Any) -> Dict[str, Any]:
+        return {"ok": 1.0}
+
+
+class MemoryMongoClient:
+    """Stands in for MongoClient; every database lives in this process only."""
+
+    def __init__(self):
+        self.databases: Dict[str, MemoryDatabase] = {}
+
+    def __getitem__(self, name: str) -> MemoryDatabase:
+        if name not in self.databases:
+            self.databases[name] = MemoryDatabase()
+        return self.databases[name]
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,195 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Optional
+import asyncio
+import base64
+import json
+import os
+import random
+import time
+
+import httpx
+
+from app.common.metrics import LatencyStats
+from benchmarks.fixtures import make_feed_dom
+from loadtest.fake_stripe import sign_webhook, webhook_payload
+from loadtest.worker import customer_id, user_email
+
+ENRICH_MODES = [None, "social_media", "job_application"]
+# All of these keep the user premium, so later agent scenarios are not capped at free runs
+WEBHOOK_STATUSES = ["active", "canceled", "trialing"]
+# History is reported in buckets of this many steps, to show how cost grows with it
+HISTORY_BUCKET = 5
+
+
+@dataclass
+class Options:
+    agent_steps: int = 15
+    cards: int = 40
+    screenshot_bytes: int = 60_000
+    think: float = 0.0
+    # Users seeded in the worker; webhooks pick customers from all of them
+    seeded_users: int = 100
+
+
+@dataclass
+class Results:
+    total: LatencyStats = field(default_factory=lambda: LatencyStats(window=None))
+    groups: Dict[str, LatencyStats] = field(default_factory=lambda: defaultdict(lambda: LatencyStats(window=None)))
+    errors: int = 0
+    first_error: Optional[str] = None
+
+    def record(self, seconds: float, group: Optional[str] = None) -> None:
+        self.total.observe(seconds)
+        if group is not None:
+            self.groups[group].observe(seconds)
+
+    def record_error(self, error: str) -> None:
+        self.errors += 1
+        if self.first_error is None:
+            self.first_error = error
+
+
+@dataclass
+class Context:
+    client: httpx.AsyncClient
+    options: Options
+    deadline: float
+    results: Results = field(default_factory=Results)
+
+    def expired(self) -> bool:
+        return time.perf_counter() >= self.deadline
+
+
+async def timed(
+    ctx: Context, send: Callable[[], Awaitable[httpx.Response]], group: Optional[str] = None
+) -> Optional[httpx.Response]:
+    started = time.perf_counter()
+    try:
+        response = await send()
+    except httpx.HTTPError as e:
+        ctx.results.record_error(f"{type(e).__name__}: {e}")
+        return None
+    if response.status_code >= 400:
+        ctx.results.record_error(f"{response.status_code}: {response.text[:200]}")
+        return None
+    ctx.results.record(time.perf_counter() - started, group)
+    return response
+
+
+async def think(ctx: Context) -> None:
+    if ctx.options.think:
+        await asyncio.sleep(ctx.options.think)
+
+
+def data_url(size: int) -> str:
+    return f"data:image/jpeg;base64,{base64.b64encode(os.urandom(size)).decode()}"
+
+
+class AgentPages:
+    """A page and screenshot per step, serialized once and shared by every user."""
+
+    def __init__(self, options: Options):
+        # A new page each step keeps stall detection from finishing sessions early
+        self.doms = [
+            json.dumps(make_feed_dom(options.cards, first_post=step * options.cards))
+            for step in range(options.agent_steps)
+        ]
+        self.screenshots = [data_url(options.screenshot_bytes) for _ in range(options.agent_steps)]
+
+    def body(self, step: int, email: str, history: Optional[dict]) -> bytes:
+        rest = {
+            "prompt": "Like the first post about topic 3 and reply to its author",
+            "email": email,
+            "history": history,
+            "screenshot": self.screenshots[step],
+            # The extension sends every screenshot back, so the body grows with the session
+            "includeScreenshots": True,
+        }
+        return f'{{"dom":{self.doms[step]},{json.dumps(rest)[1:]}'.encode()
+
+
+agent_pages: Dict[tuple, AgentPages] = {}
+
+
+def pages_for(options: Options) -> AgentPages:
+    key = (options.agent_steps, options.cards, options.screenshot_bytes)
+    if key not in agent_pages:
+        agent_pages[key] = AgentPages(options)
+    return agent_pages[key]
+
+
+async def agent_user(ctx: Context, user: int) -> None:
+    pages = pages_for(ctx.options)
+    email = user_email(user)
+    while not ctx.expired():
+        history = None
+        for step in range(ctx.options.agent_steps):
+            if ctx.expired():
+                return
+            first = step // HISTORY_BUCKET * HISTORY_BUCKET
+            body = pages.body(step, email, history)
+            response = await timed(
+                ctx,
+                lambda: ctx.client.post("/agent", content=body, headers={"Content-Type": "application/json"}),
+                f"history {first}-{first + HISTORY_BUCKET - 1} steps",
+            )
+            if response is None:
+                break
+            history = response.json()["history"]
+            await think(ctx)
+
+
+async def enrich_user(ctx: Context, user: int) -> None:
+    while not ctx.expired():
+        mode = ENRICH_MODES[user % len(ENRICH_MODES)]
+        await timed(
+            ctx,
+            lambda: ctx.client.post("/enrich", json={"prompt": "apply to a few jobs", "agentMode": mode}),
+            mode or "default",
+        )
+        await think(ctx)
+
+
+async def status_user(ctx: Context, user: int) -> None:
+    etags: Dict[str, str] = {}
+    params = {"email": user_email(user)}
+    while not ctx.expired():
+        for path in ("/agent/status", "/stripe/status"):
+            # Polls revalidate like the side panel does, so most answers are 304
+            headers = {"If-None-Match": etags[path]} if path in etags else {}
+            response = await timed(ctx, lambda: ctx.client.get(path, params=params, headers=headers), path)
+            if response is not None and "ETag" in response.headers:
+                etags[path] = response.headers["ETag"]
+        await think(ctx)
+
+
+async def webhook_user(ctx: Context, user: int) -> None:
+    sent = 0
+    while not ctx.expired():
+        customer = customer_id(random.randrange(ctx.options.seeded_users))
+        payload = webhook_payload(customer, WEBHOOK_STATUSES[sent % len(WEBHOOK_STATUSES)])
+        headers = {"stripe-signature": sign_webhook(payload), "Content-Type": "application/json"}
+        await timed(ctx, lambda: ctx.client.post("/stripe/webhook", content=payload, headers=headers))
+        sent += 1
+        await think(ctx)
+
+
+async def checkout_user(ctx: Context, user: int) -> None:
+    body = {
+        "email": user_email(user),
+        "success_url": "https://example.com/success",
+        "cancel_url": "https://example.com/cancel",
+    }
+    while not ctx.expired():
+        await timed(ctx, lambda: ctx.client.post("/stripe/checkout", json=body))
+        await think(ctx)
+
+
+SCENARIOS: Dict[str, Callable[[Context, int], Awaitable[None]]] = {
+    "agent": agent_user,
+    "enrich": enrich_user,
+    "status": status_user,
+    "webhooks": webhook_user,
+    "checkout": checkout_user,
+}
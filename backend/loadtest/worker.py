@@ -0,0 +1,120 @@
+"""One uvicorn worker running the real app, with Mongo in memory and OpenAI and
+Stripe pointed at the fakes.
+
+Started by python -m loadtest. To poke at it by hand, start the fakes and then:
+    python -m loadtest.worker --port 8100 --fakes http://127.0.0.1:8101 --users 100
+"""
+from contextlib import asynccontextmanager
+import argparse
+import asyncio
+import os
+import time
+
+from app.common.metrics import LatencyStats
+from loadtest import fake_stripe
+from loadtest.memory_mongo import MemoryMongoClient
+
+# The database name app.database opens
+DB_NAME = "opero-extension-db"
+# Shorter intervals catch shorter stalls but wake the loop more often
+LAG_INTERVAL = 0.01
+
+
+def user_email(user: int) -> str:
+    return f"user{user}@loadtest.dev"
+
+
+def customer_id(user: int) -> str:
+    return f"cus_loadtest_user{user}"
+
+
+def configure_environment(fakes_url: str) -> None:
+    # app.database and app.llm read these on import, so this runs before the app is imported
+    os.environ.update(
+        {
+            "OPENAI_API_KEY": "sk-loadtest",
+            "OPENAI_BASE_URL": f"{fakes_url}/openai/v1",
+            "OPENAI_MODEL_NAME": "gpt-4.1",
+            "OPENAI_FAST_MODEL_NAME": "gpt-4.1-mini",
+            "MONGODB_URI": "memory://loadtest",
+            "STRIPE_SECRET_KEY": "sk_test_loadtest",
+            "STRIPE_WEBHOOK_SECRET": fake_stripe.WEBHOOK_SECRET,
+            "STRIPE_PRICE_ID": fake_stripe.PRICE_ID,
+            # Change streams need a real replica set
+            "PUBSUB_BACKEND": "memory",
+        }
+    )
+
+
+def seed(db, users: int) -> None:
+    db["users"].insert_many(
+        [{"email": user_email(user), "name": f"Load test user {user}", "premium": 1} for user in range(users)]
+    )
+    db["premium"].insert_many(
+        [
+            {"email": user_email(user), "stripe_customer_id": customer_id(user), "subscription_status": "active"}
+            for user in range(users)
+        ]
+    )
+
+
+class LoopLag:
+    """How late the event loop wakes a task that asked to sleep LAG_INTERVAL."""
+
+    def __init__(self):
+        self.stats = LatencyStats(window=None)
+
+    async def run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(LAG_INTERVAL)
+            self.stats.observe(max(0.0, time.perf_counter() - started - LAG_INTERVAL))
+
+    def collect(self) -> dict:
+        stats, self.stats = self.stats, LatencyStats(window=None)
+        return {**stats.snapshot(), "p99": stats.percentile(99)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--fakes", required=True, help="Base URL of loadtest.fake_services")
+    parser.add_argument("--users", type=int, default=100, help="Premium users to seed")
+    args = parser.parse_args()
+
+    configure_environment(args.fakes)
+    mongo = MemoryMongoClient()
+    seed(mongo[DB_NAME], args.users)
+
+    import stripe
+    import uvicorn
+    import app.database
+    # Every MongoClient the app opens gets the seeded in-memory one
+    app.database.MongoClient = lambda *_, **__: mongo
+    from app.server import app as server_app
+
+    stripe.api_base = f"{args.fakes}/stripe"
+    loop_lag = LoopLag()
+    app_lifespan = server_app.router.lifespan_context
+
+    @asynccontextmanager
+    async def lifespan(app):
+        monitor = asyncio.create_task(loop_lag.run())
+        try:
+            async with app_lifespan(app):
+                yield
+        finally:
+            monitor.cancel()
+
+    server_app.router.lifespan_context = lifespan
+
+    @server_app.get("/loadtest/lag", include_in_schema=False)
+    async def collect_loop_lag():
+        # Everything since the previous call, so one call before and one after a scenario
+        return loop_lag.collect()
+
+    uvicorn.run(server_app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+from app.common.interactive_dom import build_interactive_dom
+from app.common.models import AgentHistory
+from app.common.stall_detection import STALL_FINISH_REPEATS, page_fingerprint, stalled_repeats
+from benchmarks.fixtures import make_feed_page_dom
+
+CARDS = 10
+
+
+def scroll_repeats(pages) -> int:
+    history = AgentHistory.new_session()
+    repeats = 0
+    for step, page in enumerate(pages):
+        goal = f"like posts about topic 3 (step {step})"
+        dom_hash = page_fingerprint(build_interactive_dom(page, goal=goal, cache=None))
+        repeats = stalled_repeats(history.steps, dom_hash)
+        history.append(action="scroll", value="down", summary="Scroll the feed", dom_hash=dom_hash)
+    return repeats
+
+
+def test_feed_with_new_posts_is_not_a_stall():
+    # A virtualized feed recycles the same cards (same xpaths and highlight indexes)
+    # for new posts on every scroll
+    pages = [make_feed_page_dom(CARDS, first_post=step * CARDS) for step in range(STALL_FINISH_REPEATS + 1)]
+    assert scroll_repeats(pages) == 0
+
+
+def test_unchanged_feed_is_a_stall():
+    pages = [make_feed_page_dom(CARDS) for _ in range(STALL_FINISH_REPEATS + 1)]
+    assert scroll_repeats(pages) >= STALL_FINISH_REPEATS
+
+
+def test_fingerprint_ignores_the_goal():
+    page = make_feed_page_dom(CARDS)
+    first = build_interactive_dom(page, goal="reply to User 3", cache=None)
+    second = build_interactive_dom(page, goal="bookmark posts about topic 5", cache=None)
+    assert page_fingerprint(first) == page_fingerprint(second)
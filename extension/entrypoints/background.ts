@@ -1,6 +1,8 @@
 import { agentState } from "@/entrypoints/lib/agent/state";
+import { AgentSession } from "@/entrypoints/lib/agent/session";
+import { parseHistorySteps, restoreScreenshots } from "@/entrypoints/lib/agent/history";
 import { waitForPage } from "./lib/browser/wait-for-page.js";
-import { API_BASE } from "@/lib/config";
+import { AGENT_SESSIONS, API_BASE } from "@/lib/config";
 
 export default defineBackground(() => {
   browser.sidePanel
@@ -50,9 +52,81 @@ export default defineBackground(() => {
     return { success: false, error: new Error("Unknown error") };
   }
 
+  let session: AgentSession | null = null;
+
+  const closeSession = () => {
+    session?.close();
+    session = null;
+  };
+
+  // Stopping the agent closes the socket, which cancels the step on the server
+  agentState.watch((next) => {
+    if (!next?.isRunning) closeSession();
+  });
+
+  const runSessionStep = async (state: any) => {
+    if (!session?.isOpen) {
+      const { userInfo } = await browser.storage.local.get("userInfo");
+      if (!userInfo?.email) throw new Error("User not authenticated");
+      session = await AgentSession.open({
+        email: userInfo.email,
+        prompt: state.prompt,
+        agentMode: state.agentMode,
+        jobApplicationData: state.jobApplicationData,
+        multiAction: state.agentMode === "job_application",
+      });
+    }
+
+    const observation = await browser.tabs.sendMessage(state.tabId, { type: "observePage" });
+    const result = await session.step(observation);
+    const history = restoreScreenshots(
+      state.history,
+      result.history,
+      observation.screenshot,
+      result.screenshotRefs,
+    );
+    // The content script applies the actions and reports back with agentStepCompleted
+    await sendMessageWithRetries(state.tabId, { type: "applyAgentResult", result, history });
+  };
+
   const runAgent = async () => {
     const state = await agentState.getValue();
-    if (!state.isRunning) return;
+    if (!state.isRunning) {
+      closeSession();
+      return;
+    }
+
+    // A run that already has steps but no open session (e.g. the worker restarted)
+    // continues over HTTP, which carries the history with every request
+    const canUseSession =
+      AGENT_SESSIONS && (session?.isOpen || parseHistorySteps(state.history).length === 0);
+    if (canUseSession) {
+      try {
+        await runSessionStep(state);
+        return;
+      } catch (e: any) {
+        const sessionId = session?.sessionId;
+        closeSession();
+        if (e.message?.includes("limited to 3 agent runs")) {
+          await agentState.setValue({
+            ...state,
+            isRunning: false,
+            history: `Error: ${e.message}\n\nPlease upgrade to premium for unlimited agent runs.`,
+          });
+          return;
+        }
+        console.error("Agent session failed, continuing over HTTP:", e);
+        // The run was charged when the session started; an empty history with its
+        // id tells the server to continue it rather than start (and charge) another
+        const latest = await agentState.getValue();
+        if (sessionId && latest.isRunning && parseHistorySteps(latest.history).length === 0) {
+          await agentState.setValue({
+            ...latest,
+            history: { version: 2, session_id: sessionId, steps: [], screenshots: {} },
+          });
+        }
+      }
+    }
 
     const result = await sendMessageWithRetries(state.tabId, {
       type: "runAgentStep",
@@ -88,6 +162,7 @@ export default defineBackground(() => {
                   history: result.history,
                 });
               }
+              if (!result?.isRunning) closeSession();
 
               await waitForPage(sender.tab.id);
               await runAgent();
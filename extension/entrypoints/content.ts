@@ -1,6 +1,6 @@
 import { defineContentScript } from "#imports";
 import { browser } from "wxt/browser";
-import { runAgentStep } from "@/entrypoints/lib/agent/executor";
+import { applyAgentResult, observePage, runAgentStep } from "@/entrypoints/lib/agent/executor";
 import type { AgentStepResult } from "@/types";
 
 export default defineContentScript({
@@ -8,6 +8,25 @@ export default defineContentScript({
 
   main() {
     browser.runtime.onMessage.addListener(async (message) => {
+      if (message.type === "observePage") {
+        return await observePage();
+      }
+
+      if (message.type === "applyAgentResult") {
+        let result: AgentStepResult | undefined;
+        try {
+          result = await applyAgentResult(message.result, message.history);
+        } catch (e: any) {
+          console.error("Error applying agent result:", e);
+        } finally {
+          browser.runtime.sendMessage({
+            type: "agentStepCompleted",
+            result,
+          });
+        }
+        return;
+      }
+
       if (message.type === "runAgentStep") {
         let result: AgentStepResult | undefined;
         try {
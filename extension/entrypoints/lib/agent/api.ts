@@ -1,19 +1,22 @@
-import type { PageDom, AgentResult } from "@/types";
+import type { PageDom, AgentHistory, AgentResult, AgentStatusResponse } from "@/types";
 import { API_BASE } from "@/lib/config";
 
 export async function fetchAgentAction(
   domTree: PageDom,
   prompt: string,
-  history: string | null,
+  history: AgentHistory | string | null,
   screenshot: string | null,
   agentMode?: string,
   jobApplicationData?: any,
   email?: string,
+  multiAction?: boolean,
+  signal?: AbortSignal,
 ): Promise<AgentResult> {
   const response = await fetch(`${API_BASE}/agent`, {
     method: "POST",
+    signal,
     headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ dom: domTree, prompt, history, screenshot, agentMode, jobApplicationData, email }),
+    body: JSON.stringify({ dom: domTree, prompt, history, screenshot, agentMode, jobApplicationData, email, multiAction }),
   });
 
   if (!response.ok) {
@@ -24,7 +27,7 @@ export async function fetchAgentAction(
   return await response.json();
 }
 
-export async function fetchAgentStatus(email: string): Promise<{ agent_runs: number; is_premium: boolean; runs_remaining: number | string }> {
+export async function fetchAgentStatus(email: string): Promise<AgentStatusResponse> {
   const response = await fetch(`${API_BASE}/agent/status?email=${encodeURIComponent(email)}`);
 
   if (!response.ok) {
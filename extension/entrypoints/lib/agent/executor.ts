@@ -4,14 +4,15 @@ import type {
   PageDom,
   ElementNode,
   ActionType,
+  AgentHistory,
+  AgentResult,
   AgentStepResult,
-  HistoryStep,
 } from "@/types";
 import { preventNewTabs } from "../browser/blank-patch";
 import { getElementByXPath, click, input, keyPress, scroll, navigate, uploadFile } from "./actions";
 import { agentState } from "./state";
 import { fetchAgentAction } from "./api";
-import { parseHistorySteps, formatHistorySteps } from "./history";
+import { appendHistoryStep, restoreScreenshots } from "./history";
 
 function findElementByHighlightIndex(
   domTree: PageDom,
@@ -56,66 +57,114 @@ async function executeAction(
   }
 }
 
-export async function runAgentStep(): Promise<AgentStepResult> {
+export interface PageObservation {
+  dom: PageDom;
+  screenshot: string | null;
+}
+
+// The DOM the last observation was built from; actions are resolved against it
+let observedDom: PageDom | null = null;
+
+export async function observePage(): Promise<PageObservation> {
+  preventNewTabs();
+
+  observedDom = buildDomTree({
+    doHighlightElements: true,
+    focusHighlightIndex: -1,
+    viewportExpansion: 0,
+    debugMode: false,
+  });
+
+  const screenshot = await browser.runtime.sendMessage({
+    type: "takeScreenshot",
+  });
+
+  return { dom: observedDom, screenshot };
+}
+
+export async function applyAgentResult(
+  result: AgentResult,
+  history: AgentHistory,
+): Promise<AgentStepResult> {
   try {
-    preventNewTabs();
+    const actions = result.actions?.length
+      ? result.actions
+      : [{ highlightIndex: result.highlightIndex, action: result.action, value: result.value, xpath: result.xpath }];
 
-    const domTree: PageDom = buildDomTree({
-      doHighlightElements: true,
-      focusHighlightIndex: -1,
-      viewportExpansion: 0,
-      debugMode: false,
-    });
+    for (const { highlightIndex, action, value, xpath } of actions) {
+      if (action === "finish") {
+        return { history, isRunning: false };
+      }
 
-    const screenshot = await browser.runtime.sendMessage({
-      type: "takeScreenshot",
-    });
+      // The server resolves xpaths from its highlight index table; scan the
+      // DOM map only when it did not send one.
+      const element = xpath
+        ? getElementByXPath(xpath)
+        : findElementByHighlightIndex(observedDom, highlightIndex);
 
-    const state = await agentState.getValue();
-    const { userInfo } = await browser.storage.local.get("userInfo");
-    const email = userInfo?.email;
-    
-    if (!email) {
-      throw new Error("User not authenticated");
+      if (element || action === "scroll" || action === "navigate") {
+        await executeAction(element, action, value);
+      } else {
+        console.error(
+          `Element with highlightIndex ${highlightIndex} not found for action ${action}`,
+        );
+        return {
+          history: appendHistoryStep(history, {
+            action: "finish",
+            value: `Failed to find element with highlightIndex ${highlightIndex}`,
+            summary: `Error: Element not found for ${action} action`,
+          }),
+          isRunning: false,
+        };
+      }
     }
-    
-    const result = await fetchAgentAction(
-      domTree,
+
+    return { history, isRunning: true };
+  } finally {
+    cleanupHighlights();
+  }
+}
+
+export async function runAgentStep(): Promise<AgentStepResult> {
+  const { dom, screenshot } = await observePage();
+
+  const state = await agentState.getValue();
+  const { userInfo } = await browser.storage.local.get("userInfo");
+  const email = userInfo?.email;
+
+  if (!email) {
+    cleanupHighlights();
+    throw new Error("User not authenticated");
+  }
+
+  // Stopping the agent aborts the request, which lets the server cancel the model call
+  const controller = new AbortController();
+  const unwatch = agentState.watch((next) => {
+    if (!next?.isRunning) controller.abort();
+  });
+
+  let result;
+  try {
+    result = await fetchAgentAction(
+      dom,
       state.prompt,
       state.history,
       screenshot,
       state.agentMode,
       state.jobApplicationData,
       email,
+      state.agentMode === "job_application",
+      controller.signal,
     );
-
-    if (result.action === "finish") {
-      return { history: result.history, isRunning: false };
-    }
-
-    const element = findElementByHighlightIndex(domTree, result.highlightIndex);
-
-    if (element || result.action === "scroll" || result.action === "navigate") {
-      await executeAction(element, result.action, result.value);
-      return { history: result.history, isRunning: true };
-    } else if (result.action === "upload" && element) {
-      await executeAction(element, result.action, result.value);
-      return { history: result.history, isRunning: true };
-    } else {
-      console.error(
-        `Element with highlightIndex ${result.highlightIndex} not found for action ${result.action}`,
-      );
-      const steps = parseHistorySteps(result.history);
-      const errorStep: HistoryStep = {
-        step_number: steps.length + 1,
-        action: "finish",
-        value: `Failed to find element with highlightIndex ${result.highlightIndex}`,
-        summary: `Error: Element not found for ${result.action} action`,
-      };
-      steps.push(errorStep);
-      return { history: formatHistorySteps(steps), isRunning: false };
-    }
-  } finally {
+  } catch (error) {
     cleanupHighlights();
+    throw error;
+  } finally {
+    unwatch();
   }
+
+  return applyAgentResult(
+    result,
+    restoreScreenshots(state.history, result.history, screenshot, result.screenshotRefs),
+  );
 }
@@ -1,15 +1,58 @@
-import type { HistoryStep } from "@/types";
+import type { AgentHistory, HistoryStep } from "@/types";
 
-export function parseHistorySteps(historyString: string | null): HistoryStep[] {
-  if (!historyString) return [];
+export function parseHistorySteps(history: AgentHistory | string | null): HistoryStep[] {
+  if (!history) return [];
+  if (typeof history === "object") return history.steps ?? [];
   try {
-    const parsed = JSON.parse(historyString);
-    return Array.isArray(parsed) ? parsed : [];
+    // Histories saved before the structured format were JSON strings
+    const parsed = JSON.parse(history);
+    if (Array.isArray(parsed)) return parsed;
+    return Array.isArray(parsed?.steps) ? parsed.steps : [];
   } catch {
     return [];
   }
 }
 
-export function formatHistorySteps(steps: HistoryStep[]): string {
-  return JSON.stringify(steps, null, 2);
-}
\ No newline at end of file
+export function appendHistoryStep(
+  history: AgentHistory,
+  step: Omit<HistoryStep, "step_number">,
+): AgentHistory {
+  return {
+    ...history,
+    steps: [...history.steps, { step_number: history.steps.length + 1, ...step }],
+  };
+}
+
+// The server leaves screenshots out of its response; keep the ones already on the
+// client and attach the screenshot just sent to the steps it produced. Only the
+// refs the server still uses are kept, so the history sent back stays bounded.
+export function restoreScreenshots(
+  previous: AgentHistory | string | null,
+  next: AgentHistory,
+  screenshot: string | null,
+  keepRefs?: string[],
+): AgentHistory {
+  const screenshots: Record<string, string> = {
+    ...(previous && typeof previous === "object" ? previous.screenshots : {}),
+    ...next.screenshots,
+  };
+  if (screenshot) {
+    for (const step of next.steps) {
+      if (step.screenshot_ref && !(step.screenshot_ref in screenshots)) {
+        screenshots[step.screenshot_ref] = screenshot;
+      }
+    }
+  }
+  if (!keepRefs) return { ...next, screenshots };
+  const kept: Record<string, string> = {};
+  for (const ref of keepRefs) {
+    if (ref in screenshots) kept[ref] = screenshots[ref];
+  }
+  return { ...next, screenshots: kept };
+}
+
+export function historyKey(history: AgentHistory | string | null): string | null {
+  if (!history) return null;
+  if (typeof history === "string") return history;
+  return `${history.session_id}:${history.steps.length}`;
+}
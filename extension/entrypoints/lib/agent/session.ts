@@ -0,0 +1,77 @@
+import type { AgentResult, JobApplicationData, PageDom } from "@/types";
+import { API_BASE } from "@/lib/config";
+
+export interface AgentSessionStart {
+  email: string;
+  prompt: string;
+  agentMode?: string;
+  jobApplicationData?: JobApplicationData | null;
+  multiAction?: boolean;
+}
+
+interface Pending {
+  resolve: (message: any) => void;
+  reject: (error: Error) => void;
+}
+
+// One WebSocket per agent run. The server keeps the history, prompt and
+// entitlement between steps, so each step only sends the new page observation.
+export class AgentSession {
+  // Set once the server accepts the start message and charges the run
+  sessionId: string | null = null;
+  private pending: Pending | null = null;
+  private closed = false;
+
+  private constructor(private socket: WebSocket) {
+    socket.onmessage = (event) => this.handle(JSON.parse(event.data));
+    socket.onclose = () => {
+      this.closed = true;
+      this.pending?.reject(new Error("Agent session closed"));
+      this.pending = null;
+    };
+  }
+
+  static open(start: AgentSessionStart): Promise<AgentSession> {
+    return new Promise((resolve, reject) => {
+      const socket = new WebSocket(`${API_BASE.replace(/^http/, "ws")}/agent/ws`);
+      const session = new AgentSession(socket);
+      session.pending = {
+        resolve: (message) => {
+          session.sessionId = message.session_id;
+          resolve(session);
+        },
+        reject,
+      };
+      socket.onopen = () => socket.send(JSON.stringify({ type: "start", ...start }));
+    });
+  }
+
+  get isOpen(): boolean {
+    return !this.closed && this.socket.readyState === WebSocket.OPEN;
+  }
+
+  step(observation: { dom: PageDom; screenshot: string | null }): Promise<AgentResult> {
+    if (!this.isOpen) return Promise.reject(new Error("Agent session closed"));
+    return new Promise((resolve, reject) => {
+      this.pending = { resolve, reject };
+      this.socket.send(JSON.stringify({ type: "observation", ...observation }));
+    });
+  }
+
+  close(): void {
+    // Any message while a step runs makes the server cancel its model call
+    if (this.isOpen) this.socket.send(JSON.stringify({ type: "stop" }));
+    this.socket.close();
+  }
+
+  private handle(message: any): void {
+    const pending = this.pending;
+    this.pending = null;
+    if (message.type === "error") {
+      const detail = typeof message.detail === "string" ? message.detail : "Invalid agent session message";
+      pending?.reject(new Error(detail));
+    } else {
+      pending?.resolve(message);
+    }
+  }
+}
@@ -0,0 +1,84 @@
+import type { Entitlements } from "@/types";
+import { API_BASE } from "@/lib/config";
+import { fetchAgentStatus } from "./agent/api";
+import { checkStripeStatus } from "./stripe-api";
+
+// The server pushes every change over the event stream; polling only covers
+// the time the stream is down (EventSource keeps reconnecting meanwhile)
+const FALLBACK_POLL_INTERVAL_MS = 5 * 60 * 1000;
+
+type Listener = (entitlements: Entitlements) => void;
+
+interface Channel {
+  email: string;
+  source: EventSource;
+  listeners: Set<Listener>;
+  latest: Entitlements | null;
+  pollTimer: ReturnType<typeof setInterval> | null;
+}
+
+// One stream per side panel, shared by every component that needs entitlements
+let channel: Channel | null = null;
+
+function openChannel(email: string): Channel {
+  const opened: Channel = {
+    email,
+    source: new EventSource(`${API_BASE}/events/entitlements?email=${encodeURIComponent(email)}`),
+    listeners: new Set(),
+    latest: null,
+    pollTimer: null,
+  };
+
+  const emit = (entitlements: Entitlements) => {
+    opened.latest = entitlements;
+    opened.listeners.forEach((listener) => listener(entitlements));
+  };
+
+  const poll = async () => {
+    try {
+      const [agent, stripe] = await Promise.all([fetchAgentStatus(email), checkStripeStatus(email)]);
+      emit({ agent, stripe });
+    } catch (error) {
+      console.error("Failed to poll entitlements:", error);
+    }
+  };
+
+  opened.source.addEventListener("entitlements", (event) => {
+    emit(JSON.parse((event as MessageEvent).data));
+    if (opened.pollTimer) {
+      clearInterval(opened.pollTimer);
+      opened.pollTimer = null;
+    }
+  });
+
+  opened.source.onerror = () => {
+    if (opened.pollTimer) return;
+    if (!opened.latest) poll();
+    opened.pollTimer = setInterval(poll, FALLBACK_POLL_INTERVAL_MS);
+  };
+
+  return opened;
+}
+
+function closeChannel() {
+  if (!channel) return;
+  channel.source.close();
+  if (channel.pollTimer) clearInterval(channel.pollTimer);
+  channel = null;
+}
+
+export function subscribeEntitlements(email: string, listener: Listener): () => void {
+  if (channel?.email !== email) {
+    closeChannel();
+    channel = openChannel(email);
+  }
+
+  const subscribed = channel;
+  subscribed.listeners.add(listener);
+  if (subscribed.latest) listener(subscribed.latest);
+
+  return () => {
+    subscribed.listeners.delete(listener);
+    if (channel === subscribed && subscribed.listeners.size === 0) closeChannel();
+  };
+}
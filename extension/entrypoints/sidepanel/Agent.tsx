@@ -1,7 +1,8 @@
 import { useState, useEffect, useRef } from "react";
 import { agentState } from "../lib/agent/state";
-import { parseHistorySteps } from "../lib/agent/history";
+import { historyKey, parseHistorySteps } from "../lib/agent/history";
 import { fetchAgentStatus } from "../lib/agent/api";
+import { subscribeEntitlements } from "../lib/entitlements";
 import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
 import { ScrollArea } from "@/components/ui/scroll-area";
@@ -35,8 +36,10 @@ function Agent({ isPremium: isPremiumProp, checkingPremium }: AgentProps) {
             const state = await agentState.getValue();
             setIsRunning(state.isRunning);
 
-            if (state.history !== currentHistory) {
-                setCurrentHistory(state.history);
+            // Storage hands back a fresh object on every read, so compare by key
+            const key = historyKey(state.history);
+            if (key !== currentHistory) {
+                setCurrentHistory(key);
                 const steps = parseHistorySteps(state.history);
                 updateMessagesFromHistory(steps, state.originalPrompt ?? state.prompt);
             }
@@ -56,20 +59,21 @@ function Agent({ isPremium: isPremiumProp, checkingPremium }: AgentProps) {
     }, [isPremiumProp]);
 
     useEffect(() => {
-        const fetchStatusOnMount = async () => {
-            const { userInfo } = await browser.storage.local.get("userInfo");
-            if (userInfo?.email) {
-                try {
-                    const status = await fetchAgentStatus(userInfo.email);
-                    setRunsRemaining(status.runs_remaining);
-                    setIsPremium(status.is_premium);
-                } catch (error) {
-                    console.error("Failed to fetch agent status on mount:", error);
-                }
-            }
-        };
+        let unsubscribe: (() => void) | null = null;
+        let cancelled = false;
+
+        browser.storage.local.get("userInfo").then(({ userInfo }) => {
+            if (cancelled || !userInfo?.email) return;
+            unsubscribe = subscribeEntitlements(userInfo.email, ({ agent }) => {
+                setRunsRemaining(agent.runs_remaining);
+                setIsPremium(agent.is_premium);
+            });
+        });
 
-        fetchStatusOnMount();
+        return () => {
+            cancelled = true;
+            unsubscribe?.();
+        };
     }, []);
 
     useEffect(() => {
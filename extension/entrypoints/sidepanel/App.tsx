@@ -8,6 +8,8 @@ import { Button } from "@/components/ui/button.tsx";
 import { Badge } from "@/components/ui/badge.tsx";
 import { useState, useEffect } from "react";
 import { checkStripeStatus, createStripeCheckout, cancelSubscription, reactivateSubscription } from "../lib/stripe-api";
+import { subscribeEntitlements } from "../lib/entitlements";
+import type { StripeStatusResponse } from "@/types";
 
 function App() {
   const { page, userInfo, handleSignIn } = useAuth();
@@ -19,27 +21,29 @@ function App() {
 
   useEffect(() => {
     if (userInfo?.email) {
-      checkPremiumStatus();
-
-      const handleFocus = () => {
-        checkPremiumStatus();
-      };
-
-      window.addEventListener('focus', handleFocus);
-      return () => window.removeEventListener('focus', handleFocus);
+      // The first event carries the current status; later ones arrive as the
+      // server records webhooks, cancellations and reactivations
+      return subscribeEntitlements(userInfo.email, ({ stripe }) => {
+        applyStripeStatus(stripe);
+        setCheckingPremium(false);
+      });
     } else {
       setCheckingPremium(false);
     }
   }, [userInfo]);
 
+  const applyStripeStatus = (data: StripeStatusResponse) => {
+    setIsPremium(data.status === "active" || data.status === "trialing" || data.status === "canceled");
+    setSubscriptionStatus(data.status);
+    setCurrentPeriodEnd(data.current_period_end || null);
+  };
+
   const checkPremiumStatus = async () => {
     setCheckingPremium(true);
     try {
       const data = await checkStripeStatus(userInfo.email);
       console.log("Stripe status response:", data);
-      setIsPremium(data.status === "active" || data.status === "trialing" || data.status === "canceled");
-      setSubscriptionStatus(data.status);
-      setCurrentPeriodEnd(data.current_period_end || null);
+      applyStripeStatus(data);
     } catch (error) {
       console.error("Failed to check premium status:", error);
     } finally {
@@ -1 +1,3 @@
-export const API_BASE = import.meta.env.VITE_API_BASE as string;
\ No newline at end of file
+export const API_BASE = import.meta.env.VITE_API_BASE as string;
+// Run agent tasks over one WebSocket session instead of a POST per step
+export const AGENT_SESSIONS = import.meta.env.VITE_AGENT_SESSIONS !== "false";
@@ -40,18 +40,39 @@ export interface HistoryStep {
   action: ActionType;
   value: string | null;
   summary: string;
-  screenshot?: string | null;
+  highlight_index?: number | null;
+  screenshot_ref?: string | null;
+  dom_hash?: string | null;
+}
+
+export interface AgentHistory {
+  version: number;
+  session_id: string;
+  steps: HistoryStep[];
+  screenshots: Record<string, string>;
+}
+
+export interface AgentAction {
+  highlightIndex: number;
+  action: ActionType;
+  value: string | null;
+  xpath?: string | null;
 }
 
 export interface AgentResult {
   highlightIndex: number;
   action: ActionType;
   value: string | null;
-  history: string;
+  xpath?: string | null;
+  history: AgentHistory;
+  actions?: AgentAction[];
+  // Screenshots the server still sends the model; older ones can be dropped
+  screenshotRefs?: string[];
 }
 
 export type AgentStepResult = {
-  history: string | null;
+  // A plain string carries an error message to show instead of a history
+  history: AgentHistory | string | null;
   isRunning: boolean;
 };
 
@@ -76,6 +97,17 @@ export interface StripeStatusResponse {
   current_period_end?: string;
 }
 
+export interface AgentStatusResponse {
+  agent_runs: number;
+  is_premium: boolean;
+  runs_remaining: number | string;
+}
+
+export interface Entitlements {
+  agent: AgentStatusResponse;
+  stripe: StripeStatusResponse;
+}
+
 export interface StripeCheckoutResponse {
   checkout_url: string;
 }